@@ -0,0 +1,343 @@
+import argparse
+import functools
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import namedtuple
+
+import fontTools
+
+import ufo2ft
+from ufo2ft.errors import Error
+
+logger = logging.getLogger("ufo2ft")
+
+# output format: (compile function name, file extension, accepts cacheDir)
+FORMATS = {
+    "ttf": ("compileTTF", ".ttf", False),
+    "otf": ("compileOTF", ".otf", True),
+    "variable-ttf": ("compileVariableTTF", "-VF.ttf", False),
+    "variable-cff2": ("compileVariableCFF2", "-VF.otf", True),
+}
+VARIABLE_FORMATS = frozenset(["variable-ttf", "variable-cff2"])
+
+BuildTarget = namedtuple("BuildTarget", ["source", "format", "output"])
+
+
+def makeTargets(sources, formats, outputDir=None):
+    """Return a BuildTarget for each of the given UFO or designspace paths
+    and output formats.
+
+    UFOs are compiled to the static formats, and designspaces to the variable
+    ones. When 'formats' has none of these, UFOs are compiled to TTF and
+    designspaces to variable TTF.
+    """
+    formats = formats or []
+    targets = []
+    for source in sources:
+        isDesignSpace = source.endswith(".designspace")
+        sourceFormats = [f for f in formats if (f in VARIABLE_FORMATS) == isDesignSpace]
+        if not sourceFormats:
+            if formats:
+                raise Error(
+                    f"Can't compile {source!r} to {', '.join(formats)}: UFOs can "
+                    "only be compiled to static fonts, designspaces to variable fonts"
+                )
+            sourceFormats = ["variable-ttf"] if isDesignSpace else ["ttf"]
+        stem = os.path.splitext(os.path.basename(source.rstrip("/\\")))[0]
+        for fmt in sourceFormats:
+            output = stem + FORMATS[fmt][1]
+            if outputDir is not None:
+                output = os.path.join(outputDir, output)
+            targets.append(BuildTarget(source, fmt, output))
+    return targets
+
+
+def loader(path):
+    """Load the UFO at 'path' with ufoLib2, or defcon if that's missing.
+
+    The UFO libraries are only imported here, so that submitting targets to a
+    build server doesn't pay for importing them.
+    """
+    from ufo2ft.util import openUFO
+
+    return openUFO(path)
+
+
+def _iterSourcePaths(source):
+    yield source
+    if source.endswith(".designspace"):
+        from fontTools.designspaceLib import DesignSpaceDocument
+
+        doc = DesignSpaceDocument.fromfile(source)
+        # sources may share the same UFO with different layers
+        yield from dict.fromkeys(s.path for s in doc.sources)
+
+
+def _hashTree(h, path):
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            h.update(f.read())
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fileName in sorted(files):
+            filePath = os.path.join(root, fileName)
+            h.update(os.path.relpath(filePath, path).encode("utf-8") + b"\0")
+            with open(filePath, "rb") as f:
+                h.update(f.read())
+            h.update(b"\0")
+
+
+def targetCacheKey(target):
+    """Return a hex digest identifying the font compiled for 'target'.
+
+    This hashes the contents of all the source files (the designspace and its
+    UFOs), the output format and the versions of ufo2ft and fontTools. Feature
+    files included from outside the UFOs are not taken into account.
+    """
+    h = hashlib.sha256()
+    h.update(f"{ufo2ft.__version__};{fontTools.version};{target.format}\0".encode())
+    for path in _iterSourcePaths(target.source):
+        _hashTree(h, path)
+    return h.hexdigest()
+
+
+def _loadSource(source, jobs=1):
+    # the compile functions open the UFOs themselves, lazily, and as nobody
+    # else holds on to them they can skip copying the glyphs
+    if source.endswith(".designspace"):
+        from fontTools.designspaceLib import DesignSpaceDocument
+
+        doc = DesignSpaceDocument.fromfile(source)
+        if jobs > 1:
+            from ufo2ft.sourceLoader import loadSourceFonts
+
+            loadSourceFonts(doc, jobs=jobs)
+        return doc
+    return source
+
+
+def buildTarget(target, cacheDir=None, profile=None, loadSource=_loadSource):
+    """Compile 'target' and save it to its output path.
+
+    If 'cacheDir' is set, the compiled font is looked up there first, and
+    stored there after compiling. It is also passed on to the compile
+    functions that cache the subroutinized CFF tables.
+
+    If 'profile' is a path, the build is run under cProfile and the stats
+    are dumped there.
+
+    Returns a dict of the time spent in each stage of the build, in seconds.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    cachePath = None
+    if cacheDir is not None:
+        cachePath = os.path.join(cacheDir, targetCacheKey(target) + ".font")
+        timings["hash"] = time.perf_counter() - start
+        if os.path.exists(cachePath):
+            logger.info("Reusing cached %s", target.output)
+            _makeDirs(target.output)
+            shutil.copyfile(cachePath, target.output)
+            timings["total"] = time.perf_counter() - start
+            return timings
+
+    profiler = None
+    if profile is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    stageStart = time.perf_counter()
+    source = loadSource(target.source)
+    timings["load"] = time.perf_counter() - stageStart
+
+    logger.info("Compiling %s", target.output)
+    stageStart = time.perf_counter()
+    funcName, _, acceptsCacheDir = FORMATS[target.format]
+    kwargs = dict(cacheDir=cacheDir) if acceptsCacheDir else {}
+    font = getattr(ufo2ft, funcName)(source, **kwargs)
+    timings["compile"] = time.perf_counter() - stageStart
+
+    stageStart = time.perf_counter()
+    _makeDirs(target.output)
+    font.save(target.output)
+    timings["save"] = time.perf_counter() - stageStart
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile)
+
+    if cachePath is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        # write to a temporary file first so that concurrent builds sharing
+        # the same cache directory never read a partially written file
+        tmp = f"{cachePath}.{os.getpid()}.tmp"
+        shutil.copyfile(target.output, tmp)
+        os.replace(tmp, cachePath)
+
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def _makeDirs(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def _buildTargetInWorker(args, loadSource=_loadSource):
+    target, cacheDir, profile = args
+    return buildTarget(
+        target, cacheDir=cacheDir, profile=profile, loadSource=loadSource
+    )
+
+
+def buildTargets(targets, jobs=1, cacheDir=None, profile=None):
+    """Build all the 'targets', and return a list with the timings of each.
+
+    With jobs > 1, the targets are distributed over a pool of worker processes
+    which are reused for all the targets, so each one only pays for the
+    interpreter startup and imports once. Otherwise all the targets are built
+    in the current process; a single designspace target then uses the 'jobs'
+    processes to parse the glyphs of its sources instead.
+
+    If 'profile' is a path, the merged cProfile stats of all the builds are
+    dumped there.
+    """
+    profiles = [None] * len(targets)
+    if profile is not None:
+        profiles = [f"{profile}.{i}" for i in range(len(targets))]
+    args = [(t, cacheDir, p) for t, p in zip(targets, profiles)]
+
+    if jobs > 1 and len(targets) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            timings = list(executor.map(_buildTargetInWorker, args))
+    else:
+        loadSource = functools.partial(_loadSource, jobs=jobs)
+        timings = [_buildTargetInWorker(a, loadSource) for a in args]
+
+    if profile is not None:
+        _mergeProfiles(profile, [p for p in profiles if os.path.exists(p)])
+    return timings
+
+
+def _mergeProfiles(path, profiles):
+    import pstats
+
+    if not profiles:
+        return
+    stats = pstats.Stats(profiles[0])
+    for p in profiles[1:]:
+        stats.add(p)
+    stats.dump_stats(path)
+    for p in profiles:
+        os.remove(p)
+    logger.info("Profile written on %s", path)
+
+
+def formatTimings(targets, timings):
+    stages = ["hash", "load", "compile", "save", "total"]
+    stages = [s for s in stages if any(s in t for t in timings)]
+    width = max(len(t.output) for t in targets)
+    lines = [" ".join([f"{'output':<{width}}"] + [f"{s:>8}" for s in stages])]
+    for target, timing in zip(targets, timings):
+        cells = [f"{timing[s]:8.3f}" if s in timing else f"{'-':>8}" for s in stages]
+        lines.append(" ".join([f"{target.output:<{width}}"] + cells))
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="ufo2ft",
+        description="Compile UFOs and designspaces to OpenType fonts",
+    )
+    parser.add_argument(
+        "sources",
+        metavar="SOURCE",
+        nargs="+",
+        help="UFO or designspace file",
+    )
+    parser.add_argument(
+        "--format",
+        "-f",
+        dest="formats",
+        action="append",
+        choices=sorted(FORMATS),
+        help="output format; can be repeated. Default: ttf for UFOs, "
+        "variable-ttf for designspaces",
+    )
+    parser.add_argument("--output-dir", "-o", metavar="DIR", help="output directory")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="number of worker processes building the targets in parallel "
+        "(or, for a single designspace, parsing the glyphs of its sources)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="directory where compiled fonts and subroutinized CFF tables "
+        "are cached between builds",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="run the builds under cProfile and dump the stats to FILE",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print the time spent in each stage of every build",
+    )
+    parser.add_argument(
+        "--server",
+        metavar="SOCKET",
+        help="submit the targets to the build server listening on SOCKET "
+        "(see ufo2ft.buildServer) instead of building them here",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="print more messages"
+    )
+    options = parser.parse_args(args)
+    if options.server and (options.jobs != 1 or options.profile):
+        parser.error("--jobs and --profile can't be used with --server")
+
+    logging.basicConfig(
+        level=logging.INFO if options.verbose else logging.WARNING,
+        format="%(levelname)s:%(name)s: %(message)s",
+    )
+
+    try:
+        targets = makeTargets(options.sources, options.formats, options.output_dir)
+    except Error as e:
+        parser.error(str(e))
+
+    if options.server:
+        from ufo2ft.buildServer import submitTargets
+
+        timings = submitTargets(options.server, targets, cacheDir=options.cache_dir)
+    else:
+        timings = buildTargets(
+            targets,
+            jobs=max(1, options.jobs),
+            cacheDir=options.cache_dir,
+            profile=options.profile,
+        )
+    if options.timings:
+        print(formatTimings(targets, timings), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,961 @@
+"""The compile functions exported by the ufo2ft package.
+
+This module is imported on first access to any of them (see ufo2ft/__init__.py).
+"""
+import logging
+import os
+import tempfile
+from enum import IntEnum
+
+from fontTools import varLib
+from fontTools.ttLib import TTFont
+from fontTools.varLib.featureVars import addFeatureVariations
+from fontTools.varLib.models import normalizeLocation
+
+from ufo2ft.constants import SPARSE_OTF_MASTER_TABLES, SPARSE_TTF_MASTER_TABLES
+from ufo2ft.featureCompiler import (
+    MTI_FEATURES_PREFIX,
+    FeatureCompiler,
+    MtiFeatureCompiler,
+    VariableFeatureCompiler,
+)
+from ufo2ft.outlineCompiler import (
+    OutlineCFF2Compiler,
+    OutlineOTFCompiler,
+    OutlineTTFCompiler,
+)
+from ufo2ft.postProcessor import PostProcessor
+from ufo2ft.preProcessor import (
+    OTFPreProcessor,
+    TTFInterpolatablePreProcessor,
+    TTFPreProcessor,
+)
+from ufo2ft.sourceLoader import loadSourceFonts
+from ufo2ft.util import (
+    CompileContext,
+    GSUBCache,
+    _getDefaultNotdefGlyph,
+    getDefaultMasterFont,
+    init_kwargs,
+    isPath,
+    openUFO,
+    prune_unknown_kwargs,
+)
+
+logger = logging.getLogger("ufo2ft")
+
+
+class CFFOptimization(IntEnum):
+    NONE = 0
+    SPECIALIZE = 1
+    SUBROUTINIZE = 2
+
+
+def _openUFOs(ufos, kwargs):
+    """Open the UFOs given as paths, lazily.
+
+    If all of them were given as paths, nothing else can hold a reference to
+    the fonts, so the preprocessor is allowed to modify their glyphs in place
+    rather than copying each of them first.
+    """
+    fonts = [openUFO(ufo) if isPath(ufo) else ufo for ufo in ufos]
+    if ufos and all(isPath(ufo) for ufo in ufos):
+        kwargs["inplace"] = True
+    return fonts
+
+
+def _spillFont(font, spillDir):
+    """Save 'font' to a new file in 'spillDir', and return a TTFont reading
+    its tables back from there only when they are accessed.
+    """
+    suffix = ".otf" if "CFF " in font or "CFF2" in font else ".ttf"
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=spillDir)
+    with os.fdopen(fd, "wb") as f:
+        font.save(f)
+    spilled = TTFont(path)
+    # CFF2 tables, and sparse masters without 'post' table, don't store the
+    # glyph names, which varLib needs to match the glyphs across masters
+    spilled.setGlyphOrder(font.getGlyphOrder())
+    return spilled
+
+
+def _spillFonts(fonts, spillDir):
+    """Spill each of 'fonts' as soon as it is compiled (see _spillFont), and
+    return the list of spilled fonts. If compiling or saving one of them fails,
+    the files of those already spilled are removed.
+    """
+    spilled = []
+    try:
+        for font in fonts:
+            spilled.append(_spillFont(font, spillDir))
+    except BaseException:
+        _removeSpilledFonts(spilled)
+        raise
+    return spilled
+
+
+def _removeSpilledFonts(fonts):
+    for font in fonts:
+        path = font.reader.file.name
+        font.close()
+        os.remove(path)
+
+
+def _loadAllTables(font):
+    # varLib.build copies the base master, so the variable font may still
+    # read some tables from its file: load them, so the file can be removed
+    for tag in font.keys():
+        font[tag]
+    font.close()
+    font.reader = None
+
+
+def call_preprocessor(ufo_or_ufos, *, preProcessorClass, **kwargs):
+    logger.info("Pre-processing glyphs")
+    if kwargs["skipExportGlyphs"] is None:
+        if isinstance(ufo_or_ufos, (list, tuple)):
+            kwargs["skipExportGlyphs"] = set()
+            for ufo in ufo_or_ufos:
+                kwargs["skipExportGlyphs"].update(
+                    ufo.lib.get("public.skipExportGlyphs", [])
+                )
+        else:
+            kwargs["skipExportGlyphs"] = ufo_or_ufos.lib.get(
+                "public.skipExportGlyphs", []
+            )
+
+    callables = [preProcessorClass]
+    if hasattr(preProcessorClass, "initDefaultFilters"):
+        callables.append(preProcessorClass.initDefaultFilters)
+    preProcessor = preProcessorClass(
+        ufo_or_ufos, **prune_unknown_kwargs(kwargs, *callables)
+    )
+    return preProcessor.process()
+
+
+def call_outline_compiler(ufo, glyphSet, *, outlineCompilerClass, **kwargs):
+    kwargs = prune_unknown_kwargs(kwargs, outlineCompilerClass)
+    outlineCompiler = outlineCompilerClass(ufo, glyphSet=glyphSet, **kwargs)
+    return outlineCompiler.compile()
+
+
+def call_postprocessor(
+    otf, ufo, glyphSet, *, postProcessorClass, compileContext=None, **kwargs
+):
+    if postProcessorClass is not None:
+        # only pass the compileContext if the post-processor accepts it
+        initKwargs = prune_unknown_kwargs(
+            dict(compileContext=compileContext), postProcessorClass
+        )
+        postProcessor = postProcessorClass(otf, ufo, glyphSet=glyphSet, **initKwargs)
+        kwargs = prune_unknown_kwargs(kwargs, postProcessor.process)
+        otf = postProcessor.process(**kwargs)
+    return otf
+
+
+base_args = dict(
+    postProcessorClass=PostProcessor,
+    featureCompilerClass=None,
+    featureWriters=None,
+    filters=None,
+    glyphOrder=None,
+    useProductionNames=None,
+    removeOverlaps=False,
+    overlapsBackend=None,
+    inplace=False,
+    layerName=None,
+    skipExportGlyphs=None,
+    debugFeatureFile=None,
+    notdefGlyph=None,
+    skipFeatureCompilation=False,
+)
+
+compileOTF_args = {
+    **base_args,
+    **dict(
+        preProcessorClass=OTFPreProcessor,
+        outlineCompilerClass=OutlineOTFCompiler,
+        optimizeCFF=CFFOptimization.SUBROUTINIZE,
+        roundTolerance=None,
+        cffVersion=1,
+        subroutinizer=None,
+        cacheDir=None,
+        _tables=None,
+        _gsubCache=None,
+        _glyphSets=None,
+    ),
+}
+
+
+def compileOTF(ufo, **kwargs):
+    """Create FontTools CFF font from a UFO.
+
+    *ufo* can also be the path to a UFO. Its glyphs are then only parsed when
+    the pre-processor first needs them, and, since the font isn't shared with
+    the caller, modified in place instead of being copied.
+
+    *removeOverlaps* performs a union operation on all the glyphs' contours.
+
+    *optimizeCFF* (int) defines whether the CFF charstrings should be
+      specialized and subroutinized. By default both optimization are enabled.
+      A value of 0 disables both; 1 only enables the specialization; 2 (default)
+      does both specialization and subroutinization.
+
+    *roundTolerance* (float) controls the rounding of point coordinates.
+      It is defined as the maximum absolute difference between the original
+      float and the rounded integer value.
+      By default, all floats are rounded to integer (tolerance 0.5); a value
+      of 0 completely disables rounding; values in between only round floats
+      which are close to their integral part within the tolerated range.
+
+    *featureWriters* argument is a list of BaseFeatureWriter subclasses or
+      pre-initialized instances. Features will be written by each feature
+      writer in the given order. If featureWriters is None, the default
+      feature writers [KernFeatureWriter, MarkFeatureWriter] are used.
+
+    *filters* argument is a list of BaseFilters subclasses or pre-initialized
+      instances. Filters with 'pre' attribute set to True will be pre-filters
+      called before the default filters, otherwise they will be post-filters,
+      called after the default filters.
+      Filters will modify glyphs or the glyph set. The default filters cannot
+      be disabled.
+
+    *useProductionNames* renames glyphs in TrueType 'post' or OpenType 'CFF '
+      tables based on the 'public.postscriptNames' mapping in the UFO lib,
+      if present. Otherwise, uniXXXX names are generated from the glyphs'
+      unicode values. The default value (None) will first check if the UFO lib
+      has the 'com.github.googlei18n.ufo2ft.useProductionNames' key. If this
+      is missing or True (default), the glyphs are renamed. Set to False
+      to keep the original names.
+
+    **inplace** (bool) specifies whether the filters should modify the input
+      UFO's glyphs, a copy should be made first.
+
+    *layerName* specifies which layer should be compiled. When compiling something
+    other than the default layer, feature compilation is skipped.
+
+    *skipExportGlyphs* is a list or set of glyph names to not be exported to the
+    final font. If these glyphs are used as components in any other glyph, those
+    components get decomposed. If the parameter is not passed in, the UFO's
+    "public.skipExportGlyphs" lib key will be consulted. If it doesn't exist,
+    all glyphs are exported. UFO groups and kerning will be pruned of skipped
+    glyphs.
+
+    *cffVersion* (int) is the CFF format, choose between 1 (default) and 2.
+
+    *subroutinizer* (Optional[str]) is the name of the library to use for
+      compressing CFF charstrings, if subroutinization is enabled by optimizeCFF
+      parameter. Choose between "cffsubr" or "compreffor".
+      By default "cffsubr" is used for both CFF 1 and CFF 2.
+      NOTE: cffsubr is required for subroutinizing CFF2 tables, as compreffor
+      currently doesn't support it.
+
+    *cacheDir* (Optional[str]) is the path to a directory where the subroutinized
+      CFF or CFF2 tables are cached between builds. If the charstrings, the
+      subroutines and the private dicts have not changed since a previous build
+      (e.g. only the features or the font info were edited), the subroutinization
+      step is skipped.
+
+    *skipFeatureCompilation* (bool) skips the compilation of the OpenType layout
+      features, e.g. when these are built separately.
+    """
+    kwargs = init_kwargs(kwargs, compileOTF_args)
+    (ufo,) = _openUFOs([ufo], kwargs)
+    glyphSet = call_preprocessor(ufo, **kwargs)
+    compileContext = CompileContext(
+        ufo, glyphSet, kwargs["glyphOrder"], gsubCache=kwargs.pop("_gsubCache")
+    )
+    glyphSets = kwargs.pop("_glyphSets")
+    if glyphSets is not None:
+        glyphSets.append(glyphSet)
+
+    logger.info("Building OpenType tables")
+    optimizeCFF = CFFOptimization(kwargs.pop("optimizeCFF"))
+    tables = kwargs.pop("_tables")
+    otf = call_outline_compiler(
+        ufo,
+        glyphSet,
+        **kwargs,
+        optimizeCFF=optimizeCFF >= CFFOptimization.SPECIALIZE,
+        tables=tables,
+        compileContext=compileContext,
+    )
+
+    # Only the default layer is likely to have all glyphs used in feature code.
+    if kwargs["layerName"] is None and not kwargs["skipFeatureCompilation"]:
+        compileFeatures(
+            ufo, otf, glyphSet=glyphSet, compileContext=compileContext, **kwargs
+        )
+
+    return call_postprocessor(
+        otf,
+        ufo,
+        glyphSet,
+        **kwargs,
+        optimizeCFF=optimizeCFF >= CFFOptimization.SUBROUTINIZE,
+        compileContext=compileContext,
+    )
+
+
+compileTTF_args = {
+    **base_args,
+    **dict(
+        preProcessorClass=TTFPreProcessor,
+        outlineCompilerClass=OutlineTTFCompiler,
+        convertCubics=True,
+        cubicConversionError=None,
+        reverseDirection=True,
+        rememberCurveType=True,
+        flattenComponents=False,
+    ),
+}
+
+
+def compileTTF(ufo, **kwargs):
+    """Create FontTools TrueType font from a UFO.
+
+    *ufo* can also be the path to a UFO. Its glyphs are then only parsed when
+    the pre-processor first needs them, and, since the font isn't shared with
+    the caller, modified in place instead of being copied.
+
+    *removeOverlaps* performs a union operation on all the glyphs' contours.
+
+    *flattenComponents* un-nests glyphs so that they have at most one level of
+    components.
+
+    *convertCubics* and *cubicConversionError* specify how the conversion from cubic
+    to quadratic curves should be handled.
+
+    *layerName* specifies which layer should be compiled. When compiling something
+    other than the default layer, feature compilation is skipped.
+
+    *skipExportGlyphs* is a list or set of glyph names to not be exported to the
+    final font. If these glyphs are used as components in any other glyph, those
+    components get decomposed. If the parameter is not passed in, the UFO's
+    "public.skipExportGlyphs" lib key will be consulted. If it doesn't exist,
+    all glyphs are exported. UFO groups and kerning will be pruned of skipped
+    glyphs.
+    """
+    kwargs = init_kwargs(kwargs, compileTTF_args)
+    (ufo,) = _openUFOs([ufo], kwargs)
+
+    glyphSet = call_preprocessor(ufo, **kwargs)
+    compileContext = CompileContext(ufo, glyphSet, kwargs["glyphOrder"])
+
+    logger.info("Building OpenType tables")
+    otf = call_outline_compiler(ufo, glyphSet, compileContext=compileContext, **kwargs)
+
+    # Only the default layer is likely to have all glyphs used in feature code.
+    if kwargs["layerName"] is None and not kwargs["skipFeatureCompilation"]:
+        compileFeatures(
+            ufo, otf, glyphSet=glyphSet, compileContext=compileContext, **kwargs
+        )
+
+    return call_postprocessor(
+        otf, ufo, glyphSet, compileContext=compileContext, **kwargs
+    )
+
+
+compileInterpolatableTTFs_args = {
+    **base_args,
+    **dict(
+        preProcessorClass=TTFInterpolatablePreProcessor,
+        outlineCompilerClass=OutlineTTFCompiler,
+        cubicConversionError=None,
+        reverseDirection=True,
+        flattenComponents=False,
+        layerNames=None,
+        _glyphSets=None,
+    ),
+}
+
+compileInterpolatableTTFsFromDS_args = {
+    **compileInterpolatableTTFs_args,
+    **dict(spillDir=None),
+}
+
+
+def compileInterpolatableTTFs(ufos, **kwargs):
+    """Create FontTools TrueType fonts from a list of UFOs with interpolatable
+    outlines. Cubic curves are converted compatibly to quadratic curves using
+    the Cu2Qu conversion algorithm.
+
+    Return an iterator object that yields a TTFont instance for each UFO.
+
+    *ufos* can also contain paths to UFOs, which are opened lazily; if they are
+    all paths, their glyphs are modified in place instead of being copied.
+
+    *layerNames* refers to the layer names to use glyphs from in the order of
+    the UFOs in *ufos*. By default, this is a list of `[None]` times the number
+    of UFOs, i.e. using the default layer from all the UFOs.
+
+    When the layerName is not None for a given UFO, the corresponding TTFont object
+    will contain only a minimum set of tables ("head", "hmtx", "glyf", "loca", "maxp",
+    "post" and "vmtx"), and no OpenType layout tables.
+
+    *skipExportGlyphs* is a list or set of glyph names to not be exported to the
+    final font. If these glyphs are used as components in any other glyph, those
+    components get decomposed. If the parameter is not passed in, the union of
+    all UFO's "public.skipExportGlyphs" lib keys will be used. If they don't
+    exist, all glyphs are exported. UFO groups and kerning will be pruned of
+    skipped glyphs.
+    """
+    from ufo2ft.util import _LazyFontName
+
+    kwargs = init_kwargs(kwargs, compileInterpolatableTTFs_args)
+    ufos = _openUFOs(ufos, kwargs)
+
+    if kwargs["layerNames"] is None:
+        kwargs["layerNames"] = [None] * len(ufos)
+    assert len(ufos) == len(kwargs["layerNames"])
+
+    # a copy of the preprocessed glyph sets, whose entries are released below
+    glyphSets = list(call_preprocessor(ufos, **kwargs))
+    # the masters with the same GSUB features share the same GSUB table
+    gsubCache = GSUBCache()
+
+    for i, (ufo, layerName) in enumerate(zip(ufos, kwargs["layerNames"])):
+        # the glyphs of all the masters must be converted to quadratic curves
+        # together, but once a master is compiled its glyph set can be freed
+        glyphSet, glyphSets[i] = glyphSets[i], None
+        if kwargs["_glyphSets"] is not None:
+            kwargs["_glyphSets"].append(glyphSet)
+        fontName = _LazyFontName(ufo)
+        if layerName is not None:
+            logger.info("Building OpenType tables for %s-%s", fontName, layerName)
+        else:
+            logger.info("Building OpenType tables for %s", fontName)
+
+        compileContext = CompileContext(
+            ufo, glyphSet, kwargs["glyphOrder"], gsubCache=gsubCache
+        )
+        ttf = call_outline_compiler(
+            ufo,
+            glyphSet,
+            **kwargs,
+            tables=SPARSE_TTF_MASTER_TABLES if layerName else None,
+            compileContext=compileContext,
+        )
+
+        # Only the default layer is likely to have all glyphs used in feature
+        # code.
+        if layerName is None and not kwargs["skipFeatureCompilation"]:
+            if kwargs["debugFeatureFile"]:
+                kwargs["debugFeatureFile"].write("\n### %s ###\n" % fontName)
+            compileFeatures(
+                ufo, ttf, glyphSet=glyphSet, compileContext=compileContext, **kwargs
+            )
+
+        ttf = call_postprocessor(
+            ttf, ufo, glyphSet, compileContext=compileContext, **kwargs
+        )
+
+        if layerName is not None:
+            # for sparse masters (i.e. containing only a subset of the glyphs), we
+            # need to include the post table in order to store glyph names, so that
+            # fontTools.varLib can interpolate glyphs with same name across masters.
+            # However we want to prevent the underlinePosition/underlineThickness
+            # fields in such sparse masters to be included when computing the deltas
+            # for the MVAR table. Thus, we set them to this unlikely, limit value
+            # (-36768) which is a signal varLib should ignore them when building MVAR.
+            ttf["post"].underlinePosition = -0x8000
+            ttf["post"].underlineThickness = -0x8000
+
+        del glyphSet, compileContext
+        yield ttf
+
+
+def compileInterpolatableTTFsFromDS(designSpaceDoc, **kwargs):
+    """Create FontTools TrueType fonts from the DesignSpaceDocument UFO sources
+    with interpolatable outlines. Cubic curves are converted compatibly to
+    quadratic curves using the Cu2Qu conversion algorithm.
+
+    If the Designspace contains a "public.skipExportGlyphs" lib key, these
+    glyphs will not be exported to the final font. If these glyphs are used as
+    components in any other glyph, those components get decomposed. If the lib
+    key doesn't exist in the Designspace, all glyphs are exported (keys in
+    individual UFOs are ignored). UFO groups and kerning will be pruned of
+    skipped glyphs.
+
+    The DesignSpaceDocument should contain SourceDescriptor objects with 'font'
+    attribute set to an already loaded defcon.Font object (or compatible UFO
+    Font class). If 'font' attribute is unset or None, the UFO is opened from the
+    source's 'path' (and the 'font' attribute set to it); if that is also unset,
+    an AttributeError exception is thrown.
+
+    Return a copy of the DesignSpaceDocument object (or the same one if
+    inplace=True) with the source's 'font' attribute set to the corresponding
+    TTFont instance.
+
+    For sources that have the 'layerName' attribute defined, the corresponding TTFont
+    object will contain only a minimum set of tables ("head", "hmtx", "glyf", "loca",
+    "maxp", "post" and "vmtx"), and no OpenType layout tables.
+
+    *spillDir* (Optional[str]) is the path to a directory where each master is
+    saved as soon as it's compiled, so that the compiled masters don't all have
+    to be held in memory at once. The sources' 'font' attributes are then set to
+    TTFont objects reading their tables back from there when accessed. The files
+    are left for the caller to remove once they are done with the fonts.
+    """
+    kwargs = init_kwargs(kwargs, compileInterpolatableTTFsFromDS_args)
+    spillDir = kwargs.pop("spillDir")
+    loadSourceFonts(designSpaceDoc, jobs=1)
+    ufos, kwargs["layerNames"] = [], []
+    for source in designSpaceDoc.sources:
+        if source.font is None:
+            raise AttributeError(
+                "designspace source '%s' is missing required 'font' attribute"
+                % getattr(source, "name", "<Unknown>")
+            )
+        ufos.append(source.font)
+        # 'layerName' is None for the default layer
+        kwargs["layerNames"].append(source.layerName)
+
+    kwargs["skipExportGlyphs"] = designSpaceDoc.lib.get("public.skipExportGlyphs", [])
+
+    if kwargs["notdefGlyph"] is None:
+        kwargs["notdefGlyph"] = _getDefaultNotdefGlyph(designSpaceDoc)
+
+    ttfs = compileInterpolatableTTFs(ufos, **kwargs)
+    if spillDir is not None:
+        ttfs = _spillFonts(ttfs, spillDir)
+
+    if kwargs["inplace"]:
+        result = designSpaceDoc
+    else:
+        # TODO try a more efficient copy method that doesn't involve (de)serializing
+        result = designSpaceDoc.__class__.fromstring(designSpaceDoc.tostring())
+    for source, ttf in zip(result.sources, ttfs):
+        source.font = ttf
+    return result
+
+
+compileInterpolatableOTFs_args = {
+    **base_args,
+    **dict(
+        preProcessorClass=OTFPreProcessor,
+        outlineCompilerClass=OutlineOTFCompiler,
+        featureCompilerClass=None,
+        roundTolerance=None,
+        optimizeCFF=CFFOptimization.NONE,
+        spillDir=None,
+        _glyphSets=None,
+    ),
+}
+
+
+def compileInterpolatableOTFsFromDS(designSpaceDoc, **kwargs):
+    """Create FontTools CFF fonts from the DesignSpaceDocument UFO sources
+    with interpolatable outlines.
+
+    Interpolatable means without subroutinization and specializer optimizations
+    and no removal of overlaps.
+
+    If the Designspace contains a "public.skipExportGlyphs" lib key, these
+    glyphs will not be exported to the final font. If these glyphs are used as
+    components in any other glyph, those components get decomposed. If the lib
+    key doesn't exist in the Designspace, all glyphs are exported (keys in
+    individual UFOs are ignored). UFO groups and kerning will be pruned of
+    skipped glyphs.
+
+    The DesignSpaceDocument should contain SourceDescriptor objects with 'font'
+    attribute set to an already loaded defcon.Font object (or compatible UFO
+    Font class). If 'font' attribute is unset or None, the UFO is opened from the
+    source's 'path' (and the 'font' attribute set to it); if that is also unset,
+    an AttributeError exception is thrown.
+
+    Return a copy of the DesignSpaceDocument object (or the same one if
+    inplace=True) with the source's 'font' attribute set to the corresponding
+    TTFont instance.
+
+    For sources that have the 'layerName' attribute defined, the corresponding TTFont
+    object will contain only a minimum set of tables ("head", "hmtx", "CFF ", "maxp",
+    "vmtx" and "VORG"), and no OpenType layout tables.
+
+    *spillDir* (Optional[str]) is the path to a directory where each master is
+    saved as soon as it's compiled, so that the compiled masters don't all have
+    to be held in memory at once. The sources' 'font' attributes are then set to
+    TTFont objects reading their tables back from there when accessed. The files
+    are left for the caller to remove once they are done with the fonts.
+    """
+    kwargs = init_kwargs(kwargs, compileInterpolatableOTFs_args)
+    spillDir = kwargs.pop("spillDir")
+    loadSourceFonts(designSpaceDoc, jobs=1)
+    for source in designSpaceDoc.sources:
+        if source.font is None:
+            raise AttributeError(
+                "designspace source '%s' is missing required 'font' attribute"
+                % getattr(source, "name", "<Unknown>")
+            )
+
+    kwargs["skipExportGlyphs"] = designSpaceDoc.lib.get("public.skipExportGlyphs", [])
+
+    if kwargs["notdefGlyph"] is None:
+        kwargs["notdefGlyph"] = _getDefaultNotdefGlyph(designSpaceDoc)
+
+    # the masters with the same GSUB features share the same GSUB table
+    gsubCache = GSUBCache()
+    otfs = (
+        compileOTF(
+            ufo=source.font,
+            **{
+                **kwargs,
+                **dict(
+                    layerName=source.layerName,
+                    removeOverlaps=False,
+                    overlapsBackend=None,
+                    optimizeCFF=CFFOptimization.NONE,
+                    _tables=SPARSE_OTF_MASTER_TABLES if source.layerName else None,
+                    _gsubCache=gsubCache,
+                ),
+            },
+        )
+        for source in designSpaceDoc.sources
+    )
+    if spillDir is not None:
+        otfs = _spillFonts(otfs, spillDir)
+    else:
+        otfs = list(otfs)
+
+    if kwargs["inplace"]:
+        result = designSpaceDoc
+    else:
+        # TODO try a more efficient copy method that doesn't involve (de)serializing
+        result = designSpaceDoc.__class__.fromstring(designSpaceDoc.tostring())
+
+    for source, otf in zip(result.sources, otfs):
+        source.font = otf
+
+    return result
+
+
+def compileFeatures(
+    ufo,
+    ttFont=None,
+    glyphSet=None,
+    featureCompilerClass=None,
+    debugFeatureFile=None,
+    **kwargs
+):
+    """Compile OpenType Layout features from `ufo` into FontTools OTL tables.
+    If `ttFont` is None, a new TTFont object is created containing the new
+    tables, else the provided `ttFont` is updated with the new tables.
+
+    If no explicit `featureCompilerClass` is provided, the one used will
+    depend on whether the ufo contains any MTI feature files in its 'data'
+    directory (thus the `MTIFeatureCompiler` is used) or not (then the
+    default FeatureCompiler for Adobe FDK features is used).
+
+    If skipExportGlyphs is provided (see description in the ``compile*``
+    functions), the feature compiler will prune groups (removing them if empty)
+    and kerning of the UFO of these glyphs. The feature file is left untouched.
+
+    `debugFeatureFile` can be a file or file-like object opened in text mode,
+    in which to dump the text content of the feature file, useful for debugging
+    auto-generated OpenType features like kern, mark, mkmk etc.
+    """
+    if featureCompilerClass is None:
+        if any(
+            fn.startswith(MTI_FEATURES_PREFIX) and fn.endswith(".mti")
+            for fn in ufo.data.fileNames
+        ):
+            featureCompilerClass = MtiFeatureCompiler
+        else:
+            featureCompilerClass = FeatureCompiler
+
+    kwargs = prune_unknown_kwargs(kwargs, featureCompilerClass)
+    featureCompiler = featureCompilerClass(ufo, ttFont, glyphSet=glyphSet, **kwargs)
+    otFont = featureCompiler.compile()
+
+    if debugFeatureFile:
+        if hasattr(featureCompiler, "writeFeatures"):
+            featureCompiler.writeFeatures(debugFeatureFile)
+
+    return otFont
+
+
+def compileVariableFeatures(
+    designSpaceDoc, ttFont, excludeVariationTables=(), glyphSets=None, **kwargs
+):
+    """Compile the OpenType layout features of the variable `ttFont` from
+    all the sources of `designSpaceDoc` at once, using the
+    VariableFeatureCompiler (unless a different `featureCompilerClass` is
+    given), then add the GSUB FeatureVariations for the designspace rules.
+
+    `glyphSets` is the list of the preprocessed glyph sets of the sources, in
+    the same order, which the feature writers read the anchors from. If None,
+    the glyphs of the sources' UFO layers are used as they are.
+
+    The tables listed in `excludeVariationTables` are removed afterwards, like
+    fontTools.varLib.build does.
+    """
+    logger.info("Compiling variable features")
+
+    baseUfo = getDefaultMasterFont(designSpaceDoc)
+    featureCompilerClass = kwargs.pop("featureCompilerClass", None)
+    if featureCompilerClass is None:
+        featureCompilerClass = VariableFeatureCompiler
+    kwargs.pop("glyphSet", None)
+    compileFeatures(
+        baseUfo,
+        ttFont,
+        featureCompilerClass=featureCompilerClass,
+        designSpace=designSpaceDoc,
+        glyphSets=glyphSets,
+        **kwargs,
+    )
+
+    ds = varLib.load_designspace(designSpaceDoc)
+    if "GSUB" not in excludeVariationTables and ds.rules:
+        logger.info("Generating GSUB FeatureVariations")
+        featureTag = ds.lib.get(
+            varLib.FEAVAR_FEATURETAG_LIB_KEY,
+            "rclt" if ds.rulesProcessingLast else "rvrn",
+        )
+        addFeatureVariations(ttFont, _getConditionalSubstitutions(ds), featureTag)
+
+    for tag in excludeVariationTables:
+        if tag in _LAYOUT_TABLES and tag in ttFont:
+            del ttFont[tag]
+    return ttFont
+
+
+def _getConditionalSubstitutions(ds):
+    # convert the designspace rules to the normalized regions and substitutions
+    # expected by fontTools.varLib.featureVars, same as fontTools.varLib.build
+    axisTags = {name: axis.tag for name, axis in ds.axes.items()}
+    conditionalSubs = []
+    for rule in ds.rules:
+        region = []
+        for conditions in rule.conditionSets:
+            space = {}
+            for condition in conditions:
+                axisName = condition["name"]
+                minimum, maximum = -1.0, 1.0
+                if condition["minimum"] is not None:
+                    minimum = normalizeLocation(
+                        {axisName: condition["minimum"]}, ds.internal_axis_supports
+                    )[axisName]
+                if condition["maximum"] is not None:
+                    maximum = normalizeLocation(
+                        {axisName: condition["maximum"]}, ds.internal_axis_supports
+                    )[axisName]
+                space[axisTags[axisName]] = (minimum, maximum)
+            region.append(space)
+        conditionalSubs.append((region, dict(rule.subs)))
+    return conditionalSubs
+
+
+_LAYOUT_TABLES = ("GSUB", "GPOS", "GDEF")
+
+
+def _excludeLayoutTables(excludeVariationTables, variableFeatures):
+    # when the layout features are compiled for the variable font, varLib must
+    # not merge the masters' tables nor add the GSUB FeatureVariations, these
+    # are only added after the features are compiled
+    if not variableFeatures:
+        return excludeVariationTables
+    return tuple(excludeVariationTables) + tuple(
+        tag for tag in _LAYOUT_TABLES if tag not in excludeVariationTables
+    )
+
+
+compileVariableTTF_args = {
+    **base_args,
+    **dict(
+        preProcessorClass=TTFInterpolatablePreProcessor,
+        outlineCompilerClass=OutlineTTFCompiler,
+        cubicConversionError=None,
+        reverseDirection=True,
+        flattenComponents=False,
+        excludeVariationTables=(),
+        optimizeGvar=True,
+        variableFeatures=False,
+        spillDir=None,
+    ),
+}
+
+
+def compileVariableTTF(designSpaceDoc, **kwargs):
+    """Create FontTools TrueType variable font from the DesignSpaceDocument UFO sources
+    with interpolatable outlines, using fontTools.varLib.build.
+
+    *optimizeGvar*, if set to False, will not perform IUP optimization on the
+      generated 'gvar' table.
+
+    *excludeVariationTables* is a list of sfnt table tags (str) that is passed on
+      to fontTools.varLib.build, to skip building some variation tables.
+
+    *variableFeatures* (bool), if True, compiles the OpenType layout features
+      once for the variable font from the kerning and anchors of all the masters
+      (see VariableFeatureCompiler), instead of building the layout tables of
+      each master and merging them with fontTools.varLib.
+
+    *spillDir* (Optional[str]) is the path to a directory where the masters are
+      saved as soon as they are compiled, and read back from by fontTools.varLib,
+      so that they don't all have to be held in memory at once. The files are
+      removed once the variable font is built.
+
+    The rest of the arguments works the same as in the other compile functions.
+
+    Returns a new variable TTFont object.
+    """
+    kwargs = init_kwargs(kwargs, compileVariableTTF_args)
+    loadSourceFonts(designSpaceDoc, jobs=1)
+    baseUfo = getDefaultMasterFont(designSpaceDoc)
+
+    excludeVariationTables = kwargs.pop("excludeVariationTables")
+    optimizeGvar = kwargs.pop("optimizeGvar")
+    variableFeatures = kwargs.pop("variableFeatures")
+    # the features are compiled from the glyphs as filtered by the preprocessor
+    glyphSets = (
+        [] if variableFeatures and not kwargs["skipFeatureCompilation"] else None
+    )
+
+    ttfDesignSpace = None
+    try:
+        ttfDesignSpace = compileInterpolatableTTFsFromDS(
+            designSpaceDoc,
+            **{
+                **kwargs,
+                **dict(
+                    # will rename glyphs after varfont is built
+                    useProductionNames=False,
+                    # No need to post-process intermediate fonts.
+                    postProcessorClass=None,
+                    skipFeatureCompilation=(
+                        variableFeatures or kwargs["skipFeatureCompilation"]
+                    ),
+                    _glyphSets=glyphSets,
+                ),
+            },
+        )
+
+        logger.info("Building variable TTF font")
+
+        varfont = varLib.build(
+            ttfDesignSpace,
+            exclude=_excludeLayoutTables(excludeVariationTables, variableFeatures),
+            optimize=optimizeGvar,
+        )[0]
+        if kwargs["spillDir"] is not None:
+            _loadAllTables(varfont)
+    finally:
+        # if compiling a master failed, those already spilled have been removed
+        if kwargs["spillDir"] is not None and ttfDesignSpace is not None:
+            _removeSpilledFonts(source.font for source in ttfDesignSpace.sources)
+
+    if glyphSets is not None:
+        compileVariableFeatures(
+            designSpaceDoc, varfont, excludeVariationTables, glyphSets, **kwargs
+        )
+
+    return call_postprocessor(varfont, baseUfo, glyphSet=None, **kwargs)
+
+
+compileVariableCFF2_args = {
+    **base_args,
+    **dict(
+        preProcessorClass=OTFPreProcessor,
+        outlineCompilerClass=OutlineCFF2Compiler,
+        roundTolerance=None,
+        excludeVariationTables=(),
+        optimizeCFF=CFFOptimization.SPECIALIZE,
+        cacheDir=None,
+        variableFeatures=False,
+        spillDir=None,
+    ),
+}
+
+
+def compileVariableCFF2(designSpaceDoc, **kwargs):
+    """Create FontTools CFF2 variable font from the DesignSpaceDocument UFO sources
+    with interpolatable outlines, using fontTools.varLib.build.
+
+    *excludeVariationTables* is a list of sfnt table tags (str) that is passed on
+      to fontTools.varLib.build, to skip building some variation tables.
+
+    *optimizeCFF* (int) defines whether the CFF charstrings should be
+      specialized and subroutinized. 1 (default) only enables the specialization;
+      2 (default) does both specialization and subroutinization. The value 0 is supposed
+      to disable both optimizations, however it's currently unused, because fontTools
+      has some issues generating a VF with non-specialized CFF2 charstrings:
+      fonttools/fonttools#1979.
+      NOTE: Subroutinization of variable CFF2 requires the "cffsubr" extra requirement.
+
+    *cacheDir* (Optional[str]) is the path to a directory where the subroutinized
+      CFF2 table is cached between builds, same as in compileOTF.
+
+    *spillDir* (Optional[str]) is the path to a directory where the masters are
+      saved as soon as they are compiled, and read back from by fontTools.varLib,
+      so that they don't all have to be held in memory at once. The files are
+      removed once the variable font is built.
+
+    *variableFeatures* (bool) works the same as in compileVariableTTF.
+
+    The rest of the arguments works the same as in the other compile functions.
+
+    Returns a new variable TTFont object.
+    """
+    kwargs = init_kwargs(kwargs, compileVariableCFF2_args)
+    loadSourceFonts(designSpaceDoc, jobs=1)
+    baseUfo = getDefaultMasterFont(designSpaceDoc)
+
+    excludeVariationTables = kwargs.pop("excludeVariationTables")
+    cacheDir = kwargs.pop("cacheDir")
+    variableFeatures = kwargs.pop("variableFeatures")
+    # the features are compiled from the glyphs as filtered by the preprocessor
+    glyphSets = (
+        [] if variableFeatures and not kwargs["skipFeatureCompilation"] else None
+    )
+
+    otfDesignSpace = None
+    try:
+        otfDesignSpace = compileInterpolatableOTFsFromDS(
+            designSpaceDoc,
+            **{
+                **kwargs,
+                **dict(
+                    # will rename glyphs after varfont is built
+                    useProductionNames=False,
+                    # No need to post-process intermediate fonts.
+                    postProcessorClass=None,
+                    skipFeatureCompilation=(
+                        variableFeatures or kwargs["skipFeatureCompilation"]
+                    ),
+                    _glyphSets=glyphSets,
+                ),
+            },
+        )
+
+        logger.info("Building variable CFF2 font")
+
+        optimizeCFF = CFFOptimization(kwargs.pop("optimizeCFF"))
+
+        varfont = varLib.build(
+            otfDesignSpace,
+            exclude=_excludeLayoutTables(excludeVariationTables, variableFeatures),
+            # NOTE optimize=False won't change anything until this PR is merged
+            # https://github.com/fonttools/fonttools/pull/1979
+            optimize=optimizeCFF >= CFFOptimization.SPECIALIZE,
+        )[0]
+        if kwargs["spillDir"] is not None:
+            _loadAllTables(varfont)
+    finally:
+        # if compiling a master failed, those already spilled have been removed
+        if kwargs["spillDir"] is not None and otfDesignSpace is not None:
+            _removeSpilledFonts(source.font for source in otfDesignSpace.sources)
+
+    if glyphSets is not None:
+        compileVariableFeatures(
+            designSpaceDoc, varfont, excludeVariationTables, glyphSets, **kwargs
+        )
+
+    return call_postprocessor(
+        varfont,
+        baseUfo,
+        glyphSet=None,
+        **kwargs,
+        optimizeCFF=optimizeCFF >= CFFOptimization.SUBROUTINIZE,
+        cacheDir=cacheDir,
+    )
@@ -0,0 +1,231 @@
+"""A long-running local build server.
+
+The server keeps ufo2ft and its dependencies imported, and the parsed sources
+in memory, between builds. It accepts build requests over a Unix socket, so
+repeated builds of the same sources (e.g. test builds from a font editor) only
+pay for compiling the fonts.
+
+Start it with ``python -m ufo2ft.buildServer SOCKET``, and submit targets with
+``python -m ufo2ft --server SOCKET SOURCE...``.
+
+The protocol is one JSON object per line. A request looks like::
+
+    {"targets": [[source, format, output], ...], "cacheDir": null}
+
+and is answered with ``{"ok": true, "timings": [...]}``, or with
+``{"ok": false, "error": "..."}`` if any target failed to build.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import traceback
+from collections import OrderedDict
+
+from ufo2ft.__main__ import BuildTarget, buildTarget, loader
+from ufo2ft.errors import Error
+
+logger = logging.getLogger("ufo2ft.buildServer")
+
+# modules imported when the server starts, so that the first build doesn't
+# pay for importing them
+WARM_MODULES = [
+    "fontTools.feaLib.builder",
+    "fontTools.varLib",
+    "fontTools.otlLib.optimize",
+    "cu2qu.ufo",
+    "booleanOperations",
+    "cffsubr",
+    "compreffor",
+    "pathops",
+]
+
+
+def warmImports(modules=WARM_MODULES):
+    """Import the given modules, skipping those that aren't installed."""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _fingerprint(path):
+    """Return the size and modification time of all the files in 'path'.
+
+    This is much cheaper than hashing their contents, and is enough to tell
+    whether a source was saved since it was loaded.
+    """
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return ((path, st.st_size, st.st_mtime_ns),)
+    result = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for fileName in sorted(files):
+            filePath = os.path.join(root, fileName)
+            st = os.stat(filePath)
+            result.append((filePath, st.st_size, st.st_mtime_ns))
+    return tuple(result)
+
+
+class SourceCache:
+    """Keep the most recently used UFOs loaded, and reload them when their
+    files change.
+
+    The compile functions don't modify their input UFOs (unless called with
+    inplace=True, which the build server never does), so the same objects can
+    be compiled again.
+    """
+
+    def __init__(self, maxSize=16):
+        self.maxSize = maxSize
+        self._fonts = OrderedDict()
+
+    def loadUFO(self, path):
+        path = os.path.abspath(path)
+        fingerprint = _fingerprint(path)
+        entry = self._fonts.get(path)
+        if entry is not None and entry[0] == fingerprint:
+            self._fonts.move_to_end(path)
+            return entry[1]
+        font = loader(path)
+        self._fonts[path] = (fingerprint, font)
+        self._fonts.move_to_end(path)
+        while len(self._fonts) > self.maxSize:
+            self._fonts.popitem(last=False)
+        return font
+
+    def load(self, source):
+        """Return the UFO, or the DesignSpaceDocument with its source fonts
+        loaded, at the 'source' path.
+        """
+        if source.endswith(".designspace"):
+            from fontTools.designspaceLib import DesignSpaceDocument
+
+            doc = DesignSpaceDocument.fromfile(source)
+            doc.loadSourceFonts(self.loadUFO)
+            return doc
+        return self.loadUFO(source)
+
+
+class BuildRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.handleRequest(line)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def _removeStaleSocket(socketPath):
+    # only remove the socket left over by a server that didn't shut down
+    # cleanly: another server may still be listening on it
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socketPath)
+        except ConnectionRefusedError:
+            os.remove(socketPath)
+            return
+    raise Error(f"A build server is already listening on {socketPath}")
+
+
+class BuildServer(socketserver.UnixStreamServer):
+    """Serve build requests on the Unix socket at 'socketPath'.
+
+    Requests are handled one at a time, in the order they are received.
+    """
+
+    def __init__(self, socketPath, cacheDir=None, sourceCache=None):
+        if os.path.exists(socketPath) and stat.S_ISSOCK(os.stat(socketPath).st_mode):
+            _removeStaleSocket(socketPath)
+        super().__init__(socketPath, BuildRequestHandler)
+        self.socketPath = socketPath
+        self.cacheDir = cacheDir
+        self.sourceCache = sourceCache if sourceCache is not None else SourceCache()
+
+    def handleRequest(self, data):
+        try:
+            request = json.loads(data)
+            targets = [BuildTarget(*t) for t in request["targets"]]
+            cacheDir = request.get("cacheDir") or self.cacheDir
+            timings = [
+                buildTarget(t, cacheDir=cacheDir, loadSource=self.sourceCache.load)
+                for t in targets
+            ]
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, "timings": timings}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+
+
+def submitTargets(socketPath, targets, cacheDir=None):
+    """Send 'targets' to the build server listening at 'socketPath', wait for
+    them to be built, and return the timings of each.
+
+    Raises ufo2ft.errors.Error if the server failed to build them.
+    """
+    # the server may run in a different working directory
+    request = {
+        "targets": [[os.path.abspath(s), f, os.path.abspath(o)] for s, f, o in targets],
+        "cacheDir": cacheDir and os.path.abspath(cacheDir),
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socketPath)
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(request).encode("utf-8") + b"\n")
+            f.flush()
+            response = json.loads(f.readline())
+    if not response["ok"]:
+        raise Error(f"Build server failed: {response['error']}")
+    return response["timings"]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="ufo2ft.buildServer",
+        description="Serve ufo2ft build requests on a Unix socket",
+    )
+    parser.add_argument("socket", metavar="SOCKET", help="path of the socket")
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="directory where compiled fonts and subroutinized CFF tables "
+        "are cached between builds",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="print more messages"
+    )
+    options = parser.parse_args(args)
+
+    logging.basicConfig(
+        level=logging.INFO if options.verbose else logging.WARNING,
+        format="%(levelname)s:%(name)s: %(message)s",
+    )
+
+    # shut down cleanly, removing the socket, when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    warmImports()
+    with BuildServer(options.socket, cacheDir=options.cache_dir) as server:
+        logger.info("Serving builds on %s", options.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
+import hashlib
 import logging
 import os
+import pickle
 from collections import OrderedDict
+from copy import copy, deepcopy
 from inspect import isclass
 from io import StringIO
 from tempfile import NamedTemporaryFile
+from types import SimpleNamespace
 
 from fontTools import mtiLib
-from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.feaLib.builder import LOOKUP_DEBUG_ENV_VAR, Builder
 from fontTools.feaLib.error import FeatureLibError, IncludedFeaNotFound
+from fontTools.feaLib.lexer import IncludingLexer
 from fontTools.feaLib.parser import Parser
+from fontTools.feaLib.variableScalar import VariableScalar
+from fontTools.ttLib import newTable
 
 from ufo2ft.constants import MTI_FEATURES_PREFIX
 from ufo2ft.featureWriters import (
@@ -22,10 +29,45 @@ from ufo2ft.featureWriters import (
 
 logger = logging.getLogger(__name__)
 
+# UseMarkFilteringSet and MarkAttachmentType lookup flags
+_MARK_CLASS_LOOKUP_FLAGS = 0x0010 | 0xFF00
 
-def parseLayoutFeatures(font):
+
+class _FeaBuilder(Builder):
+    """A feaLib Builder which leaves the variable anchors of the AST intact.
+
+    feaLib replaces the variable scalars of an Anchor with their default
+    value while building it, so an anchor shared by several rules (e.g. the
+    mark class definitions used by both the mark and mkmk lookups) would
+    only be variable the first time. We build a copy of these anchors.
+    """
+
+    def makeOpenTypeAnchor(self, location, anchor):
+        if anchor is not None and (
+            isinstance(anchor.x, VariableScalar) or isinstance(anchor.y, VariableScalar)
+        ):
+            anchor = copy(anchor)
+        return super().makeOpenTypeAnchor(location, anchor)
+
+
+# Pickled FeatureFile ASTs, keyed by the feature text, the include directory and
+# the set of glyph names; each entry also stores the hashes of the included files
+# so that edits to the latter invalidate it. Unpickling a new copy for each caller
+# is considerably faster than both re-parsing and copy.deepcopy for large ASTs.
+# See parseLayoutFeatures.
+FEATURE_FILE_CACHE_SIZE = 16
+_featureFileCache = OrderedDict()
+
+
+def parseLayoutFeatures(font, useCache=True):
     """Parse OpenType layout features in the UFO and return a
     feaLib.ast.FeatureFile instance.
+
+    Parsed feature files are cached in memory, keyed by the feature text, the
+    glyph names and the content of the included files, so that e.g. masters
+    of an interpolatable family sharing the same features are only parsed
+    once. The caller always gets a new copy of the FeatureFile, which it is
+    free to modify. Pass useCache=False to always re-parse.
     """
     featxt = font.features.text or ""
     if not featxt:
@@ -43,8 +85,24 @@ def parseLayoutFeatures(font):
         buf.name = os.path.join(ufoPath, "features.fea")
         includeDir = os.path.dirname(ufoPath)
     glyphNames = set(font.keys())
+
+    if useCache:
+        # without a UFO path, relative includes are resolved from the current dir
+        cacheKey = (
+            featxt,
+            getattr(buf, "name", None),
+            includeDir if includeDir is not None else os.getcwd(),
+            frozenset(glyphNames),
+        )
+        cached = _getCachedFeatureFile(cacheKey)
+        if cached is not None:
+            return cached
+
+    includes = {}
     try:
-        parser = Parser(buf, glyphNames, includeDir=includeDir)
+        parser = _IncludeRecordingParser(
+            buf, glyphNames, includeDir=includeDir, includes=includes
+        )
         doc = parser.parse()
     except IncludedFeaNotFound as e:
         if ufoPath and os.path.exists(os.path.join(ufoPath, e.args[0])):
@@ -55,15 +113,73 @@ def parseLayoutFeatures(font):
                 "contained in it."
             )
         raise
+
+    if useCache:
+        _featureFileCache[cacheKey] = (
+            pickle.dumps(doc, pickle.HIGHEST_PROTOCOL),
+            includes,
+        )
+        _featureFileCache.move_to_end(cacheKey)
+        while len(_featureFileCache) > FEATURE_FILE_CACHE_SIZE:
+            _featureFileCache.popitem(last=False)
     return doc
 
 
+class _IncludeRecordingLexer(IncludingLexer):
+    """An IncludingLexer that stores in the 'includes' dict the path and
+    content hash of every feature file that gets included.
+    """
+
+    def __init__(self, featurefile, *, includeDir=None, includes=None):
+        self.includes = includes if includes is not None else {}
+        super().__init__(featurefile, includeDir=includeDir)
+
+    def make_lexer_(self, file_or_path):
+        lexer = super().make_lexer_(file_or_path)
+        if not hasattr(file_or_path, "read"):
+            self.includes[file_or_path] = _hashFile(file_or_path)
+        return lexer
+
+
+class _IncludeRecordingParser(Parser):
+    """A feaLib Parser that records the included feature files."""
+
+    def __init__(self, featurefile, glyphNames=(), includeDir=None, includes=None):
+        # the lexer is created and advanced upon initialization, so we replace
+        # the default one before any token is read
+        super().__init__(StringIO(), glyphNames, includeDir=includeDir)
+        self.lexer_ = _IncludeRecordingLexer(
+            featurefile, includeDir=includeDir, includes=includes
+        )
+        self.advance_lexer_(comments=True)
+
+
+def _hashFile(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _getCachedFeatureFile(cacheKey):
+    try:
+        data, includes = _featureFileCache[cacheKey]
+    except KeyError:
+        return None
+    if any(_hashFile(path) != digest for path, digest in includes.items()):
+        del _featureFileCache[cacheKey]
+        return None
+    _featureFileCache.move_to_end(cacheKey)
+    return pickle.loads(data)
+
+
 class BaseFeatureCompiler:
     """Base class for generating OpenType features and compiling OpenType
     layout tables from these.
     """
 
-    def __init__(self, ufo, ttFont=None, glyphSet=None, **kwargs):
+    def __init__(self, ufo, ttFont=None, glyphSet=None, compileContext=None, **kwargs):
         """
         Args:
           ufo: an object representing a UFO (defcon.Font or equivalent)
@@ -73,8 +189,12 @@ class BaseFeatureCompiler:
             the same glyph order as the ufo object.
           glyphSet: a (optional) dict containing pre-processed copies of
             the UFO glyphs.
+          compileContext: an (optional) ufo2ft.util.CompileContext holding
+            the glyph order, character mapping, etc. already computed by
+            the previous stages of the build.
         """
         self.ufo = ufo
+        self.compileContext = compileContext
 
         if ttFont is None:
             from fontTools.ttLib import TTFont
@@ -82,7 +202,10 @@ class BaseFeatureCompiler:
             from ufo2ft.util import makeOfficialGlyphOrder
 
             ttFont = TTFont()
-            ttFont.setGlyphOrder(makeOfficialGlyphOrder(ufo))
+            if compileContext is not None:
+                ttFont.setGlyphOrder(compileContext.glyphOrder)
+            else:
+                ttFont.setGlyphOrder(makeOfficialGlyphOrder(ufo))
         self.ttFont = ttFont
 
         glyphOrder = ttFont.getGlyphOrder()
@@ -90,7 +213,14 @@ class BaseFeatureCompiler:
             assert set(glyphOrder) == set(glyphSet.keys())
         else:
             glyphSet = ufo
-        self.glyphSet = OrderedDict((gn, glyphSet[gn]) for gn in glyphOrder)
+        if (
+            compileContext is not None
+            and compileContext.glyphSet is glyphSet
+            and compileContext.glyphOrder == glyphOrder
+        ):
+            self.glyphSet = compileContext.orderedGlyphSet
+        else:
+            self.glyphSet = OrderedDict((gn, glyphSet[gn]) for gn in glyphOrder)
 
     def setupFeatures(self):
         """Make the features source.
@@ -156,7 +286,16 @@ class FeatureCompiler(BaseFeatureCompiler):
         CursFeatureWriter,
     ]
 
-    def __init__(self, ufo, ttFont=None, glyphSet=None, featureWriters=None, **kwargs):
+    def __init__(
+        self,
+        ufo,
+        ttFont=None,
+        glyphSet=None,
+        featureWriters=None,
+        buildFromAST=True,
+        compileContext=None,
+        **kwargs,
+    ):
         """
         Args:
           featureWriters: a list of BaseFeatureWriter subclasses or
@@ -169,8 +308,17 @@ class FeatureCompiler(BaseFeatureCompiler):
               (or "dist" for Indic scripts), "mark" and "mkmk" features.
             If the featureWriters list is empty, no automatic feature is
             generated and only pre-existing features are compiled.
+          buildFromAST: if True (default), the OpenType tables are built
+            directly from the feature file AST as modified by the feature
+            writers, instead of stringifying the latter and parsing it again.
+            The features' text is then only generated on demand, e.g. when
+            compilation fails, so that errors point to the correct lines.
         """
-        BaseFeatureCompiler.__init__(self, ufo, ttFont, glyphSet)
+        BaseFeatureCompiler.__init__(
+            self, ufo, ttFont, glyphSet, compileContext=compileContext
+        )
+
+        self.buildFromAST = buildFromAST
 
         self.initFeatureWriters(featureWriters)
 
@@ -222,18 +370,51 @@ class FeatureCompiler(BaseFeatureCompiler):
         may override this method to handle the file creation
         in a different way if desired.
         """
+        # In an interpolatable build, the GSUB tables compiled by the masters
+        # are shared (see ufo2ft.util.GSUBCache), keyed by the GSUB features
+        # once the GSUB feature writers, which come first, have run.
+        self._gsubCacheKey = None
+        hashGSUB = getattr(self.compileContext, "gsubCache", None) is not None
         if self.featureWriters:
             featureFile = parseLayoutFeatures(self.ufo)
+            glyphOrder = self.ttFont.getGlyphOrder()
 
             for writer in self.featureWriters:
+                if hashGSUB and writer.tableTag != "GSUB":
+                    self._gsubCacheKey = _hashGSUBFeatures(featureFile, glyphOrder)
+                    hashGSUB = False
                 writer.write(self.ufo, featureFile, compiler=self)
+            if hashGSUB:
+                self._gsubCacheKey = _hashGSUBFeatures(featureFile, glyphOrder)
 
-            # stringify AST to get correct line numbers in error messages
-            self.features = featureFile.asFea()
+            if self.buildFromAST:
+                # the features' text is only generated lazily, if requested
+                self.featureFile = featureFile
+            else:
+                # stringify AST to get correct line numbers in error messages
+                self.features = featureFile.asFea()
         else:
             # no featureWriters, simply read existing features' text
             self.features = self.ufo.features.text or ""
 
+    @property
+    def features(self):
+        """The text of the features to compile."""
+        try:
+            return self._features
+        except AttributeError:
+            featureFile = getattr(self, "featureFile", None)
+            if featureFile is None:
+                raise
+            self._features = featureFile.asFea()
+            return self._features
+
+    @features.setter
+    def features(self, text):
+        # explicitly set features' text takes precedence over the AST
+        self._features = text
+        self.featureFile = None
+
     def writeFeatures(self, outfile):
         if hasattr(self, "features"):
             outfile.write(self.features)
@@ -247,16 +428,38 @@ class FeatureCompiler(BaseFeatureCompiler):
         may override this method to handle the table compilation
         in a different way if desired.
         """
-
-        if not self.features:
+        featureFile = getattr(self, "featureFile", None)
+        if featureFile is not None:
+            if not featureFile.statements:
+                return
+        elif not self.features:
             return
 
-        # the path is used by the lexer to follow 'include' statements;
-        # if we generated some automatic features, includes have already been
-        # resolved, and we work from a string which does't exist on disk
-        path = self.ufo.path if not self.featureWriters else None
+        tables = self._setupCachedGSUB()
+        if featureFile is not None:
+            try:
+                _FeaBuilder(self.ttFont, featureFile).build(tables=tables)
+            except FeatureLibError:
+                # The statements generated by the feature writers lack a location:
+                # compile the features' text instead, so that the error is
+                # reported with the correct line numbers.
+                self._buildTablesFromString(path=None, tables=tables)
+        else:
+            # the path is used by the lexer to follow 'include' statements;
+            # if we generated some automatic features, includes have already been
+            # resolved, and we work from a string which does't exist on disk
+            path = self.ufo.path if not self.featureWriters else None
+            self._buildTablesFromString(path, tables=tables)
+
+        if tables is None:
+            self._cacheGSUB()
+
+    def _buildTablesFromString(self, path, tables=None):
         try:
-            addOpenTypeFeaturesFromString(self.ttFont, self.features, filename=path)
+            featureFile = StringIO(self.features)
+            if path is not None:
+                featureFile.name = path
+            _FeaBuilder(self.ttFont, featureFile).build(tables=tables)
         except FeatureLibError:
             if path is None:
                 # if compilation fails, create temporary file for inspection
@@ -266,6 +469,225 @@ class FeatureCompiler(BaseFeatureCompiler):
                 logger.error("Compilation failed! Inspect temporary file: %r", tmp.name)
             raise
 
+    def _setupCachedGSUB(self):
+        """If a GSUB table was already compiled from the same GSUB features and
+        glyph order, add a copy of it to the font and return the set of the
+        remaining tables to build; else return None, to build all the tables.
+
+        **This should not be called externally.**
+        """
+        key = getattr(self, "_gsubCacheKey", None)
+        if key is None or os.environ.get(LOOKUP_DEBUG_ENV_VAR):
+            return None
+        cache = self.compileContext.gsubCache.tables
+        if key not in cache:
+            return None
+        table = cache[key]
+        if table is not None:
+            # the table must be in the font before the other tables are built,
+            # for the OS/2.usMaxContext is computed from both GSUB and GPOS.
+            # We copy the otTables objects instead of compiling and decompiling
+            # them, as varLib expects the same value types in all the masters.
+            gsub = self.ttFont["GSUB"] = newTable("GSUB")
+            gsub.table = deepcopy(table)
+        elif "GSUB" in self.ttFont:
+            del self.ttFont["GSUB"]
+        return Builder.supportedTables - {"GSUB"}
+
+    def _cacheGSUB(self):
+        """Store the compiled GSUB table for the other masters sharing the
+        same GSUB features and glyph order.
+
+        **This should not be called externally.**
+        """
+        key = getattr(self, "_gsubCacheKey", None)
+        if key is None:
+            return
+        if "GSUB" in self.ttFont:
+            gsub = self.ttFont["GSUB"]
+            # The indices of the mark filtering sets and mark attachment classes
+            # are assigned in the order they are encountered in both GSUB and
+            # GPOS features, and the latter may differ between masters.
+            if gsub.table.LookupList and any(
+                lookup.LookupFlag & _MARK_CLASS_LOOKUP_FLAGS
+                for lookup in gsub.table.LookupList.Lookup
+            ):
+                return
+            table = deepcopy(gsub.table)
+        else:
+            table = None
+        self.compileContext.gsubCache.tables[key] = table
+
+
+_POSITIONING_STATEMENTS = (
+    ast.SinglePosStatement,
+    ast.PairPosStatement,
+    ast.CursivePosStatement,
+    ast.MarkBasePosStatement,
+    ast.MarkLigPosStatement,
+    ast.MarkMarkPosStatement,
+    ast.ChainContextPosStatement,
+)
+# statements which can appear in positioning blocks without making them
+# relevant to the GSUB table
+_NEUTRAL_STATEMENTS = (
+    ast.Comment,
+    ast.LookupFlagStatement,
+    ast.ScriptStatement,
+    ast.LanguageStatement,
+    ast.SubtableStatement,
+)
+
+
+def _isPositioningBlock(block):
+    """Return True if the feature or lookup 'block' only contains positioning
+    rules, and thus can't affect the GSUB table."""
+    hasPositioning = False
+    for statement in block.statements:
+        if isinstance(statement, (ast.FeatureBlock, ast.LookupBlock)):
+            if not _isPositioningBlock(statement):
+                return False
+            hasPositioning = True
+        elif isinstance(statement, _POSITIONING_STATEMENTS):
+            hasPositioning = True
+        elif not isinstance(statement, _NEUTRAL_STATEMENTS):
+            return False
+    return hasPositioning
+
+
+def _hashGSUBFeatures(featureFile, glyphOrder):
+    """Hash the top-level statements of 'featureFile' that may affect the GSUB
+    table, i.e. all except the positioning features and lookups, and the
+    glyph order."""
+    h = hashlib.sha256()
+    for statement in featureFile.statements:
+        if isinstance(
+            statement, (ast.FeatureBlock, ast.LookupBlock)
+        ) and _isPositioningBlock(statement):
+            continue
+        h.update(statement.asFea().encode("utf-8"))
+        h.update(b"\n")
+    h.update(b"\0")
+    h.update("\0".join(glyphOrder).encode("utf-8"))
+    return h.hexdigest()
+
+
+class VariableFeatureCompiler(FeatureCompiler):
+    """Generate automatic features and compile the OpenType layout tables of a
+    variable font from all the sources of a designspace at once.
+
+    The feature writers read the kerning and anchors of every source, and the
+    values which vary across them are compiled with feaLib variable scalars,
+    whose deltas are stored in the GDEF variation store. This builds a single
+    GPOS table for the variable font, instead of one per master which
+    fontTools.varLib would then have to merge. Unlike the latter, the anchors
+    of the glyphs in sparse layer sources are also taken into account.
+    """
+
+    def __init__(
+        self,
+        ufo,
+        ttFont=None,
+        glyphSet=None,
+        designSpace=None,
+        glyphSets=None,
+        featureWriters=None,
+        buildFromAST=True,
+        **kwargs,
+    ):
+        """
+        Args:
+          ufo: the font of the default source.
+          ttFont: the variable TTFont, which must contain an 'fvar' table.
+          designSpace: a DesignSpaceDocument whose SourceDescriptor objects
+            have the 'font' attribute set to the loaded UFO objects.
+          glyphSets: the preprocessed glyph sets of the designspace sources, in
+            the same order. If None, the glyphs of the sources' layers are used
+            as they are, without the preprocessor's filters.
+        """
+        if designSpace is None:
+            raise TypeError("missing required 'designSpace' argument")
+        if ttFont is None or "fvar" not in ttFont:
+            raise ValueError("ttFont must be a variable font with an 'fvar' table")
+        self.designSpace = designSpace
+        self.axes = ttFont["fvar"].axes
+        self.sources = self._getSources(designSpace, self.axes, glyphSets)
+
+        if glyphSet is None:
+            glyphSet = self._getDefaultGlyphSet(ufo, ttFont.getGlyphOrder())
+
+        super().__init__(
+            ufo,
+            ttFont,
+            glyphSet=glyphSet,
+            featureWriters=featureWriters,
+            buildFromAST=buildFromAST,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _getSources(designSpace, axes, glyphSets=None):
+        from fontTools.varLib import load_designspace
+
+        ds = load_designspace(designSpace)
+        if glyphSets is not None and len(glyphSets) != len(ds.masters):
+            raise ValueError(
+                f"expected {len(ds.masters)} glyph sets, found {len(glyphSets)}"
+            )
+        axesByTag = {axis.axisTag: axis for axis in axes}
+        sources = []
+        for i, (master, normalizedLocation) in enumerate(
+            zip(ds.masters, ds.normalized_master_locs)
+        ):
+            # feaLib normalizes the locations of variable scalars with the 'fvar'
+            # axes only, ignoring 'avar': we use the user-space coordinates that
+            # are normalized to the same master locations as in fontTools.varLib
+            location = {}
+            for axisName, value in normalizedLocation.items():
+                axis = axesByTag[ds.axes[axisName].tag]
+                if value >= 0:
+                    delta = axis.maxValue - axis.defaultValue
+                else:
+                    delta = axis.defaultValue - axis.minValue
+                location[axis.axisTag] = axis.defaultValue + value * delta
+
+            font = master.font
+            if glyphSets is not None:
+                glyphSet = glyphSets[i]
+            else:
+                if master.layerName is not None:
+                    layer = font.layers[master.layerName]
+                else:
+                    layer = font.layers.defaultLayer
+                glyphSet = {glyph.name: glyph for glyph in layer}
+            sources.append(
+                SimpleNamespace(
+                    location=location,
+                    font=font,
+                    layerName=master.layerName,
+                    glyphSet=glyphSet,
+                )
+            )
+        return sources
+
+    def _getDefaultGlyphSet(self, ufo, glyphOrder):
+        from ufo2ft.outlineCompiler import StubGlyph
+
+        for source in self.sources:
+            if source.font is ufo and source.layerName is None:
+                sourceGlyphs = source.glyphSet
+                break
+        else:
+            sourceGlyphs = {glyph.name: glyph for glyph in ufo}
+        glyphSet = {}
+        for glyphName in glyphOrder:
+            glyph = sourceGlyphs.get(glyphName)
+            if glyph is None:
+                # glyphs generated by the outline compiler, e.g. '.notdef'
+                glyph = StubGlyph(glyphName, 0, 0, 0, 0)
+            glyphSet[glyphName] = glyph
+        return glyphSet
+
 
 class MtiFeatureCompiler(BaseFeatureCompiler):
     """Compile OpenType layout tables from MTI feature files using
@@ -5,12 +5,6 @@ from inspect import getfullargspec, isclass
 from ufo2ft.constants import FEATURE_WRITERS_KEY
 from ufo2ft.util import _loadPluginFromString
 
-from .baseFeatureWriter import BaseFeatureWriter
-from .cursFeatureWriter import CursFeatureWriter
-from .gdefFeatureWriter import GdefFeatureWriter
-from .kernFeatureWriter import KernFeatureWriter
-from .markFeatureWriter import MarkFeatureWriter
-
 __all__ = [
     "BaseFeatureWriter",
     "CursFeatureWriter",
@@ -22,6 +16,29 @@ __all__ = [
 
 logger = logging.getLogger(__name__)
 
+# the built-in feature writers are only imported on first access
+_featureWriterModules = {
+    "BaseFeatureWriter": "baseFeatureWriter",
+    "CursFeatureWriter": "cursFeatureWriter",
+    "GdefFeatureWriter": "gdefFeatureWriter",
+    "KernFeatureWriter": "kernFeatureWriter",
+    "MarkFeatureWriter": "markFeatureWriter",
+}
+
+
+def __getattr__(name):
+    try:
+        moduleName = _featureWriterModules[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    module = importlib.import_module(f"{__name__}.{moduleName}")
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_featureWriterModules))
+
 
 def isValidFeatureWriter(klass):
     """Return True if 'klass' is a valid feature writer class.
@@ -33,6 +50,8 @@ def isValidFeatureWriter(klass):
 
            def write(self, font, feaFile, compiler=None)
     """
+    from .baseFeatureWriter import BaseFeatureWriter
+
     if not isclass(klass):
         logger.error("%r is not a class", klass)
         return False
@@ -11,7 +11,8 @@ import re
 import sys
 
 from fontTools import unicodedata
-from fontTools.feaLib import ast
+from fontTools.feaLib import ast, variableScalar
+from fontTools.varLib.models import VariationModel, normalizeValue
 
 self = sys.modules[__name__]
 for name in getattr(ast, "__all__", dir(ast)):
@@ -20,14 +21,115 @@ for name in getattr(ast, "__all__", dir(ast)):
 del sys, self, name
 
 
-def getScriptLanguageSystems(feaFile):
-    """Return dictionary keyed by Unicode script code containing lists of
-    (OT_SCRIPT_TAG, [OT_LANGUAGE_TAG, ...]) tuples (excluding "DFLT").
+class FeatureFileIndex:
+    """Index of the top-level statements of a FeatureFile, built in a single
+    pass over the statement tree, so that a feature writer can look up feature
+    blocks, tables, class definitions, language systems and comments without
+    walking the whole tree each time.
+
+    BaseFeatureWriter makes a new index for each `write` pass, available as
+    `context.feaFileIndex`. The statements added or removed via the
+    `addStatements`, `removeStatement` and `removeComment` methods are indexed
+    incrementally; any other change to the feature file is not seen, so the
+    index must not be kept once the feature file may be modified elsewhere.
+
+    The helper functions below also accept an index in place of a FeatureFile.
     """
+
+    def __init__(self, feaFile):
+        self.feaFile = feaFile
+        self.featureBlocks = collections.OrderedDict()
+        self.tables = collections.OrderedDict()
+        self.classDefinitions = []
+        self.languageSystems = []
+        self.comments = []
+        for statement in feaFile.statements:
+            self._add(statement)
+
+    def _add(self, statement):
+        if isinstance(statement, ast.FeatureBlock):
+            self.featureBlocks.setdefault(statement.name, []).append(statement)
+        elif isinstance(statement, ast.TableBlock):
+            self.tables.setdefault(statement.name, statement)
+        elif isinstance(statement, ast.GlyphClassDefinition):
+            self.classDefinitions.append(statement)
+        elif isinstance(statement, ast.LanguageSystemStatement):
+            self.languageSystems.append(statement)
+        if hasattr(statement, "statements"):
+            for res in _iterComments(statement):
+                self.comments.append((statement, *res))
+        elif isinstance(statement, ast.Comment):
+            self.comments.append((statement,))
+
+    def addStatements(self, statements):
+        """Index the given statements, which were just added at the top
+        level of the feature file.
+        """
+        for statement in statements:
+            self._add(statement)
+
+    def removeStatement(self, statement):
+        """Forget the given statement, which was just removed from the top
+        level of the feature file.
+        """
+        if isinstance(statement, ast.FeatureBlock):
+            blocks = self.featureBlocks[statement.name]
+            blocks.remove(statement)
+            if not blocks:
+                del self.featureBlocks[statement.name]
+        elif isinstance(statement, ast.TableBlock):
+            tag = statement.name
+            if self.tables.get(tag) is statement:
+                del self.tables[tag]
+                for other in self.feaFile.statements:
+                    if isinstance(other, ast.TableBlock) and other.name == tag:
+                        self.tables[tag] = other
+                        break
+        elif isinstance(statement, ast.GlyphClassDefinition):
+            self.classDefinitions.remove(statement)
+        elif isinstance(statement, ast.LanguageSystemStatement):
+            self.languageSystems.remove(statement)
+        self.comments = [match for match in self.comments if match[0] is not statement]
+
+    def removeComment(self, comment):
+        """Forget the given comment, which was just removed from the feature
+        file or from one of its blocks.
+        """
+        self.comments = [match for match in self.comments if match[-1] is not comment]
+
+    def findFeatureTags(self):
+        return set(self.featureBlocks)
+
+    def iterFeatureBlocks(self, tag=None):
+        if tag is not None:
+            yield from self.featureBlocks.get(tag, ())
+        else:
+            for blocks in self.featureBlocks.values():
+                yield from blocks
+
+    def findTable(self, tag):
+        return self.tables.get(tag)
+
+    def iterClassDefinitions(self, featureTag=None):
+        if featureTag is None:
+            yield from self.classDefinitions
+        for fea in self.iterFeatureBlocks(tag=featureTag):
+            for s in fea.statements:
+                if isinstance(s, ast.GlyphClassDefinition):
+                    yield s
+
+    def findCommentPattern(self, pattern):
+        for match in self.comments:
+            if re.match(pattern, str(match[-1])):
+                yield match
+
+    def getScriptLanguageSystems(self):
+        return _getScriptLanguageSystems(self.languageSystems)
+
+
+def _getScriptLanguageSystems(languageSystems):
     languagesByScript = collections.OrderedDict()
-    for ls in [
-        st for st in feaFile.statements if isinstance(st, ast.LanguageSystemStatement)
-    ]:
+    for ls in languageSystems:
         if ls.script == "DFLT":
             continue
         languagesByScript.setdefault(ls.script, []).append(ls.language)
@@ -39,7 +141,21 @@ def getScriptLanguageSystems(feaFile):
     return langSysMap
 
 
+def getScriptLanguageSystems(feaFile):
+    """Return dictionary keyed by Unicode script code containing lists of
+    (OT_SCRIPT_TAG, [OT_LANGUAGE_TAG, ...]) tuples (excluding "DFLT").
+    """
+    if isinstance(feaFile, FeatureFileIndex):
+        return feaFile.getScriptLanguageSystems()
+    return _getScriptLanguageSystems(
+        st for st in feaFile.statements if isinstance(st, ast.LanguageSystemStatement)
+    )
+
+
 def iterFeatureBlocks(feaFile, tag=None):
+    if isinstance(feaFile, FeatureFileIndex):
+        yield from feaFile.iterFeatureBlocks(tag)
+        return
     for statement in feaFile.statements:
         if isinstance(statement, ast.FeatureBlock):
             if tag is not None and statement.name != tag:
@@ -48,31 +164,46 @@ def iterFeatureBlocks(feaFile, tag=None):
 
 
 def findFeatureTags(feaFile):
+    if isinstance(feaFile, FeatureFileIndex):
+        return feaFile.findFeatureTags()
     return {f.name for f in iterFeatureBlocks(feaFile)}
 
 
+def _iterComments(block):
+    for statement in block.statements:
+        if hasattr(statement, "statements"):
+            for res in _iterComments(statement):
+                yield (statement, *res)
+        elif isinstance(statement, ast.Comment):
+            yield (statement,)
+
+
 def findCommentPattern(feaFile, pattern):
     """
     Yield a tuple of statements, starting with the parent block, followed by
     nested blocks if present, ending with the comment matching a given pattern.
     There is not parent block if the matched comment is a the root level.
     """
-    for statement in feaFile.statements:
-        if hasattr(statement, "statements"):
-            for res in findCommentPattern(statement, pattern):
-                yield (statement, *res)
-        elif isinstance(statement, ast.Comment):
-            if re.match(pattern, str(statement)):
-                yield (statement,)
+    if isinstance(feaFile, FeatureFileIndex):
+        yield from feaFile.findCommentPattern(pattern)
+        return
+    for match in _iterComments(feaFile):
+        if re.match(pattern, str(match[-1])):
+            yield match
 
 
 def findTable(feaLib, tag):
+    if isinstance(feaLib, FeatureFileIndex):
+        return feaLib.findTable(tag)
     for statement in feaLib.statements:
         if isinstance(statement, ast.TableBlock) and statement.name == tag:
             return statement
 
 
 def iterClassDefinitions(feaFile, featureTag=None):
+    if isinstance(feaFile, FeatureFileIndex):
+        yield from feaFile.iterClassDefinitions(featureTag)
+        return
     if featureTag is None:
         # start from top-level class definitions
         for s in feaFile.statements:
@@ -140,8 +271,8 @@ def makeGlyphClassDefinitions(groups, feaFile=None, stripPrefix=""):
 
 
 def makeGlyphClassDefinition(className, members):
-    glyphNames = [ast.GlyphName(g) for g in members]
-    glyphClass = ast.GlyphClass(glyphNames)
+    # like feaLib's parser, store the class members as plain glyph name strings
+    glyphClass = ast.GlyphClass(list(members))
     classDef = ast.GlyphClassDefinition(className, glyphClass)
     return classDef
 
@@ -228,3 +359,46 @@ def getGDEFGlyphClasses(feaLib):
                         else frozenset(),
                     )
     return _GDEFGlyphClasses(None, None, None, None)
+
+
+class VariableScalar(variableScalar.VariableScalar):
+    """A feaLib VariableScalar sharing its VariationModel with all the other
+    scalars defined at the same locations, instead of making a new one each
+    time its deltas are computed.
+    """
+
+    @property
+    def model(self):
+        axes = tuple(
+            (axis.axisTag, axis.minValue, axis.defaultValue, axis.maxValue)
+            for axis in self.axes
+        )
+        return _getVariationModel(tuple(self.values.keys()), axes)
+
+
+@functools.lru_cache(maxsize=128)
+def _getVariationModel(locations, axes):
+    triples = {
+        tag: (minimum, default, maximum) for tag, minimum, default, maximum in axes
+    }
+    normalized = [
+        {tag: normalizeValue(value, triples[tag]) for tag, value in location}
+        for location in locations
+    ]
+    return VariationModel(normalized)
+
+
+def makeVariableScalar(locationValues, axes):
+    """Return a VariableScalar from a list of (location, value) tuples, where
+    location is a dict of axis tags and user-space coordinates, and axes the
+    list of 'fvar' axes. If the value is the same at all locations, the value
+    itself is returned instead.
+    """
+    values = [value for _, value in locationValues]
+    if all(value == values[0] for value in values[1:]):
+        return values[0]
+    scalar = VariableScalar()
+    scalar.axes = axes
+    for location, value in locationValues:
+        scalar.add_value(location, value)
+    return scalar
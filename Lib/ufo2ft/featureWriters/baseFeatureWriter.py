@@ -2,6 +2,8 @@ import logging
 from collections import OrderedDict, namedtuple
 from types import SimpleNamespace
 
+from fontTools.misc.fixedTools import otRound
+
 from ufo2ft.constants import OPENTYPE_CATEGORIES_KEY
 from ufo2ft.errors import InvalidFeaturesData
 from ufo2ft.featureWriters import ast
@@ -75,6 +77,8 @@ class BaseFeatureWriter:
         The default implementation sets:
         - the current font;
         - the current FeatureFile object;
+        - an index of its statements (see ast.FeatureFileIndex), which is
+          only valid for the duration of the current `write` pass;
         - the current compiler instance (only present when this writer was
           instantiated from a FeatureCompiler);
         - a set of features (tags) to be generated. If self.mode is "skip",
@@ -84,13 +88,14 @@ class BaseFeatureWriter:
         """
         todo = set(self.features)
         insertComments = None
+        feaFileIndex = ast.FeatureFileIndex(feaFile)
         if self.mode == "skip":
             if self.insertFeatureMarker is not None:
                 insertComments = self.collectInsertMarkers(
-                    feaFile, self.insertFeatureMarker, todo
+                    feaFileIndex, self.insertFeatureMarker, todo
                 )
             # find existing feature blocks
-            existing = ast.findFeatureTags(feaFile)
+            existing = feaFileIndex.findFeatureTags()
             # ignore features with insert marker
             if insertComments:
                 existing.difference_update(insertComments.keys())
@@ -100,6 +105,7 @@ class BaseFeatureWriter:
         self.context = SimpleNamespace(
             font=font,
             feaFile=feaFile,
+            feaFileIndex=feaFileIndex,
             compiler=compiler,
             todo=todo,
             insertComments=insertComments,
@@ -158,6 +164,7 @@ class BaseFeatureWriter:
 
         statements = feaFile.statements
         inserted = {}
+        feaIndex = self.context.feaFileIndex
 
         # First handle those with a known location, i.e. insert markers
         insertComments = self.context.insertComments
@@ -176,12 +183,14 @@ class BaseFeatureWriter:
 
                 # Remove insert marker(s) from feature block.
                 del block.statements[markerIndex]
+                feaIndex.removeComment(comment)
 
                 # insertFeatureMarker is in a block with only comments.
                 # Replace that block with new feature block.
                 if onlyCommentsBefore and onlyCommentsAfter:
                     index = statements.index(block)
                     statements.remove(block)
+                    feaIndex.removeStatement(block)
 
                 # insertFeatureMarker is at the top of a feature block
                 # or only preceded by other comments.
@@ -208,6 +217,7 @@ class BaseFeatureWriter:
                     )
 
                 statements.insert(index, feature)
+                feaIndex.addStatements([feature])
                 indices.append(index)
                 inserted[id(feature)] = True
 
@@ -217,6 +227,7 @@ class BaseFeatureWriter:
                         break
                     # Insert this before the current one i.e. at same array index
                     statements.insert(index, features[i])
+                    feaIndex.addStatements([features[i]])
                     # All the indices recorded previously have now shifted up by one
                     indices = [index] + [j + 1 for j in indices]
                     inserted[id(features[i])] = True
@@ -227,6 +238,7 @@ class BaseFeatureWriter:
                 continue
             index = len(statements)
             statements.insert(index, feature)
+            feaIndex.addStatements([feature])
             indices.append(index)
 
         # Write classDefs, anchorsDefs, markClassDefs, lookups at earliest
@@ -246,6 +258,7 @@ class BaseFeatureWriter:
             feaFile.statements = statements = (
                 statements[:minindex] + others + statements[minindex:]
             )
+            feaIndex.addStatements(others)
 
     @staticmethod
     def collectInsertMarkers(feaFile, insertFeatureMarker, featureTags):
@@ -269,6 +282,9 @@ class BaseFeatureWriter:
         # in the context of a FeatureCompiler, else create a new mapping from
         # the UFO glyphs
         compiler = self.context.compiler
+        compileContext = getattr(compiler, "compileContext", None)
+        if compileContext is not None:
+            return compileContext.unicodeToGlyphNameMapping
         cmap = None
         if compiler is not None:
             table = compiler.ttFont.get("cmap")
@@ -301,16 +317,70 @@ class BaseFeatureWriter:
         glyphOrder = makeOfficialGlyphOrder(glyphSet, font.glyphOrder)
         return OrderedDict((gn, glyphSet[gn]) for gn in glyphOrder)
 
+    def getVariableSources(self):
+        """Return the list of designspace sources when this writer is used to
+        compile the features of a variable font from all its masters at once
+        (see VariableFeatureCompiler), else None.
+
+        Each source has a 'location' attribute (a dict of axis tags and
+        user-space coordinates), a 'font' and a 'glyphSet' (the glyphs of the
+        source layer).
+        """
+        return getattr(self.context.compiler, "sources", None)
+
+    def getAnchorCoordinates(self, glyphName, anchor, transform=otRound):
+        """Return the x and y coordinates of the given anchor of glyph
+        'glyphName', after applying the 'transform' callable to each value.
+
+        When compiling a variable font, the coordinates of the anchors with the
+        same name in all the sources are combined into VariableScalar objects,
+        unless they are the same everywhere.
+        """
+        x, y = transform(anchor.x), transform(anchor.y)
+        sources = self.getVariableSources()
+        if not sources:
+            return x, y
+
+        xs, ys = [], []
+        for source in sources:
+            glyph = source.glyphSet.get(glyphName)
+            if glyph is None:
+                continue
+            for sourceAnchor in glyph.anchors:
+                if sourceAnchor.name == anchor.name:
+                    xs.append((source.location, transform(sourceAnchor.x)))
+                    ys.append((source.location, transform(sourceAnchor.y)))
+                    break
+        axes = self.context.compiler.axes
+        return ast.makeVariableScalar(xs, axes), ast.makeVariableScalar(ys, axes)
+
     def compileGSUB(self):
         """Compile a temporary GSUB table from the current feature file."""
+        return self._getCompiledGSUB().gsub
+
+    def getGSUBClosure(self):
+        """Return a GSUBClosure object for the temporary GSUB table compiled
+        from the current feature file, to be passed to classifyGlyphs, or
+        None if the feature file contains no substitution rules. Like the
+        GSUB table itself, this is shared by all the writers, so that the
+        glyph closures are only computed once.
+        """
+        from ufo2ft.util import GSUBClosure
+
+        compiled = self._getCompiledGSUB()
+        if compiled.closure is None and compiled.gsub is not None:
+            compiled.closure = GSUBClosure(compiled.gsub)
+        return compiled.closure
+
+    def _getCompiledGSUB(self):
         from ufo2ft.util import compileGSUB
 
         compiler = self.context.compiler
         if compiler is not None:
             # The result is cached in the compiler instance, so if another
             # writer requests one it is not compiled again.
-            if hasattr(compiler, "_gsub"):
-                return compiler._gsub
+            if hasattr(compiler, "_compiledGSUB"):
+                return compiler._compiledGSUB
 
             glyphOrder = compiler.ttFont.getGlyphOrder()
         else:
@@ -318,15 +388,28 @@ class BaseFeatureWriter:
             # compiled to binary, only the glyph names are used
             glyphOrder = sorted(self.context.font.keys())
 
-        gsub = compileGSUB(self.context.feaFile, glyphOrder)
+        # In an interpolatable build, the masters with the same GSUB features
+        # share the same table: once the GSUB feature writers have run, the
+        # compiler has hashed the features (see FeatureCompiler.setupFeatures);
+        # the statements added since then don't change the substitutions.
+        key = getattr(compiler, "_gsubCacheKey", None)
+        cache = compiler.compileContext.gsubCache.compiled if key is not None else {}
+        compiled = cache.get(key)
+        if compiled is None:
+            fvar = compiler.ttFont.get("fvar") if compiler is not None else None
+            gsub = compileGSUB(self.context.feaFile, glyphOrder, fvar=fvar)
+            compiled = cache[key] = SimpleNamespace(gsub=gsub, closure=None)
 
-        if compiler and not hasattr(compiler, "_gsub"):
-            compiler._gsub = gsub
-        return gsub
+        if compiler is not None:
+            compiler._compiledGSUB = compiled
+        return compiled
 
     def getOpenTypeCategories(self):
         """Return 'public.openTypeCategories' values as a tuple of sets of
         unassigned, bases, ligatures, marks, components."""
+        compileContext = getattr(self.context.compiler, "compileContext", None)
+        if compileContext is not None and compileContext.openTypeCategories is not None:
+            return compileContext.openTypeCategories
         font = self.context.font
         unassigned, bases, ligatures, marks, components = (
             set(),
@@ -355,7 +438,7 @@ class BaseFeatureWriter:
                     "when it should be 'unassigned', 'base', 'ligature', 'mark' "
                     "or 'component'."
                 )
-        return namedtuple(
+        categories = namedtuple(
             "OpenTypeCategories", "unassigned base ligature mark component"
         )(
             frozenset(unassigned),
@@ -364,6 +447,9 @@ class BaseFeatureWriter:
             frozenset(marks),
             frozenset(components),
         )
+        if compileContext is not None:
+            compileContext.openTypeCategories = categories
+        return categories
 
     def getGDEFGlyphClasses(self):
         """Return a tuple of GDEF GlyphClassDef base, ligature, mark, component
@@ -373,7 +459,7 @@ class BaseFeatureWriter:
         """
         feaFile = self.context.feaFile
 
-        if ast.findTable(feaFile, "GDEF") is not None:
+        if self.context.feaFileIndex.findTable("GDEF") is not None:
             return ast.getGDEFGlyphClasses(feaFile)
 
         unassigned, bases, ligatures, marks, components = self.getOpenTypeCategories()
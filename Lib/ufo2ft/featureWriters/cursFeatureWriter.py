@@ -1,5 +1,3 @@
-from fontTools.misc.fixedTools import otRound
-
 from ufo2ft.featureWriters import BaseFeatureWriter, ast
 from ufo2ft.util import classifyGlyphs, unicodeScriptDirection
 
@@ -23,8 +21,8 @@ class CursFeatureWriter(BaseFeatureWriter):
     def _makeCursiveFeature(self):
         cmap = self.makeUnicodeToGlyphNameMapping()
         if any(unicodeScriptDirection(uv) == "LTR" for uv in cmap):
-            gsub = self.compileGSUB()
-            dirGlyphs = classifyGlyphs(unicodeScriptDirection, cmap, gsub)
+            closure = self.getGSUBClosure()
+            dirGlyphs = classifyGlyphs(unicodeScriptDirection, cmap, closure)
             shouldSplit = "LTR" in dirGlyphs
         else:
             shouldSplit = False
@@ -98,9 +96,11 @@ class CursFeatureWriter(BaseFeatureWriter):
                 if entryAnchor and exitAnchor:
                     break
                 if anchor.name == "entry":
-                    entryAnchor = ast.Anchor(x=otRound(anchor.x), y=otRound(anchor.y))
+                    x, y = self.getAnchorCoordinates(glyph.name, anchor)
+                    entryAnchor = ast.Anchor(x=x, y=y)
                 elif anchor.name == "exit":
-                    exitAnchor = ast.Anchor(x=otRound(anchor.x), y=otRound(anchor.y))
+                    x, y = self.getAnchorCoordinates(glyph.name, anchor)
+                    exitAnchor = ast.Anchor(x=x, y=y)
 
             # A glyph can have only one of the cursive anchors (e.g. if it
             # attaches on one side only)
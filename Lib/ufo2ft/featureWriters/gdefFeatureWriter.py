@@ -18,7 +18,7 @@ class GdefFeatureWriter(BaseFeatureWriter):
     def setContext(self, font, feaFile, compiler=None):
         ctx = super().setContext(font, feaFile, compiler=compiler)
 
-        ctx.gdefTableBlock = ast.findTable(self.context.feaFile, "GDEF")
+        ctx.gdefTableBlock = ctx.feaFileIndex.findTable("GDEF")
         if ctx.gdefTableBlock:
             for fea in ctx.gdefTableBlock.statements:
                 if isinstance(fea, ast.GlyphClassDefStatement):
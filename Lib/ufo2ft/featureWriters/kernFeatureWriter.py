@@ -1,6 +1,10 @@
+from collections.abc import MutableSet
+from functools import lru_cache
 from types import SimpleNamespace
 
 from fontTools import unicodedata
+from fontTools.feaLib.error import FeatureLibError
+from fontTools.otlLib.builder import PairPosBuilder, buildValue
 
 from ufo2ft.featureWriters import BaseFeatureWriter, ast
 from ufo2ft.util import classifyGlyphs, quantize, unicodeScriptDirection
@@ -103,6 +107,7 @@ RTL_BIDI_TYPES = {"R", "AL"}
 LTR_BIDI_TYPES = {"L", "AN", "EN"}
 
 
+@lru_cache(maxsize=None)
 def unicodeBidiType(uv):
     """Return "R" for characters with RTL direction, or "L" for LTR (whether
     'strong' or 'weak'), or None for neutral direction.
@@ -117,15 +122,88 @@ def unicodeBidiType(uv):
         return None
 
 
+def _glyphName(glyph):
+    """Return the name of a glyph class member, which can either be a plain
+    string or an ast.GlyphName object.
+    """
+    return glyph if isinstance(glyph, str) else glyph.glyph
+
+
+# The horizontal directions and bidirectional types of the glyphs in a kerning
+# pair are stored as bit masks, to keep the memory footprint of each pair small
+DIRECTION_BITS = {"LTR": 1, "RTL": 2}
+BIDI_TYPE_BITS = {"L": 1, "R": 2}
+_LTR, _RTL = DIRECTION_BITS["LTR"], DIRECTION_BITS["RTL"]
+_BIDI_L, _BIDI_R = BIDI_TYPE_BITS["L"], BIDI_TYPE_BITS["R"]
+
+
+def _keysToMask(keys, bits):
+    mask = 0
+    for key in keys:
+        mask |= bits[key]
+    return mask
+
+
+class _MaskSet(MutableSet):
+    """A mutable set view of the keys whose bits are set in a bit mask
+    attribute of a KerningPair; changing the set updates the mask.
+    """
+
+    __slots__ = ("pair", "attribute", "bits")
+
+    def __init__(self, pair, attribute, bits):
+        self.pair = pair
+        self.attribute = attribute
+        self.bits = bits
+
+    @property
+    def mask(self):
+        return getattr(self.pair, self.attribute)
+
+    def __contains__(self, key):
+        return bool(self.mask & self.bits.get(key, 0))
+
+    def __iter__(self):
+        mask = self.mask
+        return (key for key, bit in self.bits.items() if mask & bit)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def add(self, key):
+        setattr(self.pair, self.attribute, self.mask | self.bits[key])
+
+    def discard(self, key):
+        setattr(self.pair, self.attribute, self.mask & ~self.bits.get(key, 0))
+
+    def update(self, *others):
+        for keys in others:
+            for key in keys:
+                self.add(key)
+
+    def __repr__(self):
+        return repr(set(self))
+
+
 class KerningPair:
+    """A kerning pair, with the horizontal directions and bidirectional types
+    of its glyphs.
+
+    The latter are stored as the 'directionMask' and 'bidiTypeMask' bit masks
+    (see DIRECTION_BITS and BIDI_TYPE_BITS). The 'directions' and 'bidiTypes'
+    properties are mutable set views of these masks.
+    """
 
-    __slots__ = ("side1", "side2", "value", "directions", "bidiTypes")
+    __slots__ = ("side1", "side2", "value", "directionMask", "bidiTypeMask")
 
     def __init__(self, side1, side2, value, directions=None, bidiTypes=None):
         if isinstance(side1, str):
             self.side1 = ast.GlyphName(side1)
         elif isinstance(side1, ast.GlyphClassDefinition):
             self.side1 = ast.GlyphClassName(side1)
+        elif isinstance(side1, (ast.GlyphName, ast.GlyphClassName)):
+            # the same AST objects can be shared by multiple pairs
+            self.side1 = side1
         else:
             raise AssertionError(side1)
 
@@ -133,12 +211,30 @@ class KerningPair:
             self.side2 = ast.GlyphName(side2)
         elif isinstance(side2, ast.GlyphClassDefinition):
             self.side2 = ast.GlyphClassName(side2)
+        elif isinstance(side2, (ast.GlyphName, ast.GlyphClassName)):
+            self.side2 = side2
         else:
             raise AssertionError(side2)
 
         self.value = value
-        self.directions = directions or set()
-        self.bidiTypes = bidiTypes or set()
+        self.directionMask = _keysToMask(directions or (), DIRECTION_BITS)
+        self.bidiTypeMask = _keysToMask(bidiTypes or (), BIDI_TYPE_BITS)
+
+    @property
+    def directions(self):
+        return _MaskSet(self, "directionMask", DIRECTION_BITS)
+
+    @directions.setter
+    def directions(self, value):
+        self.directionMask = _keysToMask(value, DIRECTION_BITS)
+
+    @property
+    def bidiTypes(self):
+        return _MaskSet(self, "bidiTypeMask", BIDI_TYPE_BITS)
+
+    @bidiTypes.setter
+    def bidiTypes(self, value):
+        self.bidiTypeMask = _keysToMask(value, BIDI_TYPE_BITS)
 
     @property
     def firstIsClass(self):
@@ -149,18 +245,20 @@ class KerningPair:
         return isinstance(self.side2, ast.GlyphClassName)
 
     @property
-    def glyphs(self):
+    def side1Glyphs(self):
         if self.firstIsClass:
-            classDef1 = self.side1.glyphclass
-            glyphs1 = {g.asFea() for g in classDef1.glyphSet()}
-        else:
-            glyphs1 = {self.side1.asFea()}
+            return tuple(_glyphName(g) for g in self.side1.glyphclass.glyphSet())
+        return (_glyphName(self.side1),)
+
+    @property
+    def side2Glyphs(self):
         if self.secondIsClass:
-            classDef2 = self.side2.glyphclass
-            glyphs2 = {g.asFea() for g in classDef2.glyphSet()}
-        else:
-            glyphs2 = {self.side2.asFea()}
-        return glyphs1 | glyphs2
+            return tuple(_glyphName(g) for g in self.side2.glyphclass.glyphSet())
+        return (_glyphName(self.side2),)
+
+    @property
+    def glyphs(self):
+        return set(self.side1Glyphs) | set(self.side2Glyphs)
 
     def __repr__(self):
         return "<{} {} {} {}{}{}>".format(
@@ -173,6 +271,99 @@ class KerningPair:
         )
 
 
+class _SideMaskGetter:
+    """Return the bit mask of a kerning pair's side, given a dict of bit masks
+    by glyph name. The mask of a glyph class is the OR of its members' masks,
+    and is only computed once per class.
+    """
+
+    def __init__(self, glyphMasks):
+        self.glyphMasks = glyphMasks
+        self.classMasks = {}
+
+    def __call__(self, side):
+        if isinstance(side, ast.GlyphClassName):
+            classDef = side.glyphclass
+            try:
+                return self.classMasks[classDef]
+            except KeyError:
+                glyphMasks = self.glyphMasks
+                mask = 0
+                for glyph in classDef.glyphSet():
+                    mask |= glyphMasks.get(_glyphName(glyph), 0)
+                self.classMasks[classDef] = mask
+                return mask
+        return self.glyphMasks.get(_glyphName(side), 0)
+
+
+def _quantize(value, factor):
+    if isinstance(value, ast.VariableScalar):
+        scalar = ast.VariableScalar()
+        scalar.axes = value.axes
+        scalar.values = {
+            location: quantize(v, factor) for location, v in value.values.items()
+        }
+        return scalar
+    return quantize(value, factor)
+
+
+class KerningPairsStatement(ast.Statement):
+    """A feaLib AST statement containing all the kerning pairs of a lookup.
+
+    Instead of going through one PairPosStatement per kerning pair, when the
+    feature file is built this passes the glyph classes and values directly
+    to the otlLib PairPosBuilder of the current lookup. It is serialized to
+    the equivalent list of 'pos' rules.
+    """
+
+    def __init__(self, pairs, rtl=False, quantization=1, location=None):
+        super().__init__(location)
+        self.pairs = pairs
+        self.rtl = rtl
+        self.quantization = quantization
+
+    def rules(self):
+        """Return the equivalent list of PairPosStatement objects."""
+        return [
+            KernFeatureWriter._makePairPosRule(
+                pair, rtl=self.rtl, quantization=self.quantization
+            )
+            for pair in self.pairs
+        ]
+
+    def asFea(self, indent=""):
+        return ("\n" + indent).join(rule.asFea() for rule in self.rules())
+
+    def build(self, builder):
+        location = self.location
+        lookup = builder.get_lookup_(location, PairPosBuilder)
+        for pair in self.pairs:
+            value = _quantize(pair.value, self.quantization)
+            rtl = self.rtl and not pair.bidiTypeMask & _BIDI_L
+            if isinstance(value, ast.VariableScalar):
+                # let feaLib add the deltas to the font's variation store
+                valueRecord = builder.makeOpenTypeValueRecord(
+                    location,
+                    ast.ValueRecord(xPlacement=value if rtl else None, xAdvance=value),
+                    pairPosContext=True,
+                )
+            elif rtl and value:
+                valueRecord = buildValue({"XPlacement": value, "XAdvance": value})
+            else:
+                valueRecord = buildValue({"XAdvance": value})
+            glyphs1 = pair.side1Glyphs
+            glyphs2 = pair.side2Glyphs
+            if not glyphs1 or not glyphs2:
+                raise FeatureLibError("Empty glyph class in positioning rule", location)
+            if pair.firstIsClass and pair.secondIsClass:
+                lookup.addClassPair(location, glyphs1, valueRecord, glyphs2, None)
+            else:
+                # enumerate class-to-glyph or glyph-to-class exceptions
+                for glyph1 in glyphs1:
+                    for glyph2 in glyphs2:
+                        lookup.addGlyphPair(location, glyph1, valueRecord, glyph2, None)
+
+
 class KernFeatureWriter(BaseFeatureWriter):
     """Generates a kerning feature based on groups and rules contained
     in an UFO's kerning data.
@@ -193,9 +384,15 @@ class KernFeatureWriter(BaseFeatureWriter):
     def setContext(self, font, feaFile, compiler=None):
         ctx = super().setContext(font, feaFile, compiler=compiler)
         ctx.gdefClasses = self.getGDEFGlyphClasses()
-        ctx.kerning = self.getKerningData(font, feaFile, self.getOrderedGlyphSet())
+        sources = self.getVariableSources()
+        if sources:
+            ctx.kerning = self.getVariableKerningData(
+                font, sources, compiler.axes, feaFile, self.getOrderedGlyphSet()
+            )
+        else:
+            ctx.kerning = self.getKerningData(font, feaFile, self.getOrderedGlyphSet())
 
-        feaScripts = ast.getScriptLanguageSystems(feaFile)
+        feaScripts = ctx.feaFileIndex.getScriptLanguageSystems()
         ctx.scriptGroups = self._groupScriptsByTagAndDirection(feaScripts)
 
         return ctx
@@ -255,6 +452,60 @@ class KernFeatureWriter(BaseFeatureWriter):
             side1Classes=side1Classes, side2Classes=side2Classes, pairs=pairs
         )
 
+    @classmethod
+    def getVariableKerningData(cls, font, sources, axes, feaFile=None, glyphSet=None):
+        side1Classes, side2Classes = cls.getKerningClasses(font, feaFile, glyphSet)
+        kerning = cls.getVariableKerning(sources, axes)
+        pairs = cls.getKerningPairs(
+            font, side1Classes, side2Classes, glyphSet, kerning=kerning
+        )
+        return SimpleNamespace(
+            side1Classes=side1Classes, side2Classes=side2Classes, pairs=pairs
+        )
+
+    @staticmethod
+    def getVariableKerning(sources, axes):
+        """Return a dict combining the kerning of all the designspace sources,
+        with VariableScalar values for the pairs that vary across them.
+
+        A pair that is missing from a source takes the value that it would get
+        there from the UFO kerning lookup rules, e.g. that of a group pair, or
+        zero. Sparse layer sources have no kerning of their own and are skipped.
+        """
+        from fontTools.ufoLib.kerning import lookupKerningValue
+
+        masters = []
+        allPairs = set()
+        for source in sources:
+            if source.layerName is not None:
+                continue
+            font = source.font
+            glyphToFirstGroup, glyphToSecondGroup = {}, {}
+            for name, members in font.groups.items():
+                if name.startswith(SIDE1_PREFIX):
+                    glyphToFirstGroup.update(dict.fromkeys(members, name))
+                elif name.startswith(SIDE2_PREFIX):
+                    glyphToSecondGroup.update(dict.fromkeys(members, name))
+            masters.append(
+                (source.location, font, glyphToFirstGroup, glyphToSecondGroup)
+            )
+            allPairs.update(font.kerning.keys())
+
+        kerning = {}
+        for pair in allPairs:
+            values = []
+            for location, font, glyphToFirstGroup, glyphToSecondGroup in masters:
+                value = lookupKerningValue(
+                    pair,
+                    font.kerning,
+                    font.groups,
+                    glyphToFirstGroup=glyphToFirstGroup,
+                    glyphToSecondGroup=glyphToSecondGroup,
+                )
+                values.append((location, value))
+            kerning[pair] = ast.makeVariableScalar(values, axes)
+        return kerning
+
     @staticmethod
     def getKerningGroups(font, glyphSet=None):
         if glyphSet:
@@ -288,46 +539,72 @@ class KernFeatureWriter(BaseFeatureWriter):
         return side1Classes, side2Classes
 
     @staticmethod
-    def getKerningPairs(font, side1Classes, side2Classes, glyphSet=None):
+    def getKerningPairs(font, side1Classes, side2Classes, glyphSet=None, kerning=None):
         if glyphSet:
             allGlyphs = set(glyphSet.keys())
         else:
             allGlyphs = set(font.keys())
-        kerning = font.kerning
+        if kerning is None:
+            kerning = font.kerning
 
-        pairsByFlags = {}
-        for (side1, side2) in kerning:
+        # sort all the pairs at once: first single glyph pairs, then
+        # glyph-to-class, class-to-glyph and class-to-class pairs
+        sortKeys = []
+        for side1, side2 in kerning:
             # filter out pairs that reference missing groups or glyphs
-            if side1 not in side1Classes and side1 not in allGlyphs:
+            firstIsClass = side1 in side1Classes
+            if not firstIsClass and side1 not in allGlyphs:
                 continue
-            if side2 not in side2Classes and side2 not in allGlyphs:
+            secondIsClass = side2 in side2Classes
+            if not secondIsClass and side2 not in allGlyphs:
                 continue
-            flags = (side1 in side1Classes, side2 in side2Classes)
-            pairsByFlags.setdefault(flags, set()).add((side1, side2))
+            sortKeys.append((firstIsClass, secondIsClass, side1, side2))
+        sortKeys.sort()
+
+        # share the same AST objects among all the pairs referencing them
+        side1Names = {name: ast.GlyphClassName(c) for name, c in side1Classes.items()}
+        side2Names = {name: ast.GlyphClassName(c) for name, c in side2Classes.items()}
+        glyphNames = {}
+
+        def getGlyphName(glyph):
+            try:
+                return glyphNames[glyph]
+            except KeyError:
+                glyphName = glyphNames[glyph] = ast.GlyphName(glyph)
+                return glyphName
 
         result = []
-        for flags, pairs in sorted(pairsByFlags.items()):
-            for side1, side2 in sorted(pairs):
-                value = kerning[side1, side2]
-                if all(flags) and value == 0:
-                    # ignore zero-valued class kern pairs
-                    continue
-                firstIsClass, secondIsClass = flags
-                if firstIsClass:
-                    side1 = side1Classes[side1]
-                if secondIsClass:
-                    side2 = side2Classes[side2]
-                result.append(KerningPair(side1, side2, value))
+        for firstIsClass, secondIsClass, side1, side2 in sortKeys:
+            value = kerning[side1, side2]
+            if firstIsClass and secondIsClass and value == 0:
+                # ignore zero-valued class kern pairs
+                continue
+            side1 = side1Names[side1] if firstIsClass else getGlyphName(side1)
+            side2 = side2Names[side2] if secondIsClass else getGlyphName(side2)
+            result.append(KerningPair(side1, side2, value))
         return result
 
     def _intersectPairs(self, attribute, glyphSets):
-        allKeys = set()
+        maskAttribute, bits = {
+            "directions": ("directionMask", DIRECTION_BITS),
+            "bidiTypes": ("bidiTypeMask", BIDI_TYPE_BITS),
+        }[attribute]
+        # index the bit mask of the properties of each glyph, so that the
+        # mask of a pair is the OR of the (cached) masks of its two sides
+        glyphMasks = {}
+        for key, glyphs in glyphSets.items():
+            bit = bits[key]
+            for glyph in glyphs:
+                glyphMasks[glyph] = glyphMasks.get(glyph, 0) | bit
+        sideMask = _SideMaskGetter(glyphMasks)
+
+        allMask = 0
         for pair in self.context.kerning.pairs:
-            for key, glyphs in glyphSets.items():
-                if not pair.glyphs.isdisjoint(glyphs):
-                    getattr(pair, attribute).add(key)
-                    allKeys.add(key)
-        return allKeys
+            mask = sideMask(pair.side1) | sideMask(pair.side2)
+            if mask:
+                setattr(pair, maskAttribute, getattr(pair, maskAttribute) | mask)
+                allMask |= mask
+        return {key for key, bit in bits.items() if allMask & bit}
 
     @staticmethod
     def _groupScriptsByTagAndDirection(feaScripts):
@@ -350,8 +627,8 @@ class KernFeatureWriter(BaseFeatureWriter):
     @staticmethod
     def _makePairPosRule(pair, rtl=False, quantization=1):
         enumerated = pair.firstIsClass ^ pair.secondIsClass
-        value = quantize(pair.value, quantization)
-        if rtl and "L" in pair.bidiTypes:
+        value = _quantize(pair.value, quantization)
+        if rtl and pair.bidiTypeMask & _BIDI_L:
             # numbers are always shaped LTR even in RTL scripts
             rtl = False
         valuerecord = ast.ValueRecord(
@@ -372,22 +649,24 @@ class KernFeatureWriter(BaseFeatureWriter):
         self, name, pairs, exclude=None, rtl=False, ignoreMarks=True
     ):
         assert pairs
-        rules = []
-        for pair in pairs:
-            if exclude is not None and exclude(pair):
-                self.log.debug("pair excluded from '%s' lookup: %r", name, pair)
-                continue
-            rules.append(
-                self._makePairPosRule(
-                    pair, rtl=rtl, quantization=self.options.quantization
-                )
-            )
+        if exclude is not None:
+            included = []
+            for pair in pairs:
+                if exclude(pair):
+                    self.log.debug("pair excluded from '%s' lookup: %r", name, pair)
+                    continue
+                included.append(pair)
+            pairs = included
 
-        if rules:
+        if pairs:
             lookup = ast.LookupBlock(name)
             if ignoreMarks and self.options.ignoreMarks:
                 lookup.statements.append(ast.makeLookupFlag("IgnoreMarks"))
-            lookup.statements.extend(rules)
+            lookup.statements.append(
+                KerningPairsStatement(
+                    pairs, rtl=rtl, quantization=self.options.quantization
+                )
+            )
             return lookup
 
     def _makeKerningLookups(self):
@@ -398,12 +677,12 @@ class KernFeatureWriter(BaseFeatureWriter):
             # and group glyphs by script horizontal direction and bidirectional
             # type. We then mark each kerning pair with these properties when
             # any of the glyphs involved in a pair intersects these groups.
-            gsub = self.compileGSUB()
-            dirGlyphs = classifyGlyphs(unicodeScriptDirection, cmap, gsub)
+            closure = self.getGSUBClosure()
+            dirGlyphs = classifyGlyphs(unicodeScriptDirection, cmap, closure)
             directions = self._intersectPairs("directions", dirGlyphs)
             shouldSplit = "RTL" in directions
             if shouldSplit:
-                bidiGlyphs = classifyGlyphs(unicodeBidiType, cmap, gsub)
+                bidiGlyphs = classifyGlyphs(unicodeBidiType, cmap, closure)
                 self._intersectPairs("bidiTypes", bidiGlyphs)
         else:
             shouldSplit = False
@@ -419,8 +698,9 @@ class KernFeatureWriter(BaseFeatureWriter):
             # arabic numerals).
             pairs = []
             for pair in self.context.kerning.pairs:
-                if ("RTL" in pair.directions and "LTR" in pair.directions) or (
-                    "R" in pair.bidiTypes and "L" in pair.bidiTypes
+                if (
+                    pair.directionMask == _LTR | _RTL
+                    or pair.bidiTypeMask == _BIDI_L | _BIDI_R
                 ):
                     self.log.warning(
                         "skipped kern pair with ambiguous direction: %r", pair
@@ -466,8 +746,9 @@ class KernFeatureWriter(BaseFeatureWriter):
     def _splitBaseAndMarkPairs(self, pairs, marks):
         basePairs, markPairs = [], []
         if marks:
+            hasMarks = _SideMaskGetter(dict.fromkeys(marks, 1))
             for pair in pairs:
-                if any(glyph in marks for glyph in pair.glyphs):
+                if hasMarks(pair.side1) or hasMarks(pair.side2):
                     markPairs.append(pair)
                 else:
                     basePairs.append(pair)
@@ -481,7 +762,7 @@ class KernFeatureWriter(BaseFeatureWriter):
         dfltKern = self._makeKerningLookup(
             "kern_dflt" + suffix,
             pairs,
-            exclude=(lambda pair: {"LTR", "RTL"}.intersection(pair.directions)),
+            exclude=(lambda pair: pair.directionMask != 0),
             rtl=False,
             ignoreMarks=ignoreMarks,
         )
@@ -491,7 +772,7 @@ class KernFeatureWriter(BaseFeatureWriter):
         ltrKern = self._makeKerningLookup(
             "kern_ltr" + suffix,
             pairs,
-            exclude=(lambda pair: not pair.directions or "RTL" in pair.directions),
+            exclude=(lambda pair: not pair.directionMask & _LTR),
             rtl=False,
             ignoreMarks=ignoreMarks,
         )
@@ -501,7 +782,7 @@ class KernFeatureWriter(BaseFeatureWriter):
         rtlKern = self._makeKerningLookup(
             "kern_rtl" + suffix,
             pairs,
-            exclude=(lambda pair: not pair.directions or "LTR" in pair.directions),
+            exclude=(lambda pair: not pair.directionMask & _RTL),
             rtl=True,
             ignoreMarks=ignoreMarks,
         )
@@ -1,7 +1,7 @@
 import itertools
 import re
 from collections import OrderedDict, defaultdict
-from functools import partial
+from functools import lru_cache, partial
 
 from fontTools.misc.fixedTools import otRound
 
@@ -11,6 +11,19 @@ from ufo2ft.fontInfoData import getAttrWithFallback
 from ufo2ft.util import classifyGlyphs, quantize, unicodeInScripts
 
 
+def _otRound(value):
+    # the values of variable coordinates are already rounded
+    if isinstance(value, ast.VariableScalar):
+        return value
+    return otRound(value)
+
+
+def _defaultValue(value):
+    if isinstance(value, ast.VariableScalar):
+        return value.default
+    return value
+
+
 class AbstractMarkPos:
     """Object containing all the mark attachments for glyph 'name'.
     The 'marks' is a list of NamedAnchor objects.
@@ -30,7 +43,7 @@ class AbstractMarkPos:
 
     def _marksAsAST(self):
         return [
-            (ast.Anchor(x=otRound(anchor.x), y=otRound(anchor.y)), anchor.markClass)
+            (ast.Anchor(x=_otRound(anchor.x), y=_otRound(anchor.y)), anchor.markClass)
             for anchor in sorted(self.marks, key=lambda a: a.name)
         ]
 
@@ -77,7 +90,10 @@ class MarkToLigaPos(AbstractMarkPos):
     def _marksAsAST(self):
         return [
             [
-                (ast.Anchor(x=otRound(anchor.x), y=otRound(anchor.y)), anchor.markClass)
+                (
+                    ast.Anchor(x=_otRound(anchor.x), y=_otRound(anchor.y)),
+                    anchor.markClass,
+                )
                 for anchor in sorted(component, key=lambda a: a.name)
             ]
             for component in self.marks
@@ -148,6 +164,10 @@ def parseAnchorName(
     return isMark, key, number
 
 
+# the same few anchor names are repeated in most glyphs
+_parseAnchorNameCached = lru_cache(maxsize=4096)(parseAnchorName)
+
+
 class NamedAnchor:
     """A position with a name, and an associated markClass."""
 
@@ -163,7 +183,7 @@ class NamedAnchor:
         self.name = name
         self.x = x
         self.y = y
-        isMark, key, number = parseAnchorName(
+        isMark, key, number = _parseAnchorNameCached(
             name,
             markPrefix=self.markPrefix,
             ligaSeparator=self.ligaSeparator,
@@ -189,7 +209,7 @@ class NamedAnchor:
         return "%s(%s)" % (type(self).__name__, ", ".join(items))
 
 
-def colorGraph(adjacency):
+def colorGraph(adjacency, exactSearchMaxNodes=32, exactSearchMaxSteps=10000):
     """Color the graph defined by the provided adjacency lists.
     The input is a dict of iterables. Each entry of the dict is one vertex,
     and the value is a list of neighbours of that vertex.
@@ -197,9 +217,35 @@ def colorGraph(adjacency):
     that (have symmetric adjacency for A -> B and B -> A).
     Vertices that don't have neighbours should still be present in the input.
 
+    The graph is colored with the DSatur heuristic, keeping the plain greedy
+    coloring instead if that happens to use fewer colors. Graphs with at most
+    `exactSearchMaxNodes` vertices are then searched for a coloring with
+    fewer colors, giving up after `exactSearchMaxSteps` backtracking steps.
+
     The output is a list of lists, each list being one color assignment,
     and its members being vertices.
     """
+    color = _greedyColoring(adjacency)
+    dsatur = _dsaturColoring(adjacency)
+    if _numColors(dsatur) < _numColors(color):
+        color = dsatur
+    if 0 < len(adjacency) <= exactSearchMaxNodes:
+        exact = _exactColoring(
+            adjacency, _numColors(color), maxSteps=exactSearchMaxSteps
+        )
+        if exact is not None:
+            color = exact
+    groups = defaultdict(list)
+    for node in sorted(color):
+        groups[color[node]].append(node)
+    return [groups[c] for c in sorted(groups)]
+
+
+def _numColors(color):
+    return len(set(color.values()))
+
+
+def _greedyColoring(adjacency):
     # Basic implementation
     # https://en.wikipedia.org/wiki/Greedy_coloring
     color = dict()
@@ -209,10 +255,106 @@ def colorGraph(adjacency):
             color[neighbour] for neighbour in adjacency[node] if neighbour in color
         }
         color[node] = firstAvailable(usedNeighbourColors)
-    groups = defaultdict(list)
-    for node, color in color.items():
-        groups[color].append(node)
-    return list(groups.values())
+    return color
+
+
+def _pickMostSaturated(uncolored, adjacency, neighbourColors):
+    # Most distinct neighbour colors first, then highest degree, then by
+    # name for reproducibility.
+    return min(
+        uncolored,
+        key=lambda node: (
+            -len(neighbourColors[node]),
+            -len(adjacency[node]),
+            node,
+        ),
+    )
+
+
+def _dsaturColoring(adjacency):
+    # https://en.wikipedia.org/wiki/DSatur
+    color = dict()
+    neighbourColors = {node: set() for node in adjacency}
+    uncolored = set(adjacency)
+    while uncolored:
+        node = _pickMostSaturated(uncolored, adjacency, neighbourColors)
+        color[node] = firstAvailable(neighbourColors[node])
+        uncolored.remove(node)
+        for neighbour in adjacency[node]:
+            neighbourColors[neighbour].add(color[node])
+    return color
+
+
+def _greedyClique(adjacency):
+    """Return a clique found by repeatedly adding the highest degree vertex
+    adjacent to all the vertices picked so far; its size is a lower bound
+    for the number of colors needed.
+    """
+    clique = []
+    candidates = set(adjacency)
+    while candidates:
+        node = min(candidates, key=lambda n: (-len(adjacency[n]), n))
+        clique.append(node)
+        candidates.intersection_update(adjacency[node])
+    return clique
+
+
+class _SearchBudgetExceeded(Exception):
+    pass
+
+
+def _exactColoring(adjacency, numColors, maxSteps):
+    """Search for a coloring using fewer than `numColors` colors.
+
+    Return the coloring with the fewest colors found, or None if none was
+    found within `maxSteps` backtracking steps.
+    """
+    lowerBound = len(_greedyClique(adjacency))
+    steps = 0
+
+    def search(color, neighbourColors, uncolored, k, usedColors):
+        nonlocal steps
+        if not uncolored:
+            return True
+        steps += 1
+        if steps > maxSteps:
+            raise _SearchBudgetExceeded()
+        node = _pickMostSaturated(uncolored, adjacency, neighbourColors)
+        uncolored.remove(node)
+        # Colors are interchangeable: only try at most one new color.
+        for c in range(min(k, usedColors + 1)):
+            if c in neighbourColors[node]:
+                continue
+            color[node] = c
+            added = [
+                neighbour
+                for neighbour in adjacency[node]
+                if c not in neighbourColors[neighbour]
+            ]
+            for neighbour in added:
+                neighbourColors[neighbour].add(c)
+            if search(color, neighbourColors, uncolored, k, max(usedColors, c + 1)):
+                return True
+            for neighbour in added:
+                neighbourColors[neighbour].discard(c)
+            del color[node]
+        uncolored.add(node)
+        return False
+
+    best = None
+    # Try fewer and fewer colors until a coloring can't be found (or the
+    # lower bound is reached).
+    for k in range(numColors - 1, lowerBound - 1, -1):
+        color = dict()
+        neighbourColors = {node: set() for node in adjacency}
+        try:
+            found = search(color, neighbourColors, set(adjacency), k, 0)
+        except _SearchBudgetExceeded:
+            break
+        if not found:
+            break
+        best = color
+    return best
 
 
 def firstAvailable(colorSet):
@@ -295,6 +437,7 @@ class MarkFeatureWriter(BaseFeatureWriter):
         ctx = super().setContext(font, feaFile, compiler=compiler)
         ctx.gdefClasses = self.getGDEFGlyphClasses()
         ctx.anchorLists = self._getAnchorLists()
+        ctx.anchorsByName = self._indexAnchorsByName()
         ctx.anchorPairs = self._getAnchorPairs()
 
     def shouldContinue(self):
@@ -311,6 +454,11 @@ class MarkFeatureWriter(BaseFeatureWriter):
         else:
             # no GDEF table defined in feature file, include all glyphs
             include = None
+        quantization = self.options.quantization
+        if quantization == 1:
+            transform = otRound
+        else:
+            transform = partial(quantize, factor=quantization)
         result = OrderedDict()
         for glyphName, glyph in self.getOrderedGlyphSet().items():
             if include is not None and glyphName not in include:
@@ -327,60 +475,81 @@ class MarkFeatureWriter(BaseFeatureWriter):
                     self.log.warning(
                         "duplicate anchor '%s' in glyph '%s'", anchorName, glyphName
                     )
-                x = quantize(anchor.x, self.options.quantization)
-                y = quantize(anchor.y, self.options.quantization)
+                x, y = self.getAnchorCoordinates(glyphName, anchor, transform=transform)
                 a = self.NamedAnchor(name=anchorName, x=x, y=y)
                 anchorDict[anchorName] = a
             if anchorDict:
                 result[glyphName] = list(anchorDict.values())
         return result
 
+    def _indexAnchorsByName(self):
+        """Return a dict keyed by anchor name, whose values are ordered dicts
+        mapping glyph names to the glyph's anchor with that name, in glyph
+        order. The anchor properties (isMark, key, number) only depend on the
+        anchor name, so the writer can reason about distinct anchor names
+        rather than walk all the anchors of all the glyphs.
+        """
+        index = {}
+        for glyphName, anchors in self.context.anchorLists.items():
+            for anchor in anchors:
+                index.setdefault(anchor.name, OrderedDict())[glyphName] = anchor
+        return index
+
+    def _iterAnchorNames(self):
+        """Yield a (anchorName, anchor) tuple for each distinct anchor name,
+        the anchor being one of the anchors with that name.
+        """
+        for anchorName, glyphAnchors in self.context.anchorsByName.items():
+            yield anchorName, next(iter(glyphAnchors.values()))
+
     def _getAnchorPairs(self):
-        markAnchorNames = set()
-        for anchors in self.context.anchorLists.values():
-            markAnchorNames.update(a.name for a in anchors if a.isMark)
+        markAnchorNames = {
+            name for name, anchor in self._iterAnchorNames() if anchor.isMark
+        }
         anchorPairs = {}
-        for anchors in self.context.anchorLists.values():
-            for anchor in anchors:
-                if anchor.isMark:
-                    continue
-                markAnchorName = anchor.markAnchorName
-                if markAnchorName in markAnchorNames:
-                    anchorPairs[anchor.name] = markAnchorName
+        for name, anchor in self._iterAnchorNames():
+            if anchor.isMark:
+                continue
+            markAnchorName = anchor.markAnchorName
+            if markAnchorName in markAnchorNames:
+                anchorPairs[name] = markAnchorName
         return anchorPairs
 
     def _pruneUnusedAnchors(self):
         baseAnchorNames = set(self.context.anchorPairs.keys())
         markAnchorNames = set(self.context.anchorPairs.values())
         attachingAnchorNames = baseAnchorNames | markAnchorNames
-        for glyphName, anchors in list(self.context.anchorLists.items()):
-            for anchor in list(anchors):
-                if anchor.name not in attachingAnchorNames and anchor.key:
-                    anchors.remove(anchor)
-            if not anchors:
-                del self.context.anchorLists[glyphName]
+        anchorLists = self.context.anchorLists
+        anchorsByName = self.context.anchorsByName
+        for name, anchor in list(self._iterAnchorNames()):
+            if name in attachingAnchorNames or not anchor.key:
+                continue
+            for glyphName, unusedAnchor in anchorsByName.pop(name).items():
+                anchors = anchorLists[glyphName]
+                anchors.remove(unusedAnchor)
+                if not anchors:
+                    del anchorLists[glyphName]
 
     def _groupMarkGlyphsByAnchor(self):
         gdefMarks = self.context.gdefClasses.mark
         markAnchorNames = set(self.context.anchorPairs.values())
+        anchorsByName = self.context.anchorsByName
         markGlyphNames = set()
         groups = {}
-        for glyphName, anchors in self.context.anchorLists.items():
+        for anchorName in sorted(markAnchorNames):
             # if the feature file has a GDEF table with GlyphClassDef defined,
             # only include mark glyphs that are referenced in there, otherwise
             # include any glyphs that contain an "_" prefixed anchor.
-            if gdefMarks is not None and glyphName not in gdefMarks:
-                continue
-            markAnchors = [a for a in anchors if a.name in markAnchorNames]
-            if not markAnchors:
-                continue
             # Use all mark anchors. The rest of the algorithm will make sure
             # that the generated lookups will not have overlapping mark classes.
-            for anchor in markAnchors:
-                group = groups.setdefault(anchor.name, OrderedDict())
-                assert glyphName not in group
-                group[glyphName] = anchor
-            markGlyphNames.add(glyphName)
+            group = OrderedDict(
+                (glyphName, anchor)
+                for glyphName, anchor in anchorsByName[anchorName].items()
+                if gdefMarks is None or glyphName in gdefMarks
+            )
+            if group:
+                groups[anchorName] = group
+                markGlyphNames.update(group)
         self.context.markGlyphNames = markGlyphNames
         return groups
 
@@ -404,7 +573,7 @@ class MarkFeatureWriter(BaseFeatureWriter):
         return newDefs
 
     def _defineMarkClass(self, glyphName, x, y, className, markClasses):
-        anchor = ast.Anchor(x=otRound(x), y=otRound(y))
+        anchor = ast.Anchor(x=_otRound(x), y=_otRound(y))
         markClass = markClasses.get(className)
         if markClass is None:
             markClass = ast.MarkClass(className)
@@ -433,18 +602,26 @@ class MarkFeatureWriter(BaseFeatureWriter):
     @staticmethod
     def _anchorsAreEqual(a1, a2):
         # TODO add __eq__ to feaLib AST objects?
+        def value(anchor, attr):
+            value = getattr(anchor, attr)
+            if isinstance(value, ast.VariableScalar):
+                return value.values
+            return value
+
         return all(
-            getattr(a1, attr) == getattr(a2, attr)
+            value(a1, attr) == value(a2, attr)
             for attr in ("x", "y", "contourpoint", "xDeviceTable", "yDeviceTable")
         )
 
     def _setBaseAnchorMarkClasses(self):
         markClasses = self.context.markClasses
-        for anchors in self.context.anchorLists.values():
-            for anchor in anchors:
-                if anchor.isMark or not anchor.key or anchor.key not in markClasses:
-                    continue
-                anchor.markClass = markClasses[anchor.key]
+        anchorsByName = self.context.anchorsByName
+        for name, anchor in self._iterAnchorNames():
+            if anchor.isMark or not anchor.key or anchor.key not in markClasses:
+                continue
+            markClass = markClasses[anchor.key]
+            for baseAnchor in anchorsByName[name].values():
+                baseAnchor.markClass = markClass
 
     def _groupMarkClasses(self, markGlyphToMarkClasses):
         # To compute the number of lookups that we need to build, we want
@@ -676,7 +853,7 @@ class MarkFeatureWriter(BaseFeatureWriter):
         members = itertools.chain(markGlyphs, baseGlyphs)
         className = "MFS_%s" % lookupName
         return ast.makeGlyphClassDefinitions(
-            {className: members}, feaFile=self.context.feaFile
+            {className: members}, feaFile=self.context.feaFileIndex
         )[className]
 
     def _makeMarkToMarkLookup(
@@ -747,7 +924,7 @@ class MarkFeatureWriter(BaseFeatureWriter):
             return True
         if anchor.name in self.blwmAnchorNames:
             return False
-        if anchor.y >= self.context.threshold:
+        if _defaultValue(anchor.y) >= self.context.threshold:
             return True
         return False
 
@@ -855,8 +1032,8 @@ class MarkFeatureWriter(BaseFeatureWriter):
             # If there are any characters from Indic/USE/Khmer scripts in the cmap, we
             # compile a temporary GSUB table to resolve substitutions and get
             # the set of all the relevant glyphs, including alternate glyphs.
-            gsub = self.compileGSUB()
-            glyphGroups = classifyGlyphs(unicodeIsAbvm, cmap, gsub)
+            closure = self.getGSUBClosure()
+            glyphGroups = classifyGlyphs(unicodeIsAbvm, cmap, closure)
             # the 'glyphGroups' dict is keyed by the return value of the
             # classifying include, so here 'True' means all the Indic/USE/Khmer glyphs
             return glyphGroups.get(True, set())
@@ -5,17 +5,6 @@ from inspect import getfullargspec, isclass
 from ufo2ft.constants import FILTERS_KEY
 from ufo2ft.util import _loadPluginFromString
 
-from .base import BaseFilter
-from .cubicToQuadratic import CubicToQuadraticFilter
-from .decomposeComponents import DecomposeComponentsFilter
-from .decomposeTransformedComponents import DecomposeTransformedComponentsFilter
-from .explodeColorLayerGlyphs import ExplodeColorLayerGlyphsFilter
-from .flattenComponents import FlattenComponentsFilter
-from .propagateAnchors import PropagateAnchorsFilter
-from .removeOverlaps import RemoveOverlapsFilter
-from .sortContours import SortContoursFilter
-from .transformations import TransformationsFilter
-
 __all__ = [
     "BaseFilter",
     "CubicToQuadraticFilter",
@@ -34,6 +23,34 @@ __all__ = [
 
 logger = logging.getLogger(__name__)
 
+# the built-in filters are only imported on first access
+_filterModules = {
+    "BaseFilter": "base",
+    "CubicToQuadraticFilter": "cubicToQuadratic",
+    "DecomposeComponentsFilter": "decomposeComponents",
+    "DecomposeTransformedComponentsFilter": "decomposeTransformedComponents",
+    "ExplodeColorLayerGlyphsFilter": "explodeColorLayerGlyphs",
+    "FlattenComponentsFilter": "flattenComponents",
+    "PropagateAnchorsFilter": "propagateAnchors",
+    "RemoveOverlapsFilter": "removeOverlaps",
+    "SortContoursFilter": "sortContours",
+    "TransformationsFilter": "transformations",
+}
+
+
+def __getattr__(name):
+    try:
+        moduleName = _filterModules[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    module = importlib.import_module(f"{__name__}.{moduleName}")
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_filterModules))
+
 
 def getFilterClass(filterName, pkg="ufo2ft.filters"):
     """Given a filter name, import and return the filter class.
@@ -87,6 +104,8 @@ def isValidFilter(klass):
 
            def __call__(self, font, feaFile, compiler=None)
     """
+    from .base import BaseFilter
+
     if not isclass(klass):
         logger.error(f"{klass!r} is not a class")
         return False
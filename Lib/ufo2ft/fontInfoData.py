@@ -20,7 +20,6 @@ import time
 import unicodedata
 from datetime import datetime
 
-from fontTools import ufoLib
 from fontTools.misc.fixedTools import otRound
 from fontTools.misc.textTools import binary2num
 
@@ -459,9 +458,27 @@ specialFallbacks = dict(
     postscriptBlueScale=postscriptBlueScaleFallback,
 )
 
-requiredAttributes = set(ufoLib.fontInfoAttributesVersion2) - (
-    set(staticFallbackData.keys()) | set(specialFallbacks.keys())
-)
+
+_requiredAttributes = None
+
+
+def _getRequiredAttributes():
+    # fontTools.ufoLib is slow to import, so this is only computed when needed
+    global _requiredAttributes
+    if _requiredAttributes is None:
+        from fontTools.ufoLib import fontInfoAttributesVersion2
+
+        _requiredAttributes = set(fontInfoAttributesVersion2) - (
+            set(staticFallbackData.keys()) | set(specialFallbacks.keys())
+        )
+    return _requiredAttributes
+
+
+def __getattr__(name):
+    if name == "requiredAttributes":
+        return _getRequiredAttributes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 recommendedAttributes = {
     "styleMapFamilyName",
@@ -500,6 +517,26 @@ recommendedAttributes = {
 # ------------
 
 
+class ResolvedFontInfo:
+    """
+    Wrap a font info object so that the values resolved by
+    *getAttrWithFallback* are computed only once, including
+    the ones resolved while computing other fallbacks (e.g.
+    *unitsPerEm* or *ascender*). Other attributes are read
+    from the wrapped object.
+
+    The wrapped object should not be modified while this is
+    in use, or stale values may be returned.
+    """
+
+    def __init__(self, info):
+        self.info = info
+        self._resolved = {}
+
+    def __getattr__(self, attr):
+        return getattr(self.info, attr)
+
+
 def getAttrWithFallback(info, attr):
     """
     Get the value for *attr* from the *info* object.
@@ -507,7 +544,18 @@ def getAttrWithFallback(info, attr):
     for the atribute is None, this will either get a
     value from a predefined set of attributes or it
     will synthesize a value from the available data.
+
+    If *info* is a *ResolvedFontInfo*, the value is memoized.
     """
+    if isinstance(info, ResolvedFontInfo):
+        resolved = info._resolved
+        if attr not in resolved:
+            resolved[attr] = _getAttrWithFallback(info, attr)
+        return resolved[attr]
+    return _getAttrWithFallback(info, attr)
+
+
+def _getAttrWithFallback(info, attr):
     if hasattr(info, attr) and getattr(info, attr) is not None:
         value = getattr(info, attr)
     else:
@@ -530,7 +578,7 @@ def preflightInfo(info):
     """
     missingRequired = set()
     missingRecommended = set()
-    for attr in requiredAttributes:
+    for attr in _getRequiredAttributes():
         if not hasattr(info, attr) or getattr(info, attr) is None:
             missingRequired.add(attr)
     for attr in recommendedAttributes:
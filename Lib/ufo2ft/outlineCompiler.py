@@ -1,11 +1,15 @@
 import logging
 import math
+import struct
 from collections import Counter, namedtuple
 from io import BytesIO
 from types import SimpleNamespace
 
 from fontTools.cffLib import (
+    CFFFontSet,
     CharStrings,
+    FDArrayIndex,
+    FontDict,
     GlobalSubrsIndex,
     IndexedStrings,
     PrivateDict,
@@ -34,6 +38,7 @@ from ufo2ft.constants import (
 )
 from ufo2ft.errors import InvalidFontData
 from ufo2ft.fontInfoData import (
+    ResolvedFontInfo,
     dateStringForNow,
     dateStringToTimeValue,
     getAttrWithFallback,
@@ -43,7 +48,9 @@ from ufo2ft.fontInfoData import (
 from ufo2ft.instructionCompiler import InstructionCompiler
 from ufo2ft.util import (
     _copyGlyph,
+    calcCmapGroupCounts,
     calcCodePageRanges,
+    calcUnicodeRanges,
     makeOfficialGlyphOrder,
     makeUnicodeToGlyphNameMapping,
 )
@@ -101,8 +108,14 @@ class BaseOutlineCompiler:
         glyphOrder=None,
         tables=None,
         notdefGlyph=None,
+        compileContext=None,
     ):
         self.ufo = font
+        # the font info, whose fallback values are resolved once per build
+        if compileContext is not None:
+            self.info = compileContext.fontInfo
+        else:
+            self.info = ResolvedFontInfo(font.info)
         # use the previously filtered glyphSet, if any
         if glyphSet is None:
             glyphSet = {g.name: g for g in font}
@@ -114,6 +127,10 @@ class BaseOutlineCompiler:
         self.glyphOrder = self.makeOfficialGlyphOrder(glyphOrder)
         # make a reusable character mapping
         self.unicodeToGlyphNameMapping = self.makeUnicodeToGlyphNameMapping()
+        # share these with the next stages of the build
+        if compileContext is not None:
+            compileContext.glyphOrder = self.glyphOrder
+            compileContext.unicodeToGlyphNameMapping = self.unicodeToGlyphNameMapping
         if tables is not None:
             self.tables = tables
         # cached values defined later on
@@ -134,7 +151,7 @@ class BaseOutlineCompiler:
             "openTypeVheaVertTypoLineGap",
         ]
         self.vertical = all(
-            getAttrWithFallback(self.ufo.info, metric) is not None
+            getAttrWithFallback(self.info, metric) is not None
             for metric in vertical_metrics
         )
         self.colorLayers = (
@@ -306,7 +323,6 @@ class BaseOutlineCompiler:
             return
 
         self.otf["head"] = head = newTable("head")
-        font = self.ufo
         head.checkSumAdjustment = 0
         head.tableVersion = 1.0
         head.magicNumber = 0x5F0F3CF5
@@ -314,8 +330,8 @@ class BaseOutlineCompiler:
         # version numbers
         # limit minor version to 3 digits as recommended in OpenType spec:
         # https://www.microsoft.com/typography/otspec/recom.htm
-        versionMajor = getAttrWithFallback(font.info, "versionMajor")
-        versionMinor = getAttrWithFallback(font.info, "versionMinor")
+        versionMajor = getAttrWithFallback(self.info, "versionMajor")
+        versionMinor = getAttrWithFallback(self.info, "versionMinor")
         fullFontRevision = float("%d.%03d" % (versionMajor, versionMinor))
         head.fontRevision = round(fullFontRevision, 3)
         if head.fontRevision != fullFontRevision:
@@ -327,11 +343,11 @@ class BaseOutlineCompiler:
             )
 
         # upm
-        head.unitsPerEm = otRound(getAttrWithFallback(font.info, "unitsPerEm"))
+        head.unitsPerEm = otRound(getAttrWithFallback(self.info, "unitsPerEm"))
 
         # times
         head.created = (
-            dateStringToTimeValue(getAttrWithFallback(font.info, "openTypeHeadCreated"))
+            dateStringToTimeValue(getAttrWithFallback(self.info, "openTypeHeadCreated"))
             - mac_epoch_diff
         )
         head.modified = dateStringToTimeValue(dateStringForNow()) - mac_epoch_diff
@@ -344,7 +360,7 @@ class BaseOutlineCompiler:
         head.yMax = otRound(yMax)
 
         # style mapping
-        styleMapStyleName = getAttrWithFallback(font.info, "styleMapStyleName")
+        styleMapStyleName = getAttrWithFallback(self.info, "styleMapStyleName")
         macStyle = []
         if styleMapStyleName == "bold":
             macStyle = [0]
@@ -356,10 +372,10 @@ class BaseOutlineCompiler:
 
         # misc
         head.flags = intListToNum(
-            getAttrWithFallback(font.info, "openTypeHeadFlags"), 0, 16
+            getAttrWithFallback(self.info, "openTypeHeadFlags"), 0, 16
         )
         head.lowestRecPPEM = otRound(
-            getAttrWithFallback(font.info, "openTypeHeadLowestRecPPEM")
+            getAttrWithFallback(self.info, "openTypeHeadLowestRecPPEM")
         )
         head.fontDirectionHint = 2
         head.indexToLocFormat = 0
@@ -376,12 +392,11 @@ class BaseOutlineCompiler:
         if "name" not in self.tables:
             return
 
-        font = self.ufo
         self.otf["name"] = name = newTable("name")
         name.names = []
 
         # Set name records from font.info.openTypeNameRecords
-        for nameRecord in getAttrWithFallback(font.info, "openTypeNameRecords"):
+        for nameRecord in getAttrWithFallback(self.info, "openTypeNameRecords"):
             nameId = nameRecord["nameID"]
             platformId = nameRecord["platformID"]
             platEncId = nameRecord["encodingID"]
@@ -395,38 +410,38 @@ class BaseOutlineCompiler:
             name.setName(nameVal, nameId, platformId, platEncId, langId)
 
         # Build name records
-        familyName = getAttrWithFallback(font.info, "styleMapFamilyName")
-        styleName = getAttrWithFallback(font.info, "styleMapStyleName").title()
+        familyName = getAttrWithFallback(self.info, "styleMapFamilyName")
+        styleName = getAttrWithFallback(self.info, "styleMapStyleName").title()
         preferredFamilyName = getAttrWithFallback(
-            font.info, "openTypeNamePreferredFamilyName"
+            self.info, "openTypeNamePreferredFamilyName"
         )
         preferredSubfamilyName = getAttrWithFallback(
-            font.info, "openTypeNamePreferredSubfamilyName"
+            self.info, "openTypeNamePreferredSubfamilyName"
         )
         fullName = f"{preferredFamilyName} {preferredSubfamilyName}"
 
         nameVals = {
-            0: getAttrWithFallback(font.info, "copyright"),
+            0: getAttrWithFallback(self.info, "copyright"),
             1: familyName,
             2: styleName,
-            3: getAttrWithFallback(font.info, "openTypeNameUniqueID"),
+            3: getAttrWithFallback(self.info, "openTypeNameUniqueID"),
             4: fullName,
-            5: getAttrWithFallback(font.info, "openTypeNameVersion"),
-            6: getAttrWithFallback(font.info, "postscriptFontName"),
-            7: getAttrWithFallback(font.info, "trademark"),
-            8: getAttrWithFallback(font.info, "openTypeNameManufacturer"),
-            9: getAttrWithFallback(font.info, "openTypeNameDesigner"),
-            10: getAttrWithFallback(font.info, "openTypeNameDescription"),
-            11: getAttrWithFallback(font.info, "openTypeNameManufacturerURL"),
-            12: getAttrWithFallback(font.info, "openTypeNameDesignerURL"),
-            13: getAttrWithFallback(font.info, "openTypeNameLicense"),
-            14: getAttrWithFallback(font.info, "openTypeNameLicenseURL"),
+            5: getAttrWithFallback(self.info, "openTypeNameVersion"),
+            6: getAttrWithFallback(self.info, "postscriptFontName"),
+            7: getAttrWithFallback(self.info, "trademark"),
+            8: getAttrWithFallback(self.info, "openTypeNameManufacturer"),
+            9: getAttrWithFallback(self.info, "openTypeNameDesigner"),
+            10: getAttrWithFallback(self.info, "openTypeNameDescription"),
+            11: getAttrWithFallback(self.info, "openTypeNameManufacturerURL"),
+            12: getAttrWithFallback(self.info, "openTypeNameDesignerURL"),
+            13: getAttrWithFallback(self.info, "openTypeNameLicense"),
+            14: getAttrWithFallback(self.info, "openTypeNameLicenseURL"),
             16: preferredFamilyName,
             17: preferredSubfamilyName,
-            18: getAttrWithFallback(font.info, "openTypeNameCompatibleFullName"),
-            19: getAttrWithFallback(font.info, "openTypeNameSampleText"),
-            21: getAttrWithFallback(font.info, "openTypeNameWWSFamilyName"),
-            22: getAttrWithFallback(font.info, "openTypeNameWWSSubfamilyName"),
+            18: getAttrWithFallback(self.info, "openTypeNameCompatibleFullName"),
+            19: getAttrWithFallback(self.info, "openTypeNameSampleText"),
+            21: getAttrWithFallback(self.info, "openTypeNameWWSFamilyName"),
+            22: getAttrWithFallback(self.info, "openTypeNameWWSSubfamilyName"),
         }
 
         # don't add typographic names if they are the same as the legacy ones
@@ -471,51 +486,64 @@ class BaseOutlineCompiler:
         if "cmap" not in self.tables:
             return
 
-        from fontTools.ttLib.tables._c_m_a_p import cmap_format_4
+        from fontTools.ttLib.tables._c_m_a_p import CmapSubtable
+
+        def newSubtable(format, platformID, platEncID, mapping):
+            subtable = CmapSubtable.newSubtable(format)
+            subtable.platformID = platformID
+            subtable.platEncID = platEncID
+            subtable.language = 0
+            subtable.cmap = mapping
+            return subtable
+
+        # Subtables for different platforms share the same mapping, which
+        # fontTools compiles only once.
+        fullMapping = dict(self.unicodeToGlyphNameMapping)
+        mapping = {k: v for k, v in fullMapping.items() if k <= 0xFFFF}
+        if len(mapping) == len(fullMapping):
+            mapping = fullMapping
+
+        # Fonts mapping long runs of codepoints to the same glyph (e.g. last
+        # resort fonts) are much smaller with a format 13 subtable. This can
+        # only pay off if most glyphs are mapped to more than one codepoint.
+        fullFormat = 12
+        if len(set(fullMapping.values())) * 2 <= len(fullMapping):
+            glyphIDs = {name: i for i, name in enumerate(self.glyphOrder)}
+            codepoints = sorted(fullMapping)
+            try:
+                format12, format13 = calcCmapGroupCounts(
+                    codepoints, [glyphIDs[fullMapping[uv]] for uv in codepoints]
+                )
+            except KeyError:
+                pass  # glyphs missing from the glyph order, let fontTools fail
+            else:
+                if format13 * 2 <= format12 and format12 - format13 >= 256:
+                    fullFormat = 13
 
-        nonBMP = {k: v for k, v in self.unicodeToGlyphNameMapping.items() if k > 65535}
-        if nonBMP:
-            mapping = {
-                k: v for k, v in self.unicodeToGlyphNameMapping.items() if k <= 65535
-            }
-        else:
-            mapping = dict(self.unicodeToGlyphNameMapping)
-        # mac
-        cmap4_0_3 = cmap_format_4(4)
-        cmap4_0_3.platformID = 0
-        cmap4_0_3.platEncID = 3
-        cmap4_0_3.language = 0
-        cmap4_0_3.cmap = mapping
-        # windows
-        cmap4_3_1 = cmap_format_4(4)
-        cmap4_3_1.platformID = 3
-        cmap4_3_1.platEncID = 1
-        cmap4_3_1.language = 0
-        cmap4_3_1.cmap = mapping
-        # store
         self.otf["cmap"] = cmap = newTable("cmap")
         cmap.tableVersion = 0
-        cmap.tables = [cmap4_0_3, cmap4_3_1]
+        # mac, windows
+        cmap.tables = [newSubtable(4, 0, 3, mapping), newSubtable(4, 3, 1, mapping)]
+        if fullFormat == 13:
+            try:
+                cmap.tables[0].compile(self.otf)
+            except (OverflowError, struct.error):
+                logger.warning(
+                    "Too many BMP codepoints for a format 4 cmap subtable; "
+                    "only a format 13 subtable is written"
+                )
+                cmap.tables = []
+            cmap.tables += [
+                newSubtable(13, 0, 6, fullMapping),
+                newSubtable(13, 3, 10, fullMapping),
+            ]
         # If we have glyphs outside Unicode BMP, we must set another
         # subtable that can hold longer codepoints for them.
-        if nonBMP:
-            from fontTools.ttLib.tables._c_m_a_p import cmap_format_12
-
-            nonBMP.update(mapping)
-            # mac
-            cmap12_0_4 = cmap_format_12(12)
-            cmap12_0_4.platformID = 0
-            cmap12_0_4.platEncID = 4
-            cmap12_0_4.language = 0
-            cmap12_0_4.cmap = nonBMP
-            # windows
-            cmap12_3_10 = cmap_format_12(12)
-            cmap12_3_10.platformID = 3
-            cmap12_3_10.platEncID = 10
-            cmap12_3_10.language = 0
-            cmap12_3_10.cmap = nonBMP
-            # update tables registry
-            cmap.tables = [cmap4_0_3, cmap4_3_1, cmap12_0_4, cmap12_3_10]
+        elif fullMapping is not mapping:
+            cmap.tables += [
+                newSubtable(12, 0, 4, fullMapping),
+                newSubtable(12, 3, 10, fullMapping),
+            ]
         # unicode variation sequences
         uvsMapping = self.ufo.lib.get(UNICODE_VARIATION_SEQUENCES_KEY)
         if uvsMapping:
@@ -526,8 +554,6 @@ class BaseOutlineCompiler:
             cmap14_0_5.platEncID = 5
             cmap14_0_5.language = 0
             cmap14_0_5.cmap = {}
-            if nonBMP:
-                mapping = nonBMP
             uvsDict = dict()
             # public.unicodeVariationSequences uses hex strings as keys and
             # a dict of dicts, while cmap uses ints and a dict of tuples.
@@ -535,7 +561,7 @@ class BaseOutlineCompiler:
                 uvsList = []
                 for hexvalue, glyphName in glyphMapping.items():
                     value = int(hexvalue, 16)
-                    if glyphName == mapping[value]:
+                    if glyphName == fullMapping[value]:
                         uvsList.append((value, None))
                     else:
                         uvsList.append((value, glyphName))
@@ -556,7 +582,6 @@ class BaseOutlineCompiler:
             return
 
         self.otf["OS/2"] = os2 = newTable("OS/2")
-        font = self.ufo
         os2.version = 0x0004
         # average glyph width
         os2.xAvgCharWidth = 0
@@ -566,73 +591,73 @@ class BaseOutlineCompiler:
             if widths:
                 os2.xAvgCharWidth = otRound(sum(widths) / len(widths))
         # weight and width classes
-        os2.usWeightClass = getAttrWithFallback(font.info, "openTypeOS2WeightClass")
-        os2.usWidthClass = getAttrWithFallback(font.info, "openTypeOS2WidthClass")
+        os2.usWeightClass = getAttrWithFallback(self.info, "openTypeOS2WeightClass")
+        os2.usWidthClass = getAttrWithFallback(self.info, "openTypeOS2WidthClass")
         # embedding
         os2.fsType = intListToNum(
-            getAttrWithFallback(font.info, "openTypeOS2Type"), 0, 16
+            getAttrWithFallback(self.info, "openTypeOS2Type"), 0, 16
         )
 
         # subscript, superscript, strikeout values, taken from AFDKO:
         # FDK/Tools/Programs/makeotf/makeotf_lib/source/hotconv/hot.c
-        unitsPerEm = getAttrWithFallback(font.info, "unitsPerEm")
-        italicAngle = float(getAttrWithFallback(font.info, "italicAngle"))
-        xHeight = getAttrWithFallback(font.info, "xHeight")
+        unitsPerEm = getAttrWithFallback(self.info, "unitsPerEm")
+        italicAngle = float(getAttrWithFallback(self.info, "italicAngle"))
+        xHeight = getAttrWithFallback(self.info, "xHeight")
 
         def adjustOffset(offset, angle):
             """Adjust Y offset based on italic angle, to get X offset."""
             return offset * math.tan(math.radians(-angle)) if angle else 0
 
-        v = getAttrWithFallback(font.info, "openTypeOS2SubscriptXSize")
+        v = getAttrWithFallback(self.info, "openTypeOS2SubscriptXSize")
         if v is None:
             v = unitsPerEm * 0.65
         os2.ySubscriptXSize = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2SubscriptYSize")
+        v = getAttrWithFallback(self.info, "openTypeOS2SubscriptYSize")
         if v is None:
             v = unitsPerEm * 0.6
         os2.ySubscriptYSize = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2SubscriptYOffset")
+        v = getAttrWithFallback(self.info, "openTypeOS2SubscriptYOffset")
         if v is None:
             v = unitsPerEm * 0.075
         os2.ySubscriptYOffset = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2SubscriptXOffset")
+        v = getAttrWithFallback(self.info, "openTypeOS2SubscriptXOffset")
         if v is None:
             v = adjustOffset(-os2.ySubscriptYOffset, italicAngle)
         os2.ySubscriptXOffset = otRound(v)
 
-        v = getAttrWithFallback(font.info, "openTypeOS2SuperscriptXSize")
+        v = getAttrWithFallback(self.info, "openTypeOS2SuperscriptXSize")
         if v is None:
             v = os2.ySubscriptXSize
         os2.ySuperscriptXSize = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2SuperscriptYSize")
+        v = getAttrWithFallback(self.info, "openTypeOS2SuperscriptYSize")
         if v is None:
             v = os2.ySubscriptYSize
         os2.ySuperscriptYSize = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2SuperscriptYOffset")
+        v = getAttrWithFallback(self.info, "openTypeOS2SuperscriptYOffset")
         if v is None:
             v = unitsPerEm * 0.35
         os2.ySuperscriptYOffset = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2SuperscriptXOffset")
+        v = getAttrWithFallback(self.info, "openTypeOS2SuperscriptXOffset")
         if v is None:
             v = adjustOffset(os2.ySuperscriptYOffset, italicAngle)
         os2.ySuperscriptXOffset = otRound(v)
 
-        v = getAttrWithFallback(font.info, "openTypeOS2StrikeoutSize")
+        v = getAttrWithFallback(self.info, "openTypeOS2StrikeoutSize")
         if v is None:
-            v = getAttrWithFallback(font.info, "postscriptUnderlineThickness")
+            v = getAttrWithFallback(self.info, "postscriptUnderlineThickness")
         os2.yStrikeoutSize = otRound(v)
-        v = getAttrWithFallback(font.info, "openTypeOS2StrikeoutPosition")
+        v = getAttrWithFallback(self.info, "openTypeOS2StrikeoutPosition")
         if v is None:
             v = xHeight * 0.6 if xHeight else unitsPerEm * 0.22
         os2.yStrikeoutPosition = otRound(v)
 
         # family class
         ibmFontClass, ibmFontSubclass = getAttrWithFallback(
-            font.info, "openTypeOS2FamilyClass"
+            self.info, "openTypeOS2FamilyClass"
         )
         os2.sFamilyClass = (ibmFontClass << 8) + ibmFontSubclass
         # panose
-        data = getAttrWithFallback(font.info, "openTypeOS2Panose")
+        data = getAttrWithFallback(self.info, "openTypeOS2Panose")
         panose = Panose()
         panose.bFamilyType = data[0]
         panose.bSerifStyle = data[1]
@@ -646,17 +671,19 @@ class BaseOutlineCompiler:
         panose.bXHeight = data[9]
         os2.panose = panose
         # Unicode ranges
-        uniRanges = getAttrWithFallback(font.info, "openTypeOS2UnicodeRanges")
+        uniRanges = getAttrWithFallback(self.info, "openTypeOS2UnicodeRanges")
         if uniRanges is not None:
             os2.ulUnicodeRange1 = intListToNum(uniRanges, 0, 32)
             os2.ulUnicodeRange2 = intListToNum(uniRanges, 32, 32)
             os2.ulUnicodeRange3 = intListToNum(uniRanges, 64, 32)
             os2.ulUnicodeRange4 = intListToNum(uniRanges, 96, 32)
         else:
-            os2.recalcUnicodeRanges(self.otf)
+            os2.setUnicodeRanges(
+                calcUnicodeRanges(self.unicodeToGlyphNameMapping.keys())
+            )
 
         # codepage ranges
-        codepageRanges = getAttrWithFallback(font.info, "openTypeOS2CodePageRanges")
+        codepageRanges = getAttrWithFallback(self.info, "openTypeOS2CodePageRanges")
         if codepageRanges is None:
             unicodes = self.unicodeToGlyphNameMapping.keys()
             codepageRanges = calcCodePageRanges(unicodes)
@@ -664,29 +691,29 @@ class BaseOutlineCompiler:
         os2.ulCodePageRange2 = intListToNum(codepageRanges, 32, 32)
 
         # vendor id
-        os2.achVendID = getAttrWithFallback(font.info, "openTypeOS2VendorID")
+        os2.achVendID = getAttrWithFallback(self.info, "openTypeOS2VendorID")
 
         # vertical metrics
-        os2.sxHeight = otRound(getAttrWithFallback(font.info, "xHeight"))
-        os2.sCapHeight = otRound(getAttrWithFallback(font.info, "capHeight"))
+        os2.sxHeight = otRound(getAttrWithFallback(self.info, "xHeight"))
+        os2.sCapHeight = otRound(getAttrWithFallback(self.info, "capHeight"))
         os2.sTypoAscender = otRound(
-            getAttrWithFallback(font.info, "openTypeOS2TypoAscender")
+            getAttrWithFallback(self.info, "openTypeOS2TypoAscender")
         )
         os2.sTypoDescender = otRound(
-            getAttrWithFallback(font.info, "openTypeOS2TypoDescender")
+            getAttrWithFallback(self.info, "openTypeOS2TypoDescender")
         )
         os2.sTypoLineGap = otRound(
-            getAttrWithFallback(font.info, "openTypeOS2TypoLineGap")
+            getAttrWithFallback(self.info, "openTypeOS2TypoLineGap")
         )
         os2.usWinAscent = otRound(
-            getAttrWithFallback(font.info, "openTypeOS2WinAscent")
+            getAttrWithFallback(self.info, "openTypeOS2WinAscent")
         )
         os2.usWinDescent = otRound(
-            getAttrWithFallback(font.info, "openTypeOS2WinDescent")
+            getAttrWithFallback(self.info, "openTypeOS2WinDescent")
         )
         # style mapping
-        selection = list(getAttrWithFallback(font.info, "openTypeOS2Selection"))
-        styleMapStyleName = getAttrWithFallback(font.info, "styleMapStyleName")
+        selection = list(getAttrWithFallback(self.info, "openTypeOS2Selection"))
+        styleMapStyleName = getAttrWithFallback(self.info, "styleMapStyleName")
         if styleMapStyleName == "regular":
             selection.append(6)
         elif styleMapStyleName == "bold":
@@ -753,7 +780,6 @@ class BaseOutlineCompiler:
             isHhea = False
         self.otf[tag] = table = newTable(tag)
         mtxTable = self.otf.get(tag[0] + "mtx")
-        font = self.ufo
         if isHhea:
             table.tableVersion = 0x00010000
         else:
@@ -779,7 +805,7 @@ class BaseOutlineCompiler:
             "caretOffset": "%sCaretOffset" % commonPrefix,
         }
         for otfName, ufoName in metricsDict.items():
-            setattr(table, otfName, otRound(getAttrWithFallback(font.info, ufoName)))
+            setattr(table, otfName, otRound(getAttrWithFallback(self.info, ufoName)))
         # Horizontal metrics in hhea, vertical metrics in vhea
         advances = []  # width in hhea, height in vhea
         firstSideBearings = []  # left in hhea, top in vhea
@@ -925,22 +951,21 @@ class BaseOutlineCompiler:
             return
 
         self.otf["post"] = post = newTable("post")
-        font = self.ufo
         post.formatType = 3.0
         # italic angle
-        italicAngle = float(getAttrWithFallback(font.info, "italicAngle"))
+        italicAngle = float(getAttrWithFallback(self.info, "italicAngle"))
         post.italicAngle = italicAngle
         # underline
         underlinePosition = getAttrWithFallback(
-            font.info, "postscriptUnderlinePosition"
+            self.info, "postscriptUnderlinePosition"
         )
         post.underlinePosition = otRound(underlinePosition)
         underlineThickness = getAttrWithFallback(
-            font.info, "postscriptUnderlineThickness"
+            self.info, "postscriptUnderlineThickness"
         )
         post.underlineThickness = otRound(underlineThickness)
         post.isFixedPitch = int(
-            getAttrWithFallback(font.info, "postscriptIsFixedPitch")
+            getAttrWithFallback(self.info, "postscriptIsFixedPitch")
         )
         # misc
         post.minMemType42 = 0
@@ -1089,6 +1114,7 @@ class OutlineOTFCompiler(BaseOutlineCompiler):
         notdefGlyph=None,
         roundTolerance=None,
         optimizeCFF=True,
+        compileContext=None,
     ):
         if roundTolerance is not None:
             self.roundTolerance = float(roundTolerance)
@@ -1101,6 +1127,7 @@ class OutlineOTFCompiler(BaseOutlineCompiler):
             glyphOrder=glyphOrder,
             tables=tables,
             notdefGlyph=notdefGlyph,
+            compileContext=compileContext,
         )
         self.optimizeCFF = optimizeCFF
         self._defaultAndNominalWidths = None
@@ -1112,7 +1139,7 @@ class OutlineOTFCompiler(BaseOutlineCompiler):
         from the glyphs' advance widths.
         """
         if self._defaultAndNominalWidths is None:
-            info = self.ufo.info
+            info = self.info
             # populate the width values
             if all(
                 getattr(info, attr, None) is None
@@ -1265,7 +1292,7 @@ class OutlineOTFCompiler(BaseOutlineCompiler):
         topDictIndex.strings = strings
         cff.GlobalSubrs = globalSubrs
         # populate naming data
-        info = self.ufo.info
+        info = self.info
         psName = getAttrWithFallback(info, "postscriptFontName")
         cff.fontNames.append(psName)
         topDict = cff.topDictIndex[0]
@@ -1325,6 +1352,34 @@ class OutlineOTFCompiler(BaseOutlineCompiler):
         if nominalWidthX:
             private.rawDict["nominalWidthX"] = nominalWidthX
         # populate hint data
+        self.setupPrivateDictHints(private)
+        # populate glyphs
+        cffGlyphs = self.getCompiledGlyphs()
+        for glyphName in self.glyphOrder:
+            charString = cffGlyphs[glyphName]
+            charString.private = private
+            charString.globalSubrs = globalSubrs
+            # add to the font
+            if glyphName in charStrings:
+                # XXX a glyph already has this name. should we choke?
+                glyphID = charStrings.charStrings[glyphName]
+                charStringsIndex.items[glyphID] = charString
+            else:
+                charStringsIndex.append(charString)
+                glyphID = len(topDict.charset)
+                charStrings.charStrings[glyphName] = glyphID
+                topDict.charset.append(glyphName)
+        topDict.FontBBox = self.fontBoundingBox
+
+    def setupPrivateDictHints(self, private):
+        """Populate the PrivateDict's hinting data (blues, stems) from the
+        UFO font info.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the hint data in a
+        different way if desired.
+        """
+        info = self.info
         blueFuzz = otRound(getAttrWithFallback(info, "postscriptBlueFuzz"))
         blueShift = otRound(getAttrWithFallback(info, "postscriptBlueShift"))
         blueScale = getAttrWithFallback(info, "postscriptBlueScale")
@@ -1367,23 +1422,116 @@ class OutlineOTFCompiler(BaseOutlineCompiler):
             private.rawDict["StdHW"] = stemSnapH[0]
             private.rawDict["StemSnapV"] = stemSnapV
             private.rawDict["StdVW"] = stemSnapV[0]
-        # populate glyphs
+
+
+class OutlineCFF2Compiler(OutlineOTFCompiler):
+    """Compile a .otf font with CFF2 outlines.
+
+    Unlike compiling a CFF 1.0 table and converting it to CFF2 afterwards, the
+    charstrings are drawn without the advance widths from the start, and the
+    top and private dicts only contain the operators allowed in CFF2. The
+    resulting font can be used as a master for building a variable CFF2 font
+    with fontTools.varLib, which only needs to add the blend operators.
+
+    Glyph names are not stored in the CFF2 table, thus a format 2.0 'post'
+    table is used.
+    """
+
+    tables = BaseOutlineCompiler.tables | {"CFF2", "VORG"}
+
+    def getDefaultAndNominalWidths(self):
+        """CFF2 charstrings don't contain advance widths; return (0, 0)."""
+        return (0, 0)
+
+    def getCharStringForGlyph(self, glyph, private, globalSubrs=None):
+        """
+        Get a width-less Type2CharString for the *glyph*, encoded as CFF2.
+
+        **This should not be called externally.** Subclasses
+        may override this method to handle the charstring creation
+        in a different way if desired.
+        """
+        pen = T2CharStringPen(
+            None, self.allGlyphs, roundTolerance=self.roundTolerance, CFF2=True
+        )
+        glyph.draw(pen)
+        charString = pen.getCharString(private, globalSubrs, optimize=self.optimizeCFF)
+        return charString
+
+    def setupTable_post(self):
+        """Make a format 2 post table with the compiler's glyph order."""
+        super().setupTable_post()
+        if "post" not in self.otf:
+            return
+
+        post = self.otf["post"]
+        post.formatType = 2.0
+        post.extraNames = []
+        post.mapping = {}
+        post.glyphOrder = self.glyphOrder
+
+    def setupOtherTables(self):
+        self.setupTable_CFF2()
+        if self.vertical:
+            self.setupTable_VORG()
+
+    def setupTable_CFF2(self):
+        """Make the CFF2 table."""
+        # the sparse master tables may request a "CFF " table, we build a CFF2
+        # table in its place
+        if not {"CFF", "CFF ", "CFF2"}.intersection(self.tables):
+            return
+
+        self.otf["CFF2"] = cff2 = newTable("CFF2")
+        cff = cff2.cff = CFFFontSet()
+        cff.otFont = self.otf
+        cff.major = 2
+        cff.minor = 0
+        cff.hdrSize = 5
+        cff.fontNames = [getAttrWithFallback(self.info, "postscriptFontName")]
+        cff.strings = None
+
+        cff2GetGlyphOrder = self.otf.getGlyphOrder
+        cff.topDictIndex = topDictIndex = TopDictIndex(None, cff2GetGlyphOrder)
+        globalSubrs = GlobalSubrsIndex()
+        cff.GlobalSubrs = globalSubrs
+
+        private = PrivateDict()
+        self.setupPrivateDictHints(private)
+        fontDict = FontDict()
+        fontDict.setCFF2(True)
+        fontDict.Private = private
+        fdArray = FDArrayIndex()
+        fdArray.strings = None
+        fdArray.GlobalSubrs = globalSubrs
+        fdArray.append(fontDict)
+
+        topDict = TopDict(GlobalSubrs=globalSubrs, cff2GetGlyphOrder=cff2GetGlyphOrder)
+        topDict.FDArray = fdArray
+        unitsPerEm = otRound(getAttrWithFallback(self.info, "unitsPerEm"))
+        topDict.FontMatrix = [1.0 / unitsPerEm, 0, 0, 1.0 / unitsPerEm, 0, 0]
+
+        charStrings = topDict.CharStrings = CharStrings(
+            file=None,
+            charset=None,
+            globalSubrs=globalSubrs,
+            private=private,
+            fdSelect=None,
+            fdArray=fdArray,
+            isCFF2=True,
+        )
         cffGlyphs = self.getCompiledGlyphs()
         for glyphName in self.glyphOrder:
             charString = cffGlyphs[glyphName]
             charString.private = private
             charString.globalSubrs = globalSubrs
-            # add to the font
-            if glyphName in charStrings:
-                # XXX a glyph already has this name. should we choke?
-                glyphID = charStrings.charStrings[glyphName]
-                charStringsIndex.items[glyphID] = charString
-            else:
-                charStringsIndex.append(charString)
-                glyphID = len(topDict.charset)
-                charStrings.charStrings[glyphName] = glyphID
-                topDict.charset.append(glyphName)
-        topDict.FontBBox = self.fontBoundingBox
+            charStrings[glyphName] = charString
+        topDictIndex.append(topDict)
+
+    def setupPrivateDictHints(self, private):
+        super().setupPrivateDictHints(private)
+        # ForceBold was removed from the CFF2 Private DICT
+        private.rawDict.pop("ForceBold", None)
 
 
 class OutlineTTFCompiler(BaseOutlineCompiler, InstructionCompiler):
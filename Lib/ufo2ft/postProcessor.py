@@ -1,9 +1,14 @@
 import enum
+import hashlib
+import importlib
 import logging
+import os
 import re
+from functools import lru_cache
 from io import BytesIO
 
-from fontTools.ttLib import TTFont
+from fontTools.ttLib import TTFont, newTable
+from fontTools.ttLib.standardGlyphOrder import standardGlyphOrder
 
 from ufo2ft.constants import (
     GLYPHS_DONT_USE_PRODUCTION_NAMES,
@@ -37,8 +42,10 @@ class PostProcessor:
         2: SubroutinizerBackend.CFFSUBR,
     }
 
-    def __init__(self, otf, ufo, glyphSet=None):
+    def __init__(self, otf, ufo, glyphSet=None, compileContext=None):
         self.ufo = ufo
+        if glyphSet is None and compileContext is not None:
+            glyphSet = compileContext.glyphSet
         self.glyphSet = glyphSet if glyphSet is not None else ufo
 
         # FIXME: Stop reloading all incoming fonts here. It ensures that 1) we
@@ -50,6 +57,7 @@ class PostProcessor:
         self.otf = _reloadFont(otf)
 
         self._postscriptNames = ufo.lib.get("public.postscriptNames")
+        self._productionNames = {}
 
     def process(
         self,
@@ -57,6 +65,7 @@ class PostProcessor:
         optimizeCFF=True,
         cffVersion=None,
         subroutinizer=None,
+        cacheDir=None,
     ):
         """
         useProductionNames (Optional[bool]):
@@ -99,20 +108,28 @@ class PostProcessor:
           "compreffor". By default "cffsubr" is used for both CFF 1 and CFF 2.
           NOTE: compreffor currently doesn't support input fonts with CFF2 table.
 
-
+        cacheDir (Optional[str]):
+          Path to a directory where subroutinized CFF or CFF2 tables are stored,
+          keyed by a hash of the input charstrings, subroutines and private dicts,
+          and of the subroutinizer backend and version. When these did not change
+          since a previous build, the cached table is reused (with the current
+          font names and font info) and subroutinization is skipped.
         """
         if self._get_cff_version(self.otf):
             self.process_cff(
                 optimizeCFF=optimizeCFF,
                 cffVersion=cffVersion,
                 subroutinizer=subroutinizer,
+                cacheDir=cacheDir,
             )
 
         self.process_glyph_names(useProductionNames)
 
         return self.otf
 
-    def process_cff(self, *, optimizeCFF=True, cffVersion=None, subroutinizer=None):
+    def process_cff(
+        self, *, optimizeCFF=True, cffVersion=None, subroutinizer=None, cacheDir=None
+    ):
         cffInputVersion = self._get_cff_version(self.otf)
         if not cffInputVersion:
             raise ValueError("Missing required 'CFF ' or 'CFF2' table")
@@ -127,7 +144,7 @@ class PostProcessor:
                 backend = self.DEFAULT_SUBROUTINIZER_FOR_CFF_VERSION[cffOutputVersion]
             else:
                 backend = self.SubroutinizerBackend(subroutinizer)
-            self._subroutinize(backend, self.otf, cffOutputVersion)
+            self._subroutinize(backend, self.otf, cffOutputVersion, cacheDir=cacheDir)
 
         elif cffInputVersion != cffOutputVersion:
             if (
@@ -172,25 +189,31 @@ class PostProcessor:
         rename_map = self._build_production_names()
 
         otf = self.otf
-        otf.setGlyphOrder([rename_map.get(n, n) for n in otf.getGlyphOrder()])
-
-        # we need to compile format 2 'post' table so that the 'extraNames'
-        # attribute is updated with the list of the names outside the
-        # standard Macintosh glyph order; otherwise, if one dumps the font
-        # to TTX directly before compiling first, the post table will not
-        # contain the extraNames.
+        glyph_order = otf.getGlyphOrder()
+        new_glyph_order = [rename_map.get(n, n) for n in glyph_order]
+        otf.setGlyphOrder(new_glyph_order)
+
+        # the format 2 'post' table's 'extraNames' attribute must be updated with
+        # the list of the names outside the standard Macintosh glyph order;
+        # otherwise, if one dumps the font to TTX directly before compiling first,
+        # the post table will not contain the extraNames. We compute the same
+        # list that post.compile() would, without compiling the whole table.
         if "post" in otf and otf["post"].formatType == 2.0:
-            otf["post"].extraNames = []
-            otf["post"].compile(otf)
+            post = otf["post"]
+            post.extraNames = _buildPostExtraNames(new_glyph_order, post.mapping)
 
         cff_tag = "CFF " if "CFF " in otf else "CFF2" if "CFF2" in otf else None
         if cff_tag == "CFF " or (cff_tag == "CFF2" and otf.isLoaded(cff_tag)):
             cff = otf[cff_tag].cff.topDictIndex[0]
             char_strings = cff.CharStrings.charStrings
-            cff.CharStrings.charStrings = {
-                rename_map.get(n, n): v for n, v in char_strings.items()
-            }
-            cff.charset = [rename_map.get(n, n) for n in cff.charset]
+            new_char_strings = {}
+            new_charset = []
+            for name in cff.charset:
+                new_name = rename_map.get(name, name)
+                new_char_strings[new_name] = char_strings[name]
+                new_charset.append(new_name)
+            cff.CharStrings.charStrings = new_char_strings
+            cff.charset = new_charset
 
     def _build_production_names(self):
         seen = {}
@@ -234,7 +257,17 @@ class PostProcessor:
 
     def _build_production_name(self, glyph):
         """Build a production name for a single glyph."""
-
+        # suffixed glyphs and ligatures recursively reuse the production names
+        # of their base glyphs, so we memoize them by glyph name
+        name = glyph.name
+        try:
+            return self._productionNames[name]
+        except KeyError:
+            production_name = self._compute_production_name(glyph)
+            self._productionNames[name] = production_name
+            return production_name
+
+    def _compute_production_name(self, glyph):
         # use PostScript names from UFO lib if available
         if self._postscriptNames:
             production_name = self._postscriptNames.get(glyph.name)
@@ -243,9 +276,7 @@ class PostProcessor:
         # use name derived from unicode value
         unicode_val = glyph.unicode
         if glyph.unicode is not None:
-            return "{}{:04X}".format(
-                "u" if unicode_val > 0xFFFF else "uni", unicode_val
-            )
+            return _unicodeProductionName(unicode_val)
 
         # use production name + last (non-script) suffix if possible
         parts = glyph.name.rsplit(".", 1)
@@ -315,10 +346,124 @@ class PostProcessor:
         convertCFFtoCFF2(otf)
 
     @classmethod
-    def _subroutinize(cls, backend, otf, cffVersion):
+    def _subroutinize(cls, backend, otf, cffVersion, cacheDir=None):
         subroutinize = getattr(cls, f"_subroutinize_with_{backend.value}")
+        if cacheDir is None:
+            subroutinize(otf, cffVersion)
+            return
+
+        key = cls._subroutinizer_cache_key(backend, otf, cffVersion)
+        data = cls._get_cached_cff_data(key, cacheDir)
+        if data is not None:
+            logger.info("Reusing cached subroutinized %s table", cffVersion.name)
+            cls._replace_cff_table(otf, cffVersion, data)
+            return
+
         subroutinize(otf, cffVersion)
 
+        data = otf.getTableData(cls._cff_table_tag(cffVersion))
+        cls._set_cached_cff_data(key, data, cacheDir)
+
+    @staticmethod
+    def _cff_table_tag(cffVersion):
+        return "CFF " if cffVersion == CFFVersion.CFF else "CFF2"
+
+    @classmethod
+    def _subroutinizer_cache_key(cls, backend, otf, cffVersion):
+        """Return a hex digest identifying the result of subroutinizing 'otf'.
+
+        Only the data the subroutinized charstrings depend on is hashed: the
+        glyph order, the charstrings, the global and local subroutines, the
+        private dicts and the FDSelect. The font names and other font info in
+        the top dict are left out, and copied from the input table when the
+        cached table is reused (see _replace_cff_table).
+        """
+        module = importlib.import_module(backend.value)
+        backendVersion = getattr(module, "__version__", "unknown")
+        cffInputVersion = cls._get_cff_version(otf)
+        inputTag = cls._cff_table_tag(cffInputVersion)
+        cff = otf[inputTag].cff
+        topDict = cff.topDictIndex[0]
+        isCFF2 = cffInputVersion == CFFVersion.CFF2
+
+        h = hashlib.sha256()
+
+        def update(value):
+            data = value if isinstance(value, bytes) else repr(value).encode()
+            h.update(len(data).to_bytes(4, "big") + data)
+
+        update(f"{backend.value}={backendVersion};{int(cffInputVersion)}")
+        update(int(cffVersion))
+        update(otf.getGlyphOrder())
+        update(topDict.FontMatrix)
+        charStrings = topDict.CharStrings
+        for glyphName in otf.getGlyphOrder():
+            update(_charStringBytecode(charStrings[glyphName], isCFF2))
+        for subr in cff.GlobalSubrs:
+            update(_charStringBytecode(subr, isCFF2))
+        if hasattr(topDict, "FDArray"):
+            privates = [fd.Private for fd in topDict.FDArray]
+            if hasattr(topDict, "FDSelect"):
+                update(list(topDict.FDSelect.gidArray))
+        else:
+            privates = [topDict.Private]
+        for private in privates:
+            update(
+                [
+                    (name, getattr(private, name, None))
+                    for name in private.order
+                    if name != "Subrs"
+                ]
+            )
+            for subr in getattr(private, "Subrs", ()):
+                update(_charStringBytecode(subr, isCFF2))
+        if isCFF2 and cffVersion == CFFVersion.CFF:
+            # the CFF 1.0 top dict is then made from these tables
+            for tag in ("hmtx", "name"):
+                if tag in otf:
+                    update(otf.getTableData(tag))
+        return h.hexdigest()
+
+    @staticmethod
+    def _get_cached_cff_data(key, cacheDir):
+        path = os.path.join(cacheDir, key + ".cff")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    @staticmethod
+    def _set_cached_cff_data(key, data, cacheDir):
+        os.makedirs(cacheDir, exist_ok=True)
+        path = os.path.join(cacheDir, key + ".cff")
+        # write to a temporary file first so that concurrent builds sharing
+        # the same cache directory never read a partially written file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def _replace_cff_table(cls, otf, cffVersion, data):
+        cffInputVersion = cls._get_cff_version(otf)
+        outputTag = cls._cff_table_tag(cffVersion)
+
+        # ensure the glyph order is decompiled before CFF table is replaced
+        _ = otf.getGlyphOrder()
+
+        table = newTable(outputTag)
+        table.decompile(data, otf)
+        inputTag = cls._cff_table_tag(cffInputVersion)
+        if cffInputVersion == cffVersion == CFFVersion.CFF:
+            # the cached table may come from a build with different font info
+            _copyCFFFontInfo(otf[inputTag].cff, table.cff)
+        del otf[inputTag]
+        otf[outputTag] = table
+
+        # same as cffsubr does when converting CFF2 back to CFF 1.0
+        if cffInputVersion == CFFVersion.CFF2 and cffVersion == CFFVersion.CFF:
+            cls.set_post_table_format(otf, 3.0)
+
     @classmethod
     def _subroutinize_with_compreffor(cls, otf, cffVersion):
         from compreffor import compress
@@ -347,6 +492,68 @@ class PostProcessor:
         return cffsubr.subroutinize(otf, cff_version=cffVersion, keep_glyph_names=False)
 
 
+# the top dict values set from the font info by the outline compiler
+_CFF_FONT_INFO_KEYS = (
+    "version",
+    "Notice",
+    "Copyright",
+    "FullName",
+    "FamilyName",
+    "Weight",
+    "isFixedPitch",
+    "ItalicAngle",
+    "UnderlinePosition",
+    "UnderlineThickness",
+)
+
+
+def _copyCFFFontInfo(source, target):
+    """Copy the font names and the font info of the top dict from the 'source'
+    to the 'target' CFF FontSet."""
+    target.fontNames = list(source.fontNames)
+    sourceTopDict = source.topDictIndex[0]
+    targetTopDict = target.topDictIndex[0]
+    for key in _CFF_FONT_INFO_KEYS:
+        targetTopDict.rawDict.pop(key, None)
+        targetTopDict.__dict__.pop(key, None)
+        value = getattr(sourceTopDict, key, None)
+        if isinstance(value, float) and value.is_integer():
+            # encode as integer like the subroutinizer does
+            value = int(value)
+        if value is not None:
+            setattr(targetTopDict, key, value)
+
+
+def _charStringBytecode(charString, isCFF2=False):
+    if charString.bytecode is None:
+        charString.compile(isCFF2=isCFF2)
+    return charString.bytecode
+
+
+@lru_cache(maxsize=None)
+def _unicodeProductionName(unicode_val):
+    """Return the 'uniXXXX' or 'uXXXXX' production name for a code point."""
+    return "{}{:04X}".format("u" if unicode_val > 0xFFFF else "uni", unicode_val)
+
+
+_STANDARD_GLYPH_NAMES = frozenset(standardGlyphOrder)
+
+
+def _buildPostExtraNames(glyphOrder, mapping=None):
+    """Return the list of the glyph names that a format 2 'post' table stores
+    as 'extraNames', i.e. those not in the standard Macintosh glyph order,
+    in the same order as fontTools' post table compiler would produce them.
+    """
+    extraNames = []
+    seen = set()
+    for glyphName in glyphOrder:
+        psName = mapping.get(glyphName, glyphName) if mapping else glyphName
+        if psName not in _STANDARD_GLYPH_NAMES and psName not in seen:
+            seen.add(psName)
+            extraNames.append(psName)
+    return extraNames
+
+
 # Adapted from fontTools.cff.specializer.programToCommands
 # https://github.com/fonttools/fonttools/blob/babca16
 # /Lib/fontTools/cffLib/specializer.py#L40-L122
@@ -0,0 +1,133 @@
+"""Load the UFO sources of a designspace, parsing their glyphs in parallel.
+
+Parsing the GLIF files is CPU-bound, and for designspaces with many masters it
+can take as long as compiling them. loadSourceFonts distributes the parsing
+over a pool of worker processes, which send back each glyph as a dict of
+attributes and a recording of its outline: these are much cheaper to transfer
+between processes than glyph objects. The layers of the sources' fonts are
+then filled with glyphs rebuilt from them.
+"""
+import logging
+import os
+
+from fontTools.pens.recordingPen import RecordingPointPen
+
+from ufo2ft.util import openUFO
+
+logger = logging.getLogger(__name__)
+
+# number of glyphs parsed by a worker process in one go
+CHUNK_SIZE = 512
+
+
+# the glyph sets opened by a worker process, keyed by (path, layerName)
+_glyphSets = {}
+
+
+class _GlyphAttributes:
+    """Collects the attributes that GlyphSet.readGlyph sets on a glyph."""
+
+
+def readGlyphs(path, layerName, glyphNames):
+    """Parse the GLIF files of 'glyphNames' from the layer 'layerName' (or the
+    default layer, if None) of the UFO at 'path'.
+
+    Return a list of (glyphName, attributes, outline) tuples, where
+    'attributes' is a dict of the glyph's width, unicodes, anchors, lib, etc.,
+    and 'outline' is the value of a RecordingPointPen the glyph was drawn to.
+    """
+    glyphSet = _glyphSets.get((path, layerName))
+    if glyphSet is None:
+        from fontTools.ufoLib import UFOReader
+
+        # the layer contents were already validated when the font was opened
+        reader = UFOReader(path, validate=False)
+        glyphSet = reader.getGlyphSet(layerName, validateRead=False)
+        _glyphSets[path, layerName] = glyphSet
+    result = []
+    for glyphName in glyphNames:
+        attributes = _GlyphAttributes()
+        pen = RecordingPointPen()
+        glyphSet.readGlyph(glyphName, attributes, pen, validate=True)
+        attributes = vars(attributes)
+        attributes.pop("name", None)
+        result.append((glyphName, attributes, pen.value))
+    return result
+
+
+def _readGlyphsInWorker(args):
+    return readGlyphs(*args)
+
+
+def _makeGlyph(glyphClass, glyphName, attributes, outline):
+    glyph = glyphClass(glyphName)
+    for attr, value in attributes.items():
+        setattr(glyph, attr, value)
+    pen = RecordingPointPen()
+    pen.value = outline
+    pen.replay(glyph.getPointPen())
+    return glyph
+
+
+def loadSourceFonts(designSpaceDoc, jobs=None):
+    """Open the UFOs of the designspace sources that have a 'path' but no
+    'font', and parse the glyphs of the layers they use on a pool of 'jobs'
+    worker processes (by default, one per CPU).
+
+    Like DesignSpaceDocument.loadSourceFonts, sources with the same path share
+    the same font. Sources that already have a 'font', or have no 'path', are
+    left alone.
+
+    Parsing in parallel requires ufoLib2. With defcon, or with jobs=1, the
+    UFOs are only opened, and each glyph is parsed when first accessed.
+
+    Return the list of the sources' fonts.
+    """
+    fonts = {}
+    layerNames = {}
+    for source in designSpaceDoc.sources:
+        if source.font is not None or source.path is None:
+            continue
+        if source.path not in fonts:
+            fonts[source.path] = openUFO(source.path)
+            layerNames[source.path] = []
+        source.font = fonts[source.path]
+        if source.layerName not in layerNames[source.path]:
+            layerNames[source.path].append(source.layerName)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    try:
+        from ufoLib2.objects import Glyph
+    except ImportError:
+        Glyph = None
+    if jobs > 1 and Glyph is not None and fonts:
+        _parseGlyphs(fonts, layerNames, jobs, Glyph)
+
+    return [source.font for source in designSpaceDoc.sources]
+
+
+def _parseGlyphs(fonts, layerNames, jobs, glyphClass):
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks, layers = [], []
+    for path, font in fonts.items():
+        for layerName in layerNames[path]:
+            if layerName is None:
+                layer = font.layers.defaultLayer
+            else:
+                layer = font.layers[layerName]
+            glyphNames = list(layer.keys())
+            for i in range(0, len(glyphNames), CHUNK_SIZE):
+                tasks.append((path, layerName, glyphNames[i : i + CHUNK_SIZE]))
+                layers.append(layer)
+
+    logger.info("Parsing glyphs of %d sources with %d processes", len(fonts), jobs)
+    # forked workers must not reuse glyph sets opened before the files changed
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=_glyphSets.clear)
+    with executor:
+        results = executor.map(_readGlyphsInWorker, tasks)
+        for layer, glyphs in zip(layers, results):
+            for glyphName, attributes, outline in glyphs:
+                glyph = _makeGlyph(glyphClass, glyphName, attributes, outline)
+                layer.insertGlyph(glyph, copy=False)
@@ -1,11 +1,14 @@
+import bisect
+import functools
 import importlib
 import logging
+import os
 import re
+from collections import OrderedDict
 from copy import deepcopy
 from inspect import currentframe, getfullargspec
 
-from fontTools import subset, ttLib, unicodedata
-from fontTools.feaLib.builder import addOpenTypeFeatures
+from fontTools import ttLib, unicodedata
 from fontTools.misc.fixedTools import otRound
 from fontTools.misc.transform import Identity, Transform
 from fontTools.pens.reverseContourPen import ReverseContourPen
@@ -219,13 +222,117 @@ def makeUnicodeToGlyphNameMapping(font, glyphOrder=None):
     return mapping
 
 
-def compileGSUB(featureFile, glyphOrder):
+class CompileContext:
+    """Data derived from a UFO and its pre-processed glyph set, computed lazily
+    at most once per build and shared by the outline compiler, the feature
+    compiler (and its feature writers) and the post-processor.
+
+    The outline compiler stores the glyph order and character mapping it
+    made (so subclasses overriding how these are made are honoured), and the
+    later stages reuse them instead of rebuilding them from the glyphs.
+
+    The contexts of the masters of an interpolatable build also share the
+    same 'gsubCache' (see GSUBCache).
+    """
+
+    def __init__(self, ufo, glyphSet=None, glyphOrder=None, gsubCache=None):
+        self.ufo = ufo
+        self.gsubCache = gsubCache
+        self.glyphSet = glyphSet if glyphSet is not None else ufo
+        self._requestedGlyphOrder = glyphOrder
+        self._glyphOrder = None
+        self._unicodeToGlyphNameMapping = None
+        self._orderedGlyphSet = None
+        # tuple of (unassigned, bases, ligatures, marks, components) sets,
+        # parsed by the first feature writer that needs them
+        self.openTypeCategories = None
+        self._fontInfo = None
+
+    @property
+    def fontInfo(self):
+        """The UFO info, with the values resolved by getAttrWithFallback
+        memoized (see ufo2ft.fontInfoData.ResolvedFontInfo)."""
+        if self._fontInfo is None:
+            from ufo2ft.fontInfoData import ResolvedFontInfo
+
+            self._fontInfo = ResolvedFontInfo(self.ufo.info)
+        return self._fontInfo
+
+    @property
+    def glyphOrder(self):
+        if self._glyphOrder is None:
+            glyphOrder = self._requestedGlyphOrder
+            if glyphOrder is None:
+                glyphOrder = self.ufo.glyphOrder
+            self._glyphOrder = makeOfficialGlyphOrder(self.glyphSet, glyphOrder)
+        return self._glyphOrder
+
+    @glyphOrder.setter
+    def glyphOrder(self, glyphOrder):
+        self._glyphOrder = list(glyphOrder)
+        self._orderedGlyphSet = None
+
+    @property
+    def unicodeToGlyphNameMapping(self):
+        if self._unicodeToGlyphNameMapping is None:
+            self._unicodeToGlyphNameMapping = makeUnicodeToGlyphNameMapping(
+                self.glyphSet, self.glyphOrder
+            )
+        return self._unicodeToGlyphNameMapping
+
+    @unicodeToGlyphNameMapping.setter
+    def unicodeToGlyphNameMapping(self, mapping):
+        self._unicodeToGlyphNameMapping = mapping
+
+    @property
+    def orderedGlyphSet(self):
+        """An OrderedDict of glyph names and glyphs sorted by glyphOrder."""
+        if self._orderedGlyphSet is None:
+            glyphSet = self.glyphSet
+            self._orderedGlyphSet = OrderedDict(
+                (gn, glyphSet[gn]) for gn in self.glyphOrder
+            )
+        return self._orderedGlyphSet
+
+
+class GSUBCache:
+    """The GSUB tables compiled for the masters of an interpolatable build.
+
+    The masters usually share the same GSUB features, while their kerning and
+    anchors differ. The feature compiler of each master hashes the feature file
+    once the GSUB feature writers have run, together with the glyph order, and
+    looks up the tables compiled for the same key by the previous masters.
+
+    A new cache is made by the compile functions for each build, so the tables
+    are never reused across unrelated builds.
+    """
+
+    def __init__(self):
+        # temporary GSUB tables (and their GSUBClosure) used by the feature
+        # writers, see BaseFeatureWriter.compileGSUB
+        self.compiled = {}
+        # final GSUB tables built by the feature compilers (None if the font
+        # has no GSUB), see FeatureCompiler.buildTables
+        self.tables = {}
+
+
+def compileGSUB(featureFile, glyphOrder, fvar=None):
     """Compile and return a GSUB table from `featureFile` (feaLib
     FeatureFile), using the given `glyphOrder` (list of glyph names).
+
+    If the feature file contains variable scalars, e.g. in kerning or anchors,
+    the 'fvar' table of the variable font must be passed as well.
     """
+    from ufo2ft.featureCompiler import _FeaBuilder
+
     font = ttLib.TTFont()
     font.setGlyphOrder(glyphOrder)
-    addOpenTypeFeatures(font, featureFile, tables={"GSUB"})
+    tables = {"GSUB"}
+    if fvar is not None:
+        font["fvar"] = fvar
+        # feaLib requires the GDEF variation store when the font is variable
+        tables.add("GDEF")
+    _FeaBuilder(font, featureFile).build(tables=tables)
     return font.get("GSUB")
 
 
@@ -234,6 +341,7 @@ def compileGDEF(featureFile, glyphOrder):
     using the given `glyphOrder` (list of glyph names).
     """
     from fontTools.feaLib.ast import TableBlock
+    from fontTools.feaLib.builder import addOpenTypeFeatures
 
     font = ttLib.TTFont()
     font.setGlyphOrder(glyphOrder)
@@ -255,19 +363,141 @@ def closeGlyphsOverGSUB(gsub, glyphs):
     in-place adding all the glyph names that can be reached via GSUB
     substitutions from this initial set.
     """
+    from fontTools import subset
+
     subsetter = subset.Subsetter()
     subsetter.glyphs = glyphs
     gsub.closure_glyphs(subsetter)
 
 
+class GSUBClosure:
+    """Compute closures of sets of glyphs over a GSUB table, with the same
+    result as closeGlyphsOverGSUB, but amortizing the cost of multiple queries
+    over the same table.
+
+    The single, multiple, alternate and ligature substitutions of the lookups
+    referenced by the GSUB features are indexed upfront as a graph, which is
+    traversed for each query. Contextual lookups, whose closure depends on
+    the glyphs present, are still handled by the FontTools subsetter,
+    alternately with the graph traversal until the glyph set doesn't grow.
+    Results are cached by input glyph set.
+    """
+
+    def __init__(self, gsub):
+        # the subsetter adds the closure methods to the otTables classes
+        import fontTools.subset  # noqa: F401
+
+        self.gsub = gsub
+        # glyph -> set of glyphs it can be substituted with
+        self.substitutions = {}
+        # glyph -> list of (input glyphs, ligature glyph) for all the ligature
+        # substitutions whose input contains that glyph
+        self.ligatures = {}
+        # lookups that can't be represented in the graph (e.g. contextual)
+        self.otherLookups = []
+        self._cache = {}
+
+        table = gsub.table
+        if not table.LookupList:
+            return
+        if table.ScriptList:
+            featureIndices = table.ScriptList.collect_features()
+        else:
+            featureIndices = []
+        if table.FeatureList:
+            lookupIndices = table.FeatureList.collect_lookups(featureIndices)
+        else:
+            lookupIndices = []
+        if getattr(table, "FeatureVariations", None):
+            lookupIndices += table.FeatureVariations.collect_lookups(featureIndices)
+        lookups = table.LookupList.Lookup
+        for i in sorted(set(lookupIndices)):
+            if i >= len(lookups) or not lookups[i]:
+                continue
+            lookup = lookups[i]
+            subtables = [
+                st.ExtSubTable if st.LookupType == 7 else st for st in lookup.SubTable
+            ]
+            if all(st.LookupType in (1, 2, 3, 4) for st in subtables):
+                for st in subtables:
+                    self._indexSubtable(st)
+            else:
+                self.otherLookups.append(lookup)
+
+    def _indexSubtable(self, st):
+        substitutions = self.substitutions
+        if st.LookupType == 1:
+            for glyph, subst in st.mapping.items():
+                substitutions.setdefault(glyph, set()).add(subst)
+        elif st.LookupType == 2:
+            for glyph, subst in st.mapping.items():
+                substitutions.setdefault(glyph, set()).update(subst)
+        elif st.LookupType == 3:
+            for glyph, alternates in st.alternates.items():
+                substitutions.setdefault(glyph, set()).update(alternates)
+        else:
+            for glyph, ligatures in st.ligatures.items():
+                for lig in ligatures:
+                    inputGlyphs = (glyph,) + tuple(lig.Component)
+                    rule = (inputGlyphs, lig.LigGlyph)
+                    for g in set(inputGlyphs):
+                        self.ligatures.setdefault(g, []).append(rule)
+
+    def close(self, glyphs):
+        """Return the frozenset of glyph names that can be reached via GSUB
+        substitutions from the initial `glyphs`, including the latter.
+        """
+        key = frozenset(glyphs)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._cache[key] = frozenset(self._close(key))
+        return result
+
+    def _close(self, glyphs):
+        from fontTools.subset import Subsetter
+
+        result = set(glyphs)
+        newGlyphs = result
+        while True:
+            self._traverse(result, newGlyphs)
+            if not self.otherLookups:
+                break
+            before = frozenset(result)
+            subsetter = Subsetter()
+            subsetter.glyphs = result
+            subsetter.table = self.gsub.table
+            subsetter._doneLookups = {}
+            for lookup in self.otherLookups:
+                lookup.closure_glyphs(subsetter)
+            if len(result) == len(before):
+                break
+            newGlyphs = result - before
+        return result
+
+    def _traverse(self, result, newGlyphs):
+        substitutions = self.substitutions
+        ligatures = self.ligatures
+        stack = list(newGlyphs)
+        while stack:
+            glyph = stack.pop()
+            for subst in substitutions.get(glyph, ()):
+                if subst not in result:
+                    result.add(subst)
+                    stack.append(subst)
+            for inputGlyphs, ligGlyph in ligatures.get(glyph, ()):
+                if ligGlyph not in result and all(g in result for g in inputGlyphs):
+                    result.add(ligGlyph)
+                    stack.append(ligGlyph)
+
+
 def classifyGlyphs(unicodeFunc, cmap, gsub=None):
     """'unicodeFunc' is a callable that takes a Unicode codepoint and
     returns a string denoting some Unicode property associated with the
     given character (or None if a character is considered 'neutral').
     'cmap' is a dictionary mapping Unicode codepoints to glyph names.
-    'gsub' is an (optional) fonttools GSUB table object, used to find all
-    the glyphs that are "reachable" via substitutions from the initial
-    sets of glyphs defined in the cmap.
+    'gsub' is an (optional) fonttools GSUB table object, or a GSUBClosure
+    wrapping one, used to find all the glyphs that are "reachable" via
+    substitutions from the initial sets of glyphs defined in the cmap.
 
     Returns a dictionary of glyph sets associated with the given Unicode
     properties.
@@ -282,24 +512,36 @@ def classifyGlyphs(unicodeFunc, cmap, gsub=None):
             glyphSets.setdefault(key, set()).add(glyphName)
 
     if gsub is not None:
+        closure = gsub if isinstance(gsub, GSUBClosure) else GSUBClosure(gsub)
         if neutralGlyphs:
-            closeGlyphsOverGSUB(gsub, neutralGlyphs)
+            neutralGlyphs = closure.close(neutralGlyphs)
 
         for glyphs in glyphSets.values():
-            s = glyphs | neutralGlyphs
-            closeGlyphsOverGSUB(gsub, s)
+            s = closure.close(glyphs | neutralGlyphs)
             glyphs.update(s - neutralGlyphs)
 
     return glyphSets
 
 
+# the Unicode properties of the same codepoints are looked up by several
+# feature writers and by all the masters of a family, so they are memoized
+@functools.lru_cache(maxsize=None)
+def _unicodeScriptExtension(uv):
+    return unicodedata.script_extension(chr(uv))
+
+
+@functools.lru_cache(maxsize=None)
+def _unicodeScript(uv):
+    return unicodedata.script(chr(uv))
+
+
 def unicodeInScripts(uv, scripts):
     """Check UnicodeData's ScriptExtension property for unicode codepoint
     'uv' and return True if it intersects with the set of 'scripts' provided,
     False if it does not intersect.
     Return None for 'Common' script ('Zyyy').
     """
-    sx = unicodedata.script_extension(chr(uv))
+    sx = _unicodeScriptExtension(uv)
     if "Zyyy" in sx:
         return None
     return not sx.isdisjoint(scripts)
@@ -310,8 +552,9 @@ def unicodeInScripts(uv, scripts):
 DFLT_SCRIPTS = {"Zyyy", "Zinh"}
 
 
+@functools.lru_cache(maxsize=None)
 def unicodeScriptDirection(uv):
-    sc = unicodedata.script(chr(uv))
+    sc = _unicodeScript(uv)
     if sc in DFLT_SCRIPTS:
         return None
     return unicodedata.script_horizontal_direction(sc)
@@ -325,82 +568,87 @@ def calcCodePageRanges(unicodes):
     """
     codepageRanges = set()
 
-    chars = [chr(u) for u in unicodes]
+    if not isinstance(unicodes, (set, frozenset)):
+        unicodes = set(unicodes)
+
+    # Only a few characters trigger the codepage bits, so look these up
+    # instead of testing every codepoint of the font.
+    def has(char):
+        return ord(char) in unicodes
 
     hasAscii = set(range(0x20, 0x7E)).issubset(unicodes)
-    hasLineart = "┤" in chars
-
-    for char in chars:
-        if char == "Þ" and hasAscii:
-            codepageRanges.add(0)  # Latin 1
-        elif char == "Ľ" and hasAscii:
-            codepageRanges.add(1)  # Latin 2: Eastern Europe
-            if hasLineart:
-                codepageRanges.add(58)  # Latin 2
-        elif char == "Б":
-            codepageRanges.add(2)  # Cyrillic
-            if "Ѕ" in chars and hasLineart:
-                codepageRanges.add(57)  # IBM Cyrillic
-            if "╜" in chars and hasLineart:
-                codepageRanges.add(49)  # MS-DOS Russian
-        elif char == "Ά":
-            codepageRanges.add(3)  # Greek
-            if hasLineart and "½" in chars:
-                codepageRanges.add(48)  # IBM Greek
-            if hasLineart and "√" in chars:
-                codepageRanges.add(60)  # Greek, former 437 G
-        elif char == "İ" and hasAscii:
-            codepageRanges.add(4)  # Turkish
-            if hasLineart:
-                codepageRanges.add(56)  # IBM turkish
-        elif char == "א":
-            codepageRanges.add(5)  # Hebrew
-            if hasLineart and "√" in chars:
-                codepageRanges.add(53)  # Hebrew
-        elif char == "ر":
-            codepageRanges.add(6)  # Arabic
-            if "√" in chars:
-                codepageRanges.add(51)  # Arabic
-            if hasLineart:
-                codepageRanges.add(61)  # Arabic; ASMO 708
-        elif char == "ŗ" and hasAscii:
-            codepageRanges.add(7)  # Windows Baltic
-            if hasLineart:
-                codepageRanges.add(59)  # MS-DOS Baltic
-        elif char == "₫" and hasAscii:
-            codepageRanges.add(8)  # Vietnamese
-        elif char == "ๅ":
-            codepageRanges.add(16)  # Thai
-        elif char == "エ":
-            codepageRanges.add(17)  # JIS/Japan
-        elif char == "ㄅ":
-            codepageRanges.add(18)  # Chinese: Simplified chars
-        elif char == "ㄱ":
-            codepageRanges.add(19)  # Korean wansung
-        elif char == "央":
-            codepageRanges.add(20)  # Chinese: Traditional chars
-        elif char == "곴":
-            codepageRanges.add(21)  # Korean Johab
-        elif char == "♥" and hasAscii:
-            codepageRanges.add(30)  # OEM Character Set
-        # TODO: Symbol bit has a special meaning (check the spec), we need
-        # to confirm if this is wanted by default.
-        # elif chr(0xF000) <= char <= chr(0xF0FF):
-        #    codepageRanges.add(31)          # Symbol Character Set
-        elif char == "þ" and hasAscii and hasLineart:
-            codepageRanges.add(54)  # MS-DOS Icelandic
-        elif char == "╚" and hasAscii:
-            codepageRanges.add(62)  # WE/Latin 1
-            codepageRanges.add(63)  # US
-        elif hasAscii and hasLineart and "√" in chars:
-            if char == "Å":
-                codepageRanges.add(50)  # MS-DOS Nordic
-            elif char == "é":
-                codepageRanges.add(52)  # MS-DOS Canadian French
-            elif char == "õ":
-                codepageRanges.add(55)  # MS-DOS Portuguese
-
-    if hasAscii and "‰" in chars and "∑" in chars:
+    hasLineart = has("┤")
+
+    if has("Þ") and hasAscii:
+        codepageRanges.add(0)  # Latin 1
+    if has("Ľ") and hasAscii:
+        codepageRanges.add(1)  # Latin 2: Eastern Europe
+        if hasLineart:
+            codepageRanges.add(58)  # Latin 2
+    if has("Б"):
+        codepageRanges.add(2)  # Cyrillic
+        if has("Ѕ") and hasLineart:
+            codepageRanges.add(57)  # IBM Cyrillic
+        if has("╜") and hasLineart:
+            codepageRanges.add(49)  # MS-DOS Russian
+    if has("Ά"):
+        codepageRanges.add(3)  # Greek
+        if hasLineart and has("½"):
+            codepageRanges.add(48)  # IBM Greek
+        if hasLineart and has("√"):
+            codepageRanges.add(60)  # Greek, former 437 G
+    if has("İ") and hasAscii:
+        codepageRanges.add(4)  # Turkish
+        if hasLineart:
+            codepageRanges.add(56)  # IBM turkish
+    if has("א"):
+        codepageRanges.add(5)  # Hebrew
+        if hasLineart and has("√"):
+            codepageRanges.add(53)  # Hebrew
+    if has("ر"):
+        codepageRanges.add(6)  # Arabic
+        if has("√"):
+            codepageRanges.add(51)  # Arabic
+        if hasLineart:
+            codepageRanges.add(61)  # Arabic; ASMO 708
+    if has("ŗ") and hasAscii:
+        codepageRanges.add(7)  # Windows Baltic
+        if hasLineart:
+            codepageRanges.add(59)  # MS-DOS Baltic
+    if has("₫") and hasAscii:
+        codepageRanges.add(8)  # Vietnamese
+    if has("ๅ"):
+        codepageRanges.add(16)  # Thai
+    if has("エ"):
+        codepageRanges.add(17)  # JIS/Japan
+    if has("ㄅ"):
+        codepageRanges.add(18)  # Chinese: Simplified chars
+    if has("ㄱ"):
+        codepageRanges.add(19)  # Korean wansung
+    if has("央"):
+        codepageRanges.add(20)  # Chinese: Traditional chars
+    if has("곴"):
+        codepageRanges.add(21)  # Korean Johab
+    if has("♥") and hasAscii:
+        codepageRanges.add(30)  # OEM Character Set
+    # TODO: Symbol bit has a special meaning (check the spec), we need
+    # to confirm if this is wanted by default.
+    # if any(0xF000 <= u <= 0xF0FF for u in unicodes):
+    #    codepageRanges.add(31)          # Symbol Character Set
+    if has("þ") and hasAscii and hasLineart:
+        codepageRanges.add(54)  # MS-DOS Icelandic
+    if has("╚") and hasAscii:
+        codepageRanges.add(62)  # WE/Latin 1
+        codepageRanges.add(63)  # US
+    if hasAscii and hasLineart and has("√"):
+        if has("Å"):
+            codepageRanges.add(50)  # MS-DOS Nordic
+        if has("é"):
+            codepageRanges.add(52)  # MS-DOS Canadian French
+        if has("õ"):
+            codepageRanges.add(55)  # MS-DOS Portuguese
+
+    if hasAscii and has("‰") and has("∑"):
         codepageRanges.add(29)  # Macintosh Character Set (US Roman)
 
     # when no codepage ranges can be enabled, fall back to enabling bit 0
@@ -412,6 +660,53 @@ def calcCodePageRanges(unicodes):
     return codepageRanges
 
 
+def calcUnicodeRanges(unicodes):
+    """Given a set of Unicode codepoints (integers), calculate the
+    corresponding OS/2 Unicode range bits.
+    Same as fontTools' intersectUnicodeRanges, but this looks up each Unicode
+    block in the sorted codepoints, instead of looking up the block of every
+    codepoint.
+    """
+    from fontTools.ttLib.tables.O_S_2f_2 import OS2_UNICODE_RANGES
+
+    codepoints = sorted(set(unicodes))
+
+    def intersects(start, stop):
+        i = bisect.bisect_left(codepoints, start)
+        return i < len(codepoints) and codepoints[i] <= stop
+
+    unicodeRanges = set()
+    for bit, blocks in enumerate(OS2_UNICODE_RANGES):
+        if any(intersects(start, stop) for _, (start, stop) in blocks):
+            unicodeRanges.add(bit)
+    # bit 57 ("Non Plane 0") is set for any codepoint beyond the BMP
+    if intersects(0x10000, 0x10FFFF):
+        unicodeRanges.add(57)
+    return unicodeRanges
+
+
+def calcCmapGroupCounts(codepoints, glyphIDs):
+    """Given sorted Unicode codepoints and the glyph IDs they map to, return
+    the number of groups a cmap format 12 and a format 13 subtable would need
+    to encode the mapping, as a (format12, format13) tuple.
+    Format 12 groups map runs of consecutive codepoints to consecutive glyphs,
+    format 13 groups map them all to the same glyph.
+    """
+    format12 = format13 = 0
+    lastCode = lastGlyphID = None
+    for code, glyphID in zip(codepoints, glyphIDs):
+        if lastCode is None or code != lastCode + 1:
+            format12 += 1
+            format13 += 1
+        else:
+            if glyphID != lastGlyphID + 1:
+                format12 += 1
+            if glyphID != lastGlyphID:
+                format13 += 1
+        lastCode, lastGlyphID = code, glyphID
+    return format12, format13
+
+
 class _LazyFontName:
     def __init__(self, font):
         self.font = font
@@ -422,6 +717,25 @@ class _LazyFontName:
         return getAttrWithFallback(self.font.info, "postscriptFontName")
 
 
+def openUFO(path):
+    """Open the UFO at 'path' with ufoLib2, or defcon if that's missing.
+
+    Only the font-wide data is read upfront: the glyphs are parsed from their
+    GLIF files the first time they are accessed.
+    """
+    try:
+        import ufoLib2
+    except ImportError:
+        import defcon
+
+        return defcon.Font(path)
+    return ufoLib2.Font.open(path, lazy=True)
+
+
+def isPath(obj):
+    return isinstance(obj, (str, os.PathLike))
+
+
 def getDefaultMasterFont(designSpaceDoc):
     defaultSource = designSpaceDoc.findDefault()
     if not defaultSource:
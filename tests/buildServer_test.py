@@ -0,0 +1,96 @@
+import os
+import shutil
+import socket
+import threading
+
+import pytest
+from fontTools.ttLib import TTFont
+
+from ufo2ft.__main__ import BuildTarget
+from ufo2ft.errors import Error
+
+from .conftest import getpath
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="requires Unix domain sockets"
+)
+
+
+@pytest.fixture
+def server(tmp_path):
+    from ufo2ft.buildServer import BuildServer
+
+    server = BuildServer(str(tmp_path / "build.sock"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_submitTargets(server, tmp_path):
+    from ufo2ft.buildServer import submitTargets
+
+    ufoPath = str(tmp_path / "TestFont.ufo")
+    shutil.copytree(getpath("TestFont.ufo"), ufoPath)
+    ttfPath = str(tmp_path / "TestFont.ttf")
+    otfPath = str(tmp_path / "TestFont.otf")
+    targets = [
+        BuildTarget(ufoPath, "ttf", ttfPath),
+        BuildTarget(ufoPath, "otf", otfPath),
+    ]
+
+    timings = submitTargets(server.socketPath, targets)
+
+    assert len(timings) == 2
+    assert "glyf" in TTFont(ttfPath)
+    assert "CFF " in TTFont(otfPath)
+    ufo = server.sourceCache.loadUFO(ufoPath)
+
+    # unchanged sources are not loaded again
+    submitTargets(server.socketPath, targets[:1])
+    assert server.sourceCache.loadUFO(ufoPath) is ufo
+
+    # modified sources are
+    ufo.info.styleMapFamilyName = "Modified"
+    ufo.save()
+    submitTargets(server.socketPath, targets[:1])
+    assert server.sourceCache.loadUFO(ufoPath) is not ufo
+    assert TTFont(ttfPath)["name"].getDebugName(1) == "Modified"
+
+
+def test_submitTargets_error(server, tmp_path):
+    from ufo2ft.buildServer import submitTargets
+
+    target = BuildTarget(str(tmp_path / "Missing.ufo"), "ttf", "Missing.ttf")
+    with pytest.raises(Error, match="Build server failed"):
+        submitTargets(server.socketPath, [target])
+
+    # the server keeps serving after a failed build
+    target = BuildTarget(getpath("TestFont.ufo"), "ttf", str(tmp_path / "A.ttf"))
+    submitTargets(server.socketPath, [target])
+    assert os.path.exists(target.output)
+
+
+def test_BuildServer_socket_in_use(server):
+    from ufo2ft.buildServer import BuildServer
+
+    with pytest.raises(Error, match="already listening"):
+        BuildServer(server.socketPath)
+    # the running server's socket is left alone
+    assert os.path.exists(server.socketPath)
+
+
+def test_BuildServer_stale_socket(tmp_path):
+    from ufo2ft.buildServer import BuildServer
+
+    socketPath = str(tmp_path / "build.sock")
+    # a socket file that nothing listens on any more
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(socketPath)
+    assert os.path.exists(socketPath)
+
+    with BuildServer(socketPath) as server:
+        assert server.socketPath == socketPath
+    assert not os.path.exists(socketPath)
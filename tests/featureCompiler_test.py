@@ -7,7 +7,13 @@ import pytest
 from fontTools import ttLib
 from fontTools.feaLib.error import FeatureLibError, IncludedFeaNotFound
 
-from ufo2ft.featureCompiler import FeatureCompiler, logger, parseLayoutFeatures
+from ufo2ft import compileInterpolatableTTFs, compileTTF
+from ufo2ft.featureCompiler import (
+    FeatureCompiler,
+    _FeaBuilder,
+    logger,
+    parseLayoutFeatures,
+)
 from ufo2ft.featureWriters import (
     FEATURE_WRITERS_KEY,
     BaseFeatureWriter,
@@ -77,6 +83,41 @@ class ParseLayoutFeaturesTest:
         assert len(caplog.records) == 1
         assert "change the file name in the include" in caplog.text
 
+    def test_cache_returns_copies(self, FontClass):
+        ufo = FontClass()
+        ufo.newGlyph("a")
+        ufo.newGlyph("b")
+        ufo.features.text = "feature ss01 { sub a by b; } ss01;"
+
+        fea1 = parseLayoutFeatures(ufo)
+        fea1.statements.clear()
+        fea2 = parseLayoutFeatures(ufo)
+
+        assert fea2 is not fea1
+        assert str(fea2) == "feature ss01 {\n    sub a by b;\n} ss01;\n"
+
+        # the glyph names are part of the cache key
+        ufo.newGlyph("a-b")
+        ufo.features.text = "feature ss01 { sub a-b by b; } ss01;"
+        assert "sub a-b by b;" in str(parseLayoutFeatures(ufo))
+        del ufo["a-b"]
+        with pytest.raises(FeatureLibError):
+            parseLayoutFeatures(ufo)
+
+    def test_cache_include_modified(self, FontClass, tmpdir):
+        tmpdir.join("test.fea").write_text("# hello world\n", encoding="utf-8")
+        ufo = FontClass()
+        ufo.features.text = "include(test.fea)\n"
+        ufo.save(str(tmpdir.join("Test.ufo")))
+
+        assert "# hello world" in str(parseLayoutFeatures(ufo))
+
+        tmpdir.join("test.fea").write_text("# goodbye\n", encoding="utf-8")
+
+        fea = str(parseLayoutFeatures(ufo))
+        assert "# hello world" not in fea
+        assert "# goodbye" in fea
+
 
 class FeatureCompilerTest:
     def test_ttFont(self, FontClass):
@@ -183,7 +224,11 @@ class FeatureCompilerTest:
                 foo = ast.FeatureBlock("FOO ")
                 foo.statements.append(
                     ast.SingleSubstStatement(
-                        "a", "v", prefix="", suffix="", forceChain=None
+                        [ast.GlyphName("a")],
+                        [ast.GlyphName("v")],
+                        prefix=[],
+                        suffix=[],
+                        forceChain=False,
                     )
                 )
                 feaFile.statements.append(foo)
@@ -248,3 +293,204 @@ class FeatureCompilerTest:
         finally:
             if tmpfile is not None:
                 tmpfile.remove(ignore_errors=True)
+
+    def test_buildFromAST(self, FontClass):
+        ufo = FontClass()
+        for name, uv in (("a", 0x61), ("v", 0x76), ("acutecomb", 0x301)):
+            glyph = ufo.newGlyph(name)
+            glyph.unicode = uv
+            glyph.appendAnchor({"name": "top", "x": 100, "y": 200})
+        ufo["acutecomb"].anchors[0].name = "_top"
+        ufo.groups["public.kern1.a"] = ["a"]
+        ufo.kerning.update({("public.kern1.a", "v"): -40})
+        ufo.features.text = "feature liga { sub a v by a; } liga;"
+
+        compiler = FeatureCompiler(ufo)
+        ttFont1 = compiler.compile()
+        assert compiler.featureFile is not None
+        text = compiler.features
+
+        compiler = FeatureCompiler(ufo, buildFromAST=False)
+        ttFont2 = compiler.compile()
+        assert compiler.featureFile is None
+        assert compiler.features == text
+
+        for tag in ("GDEF", "GSUB", "GPOS"):
+            assert ttFont1[tag].compile(ttFont1) == ttFont2[tag].compile(ttFont2)
+
+    def test_buildFromAST_fallback(self, FontClass, monkeypatch):
+        ufo = FontClass()
+        for name in ("a", "a.sc"):
+            ufo.newGlyph(name)
+        ufo.features.text = "feature smcp { sub a by a.sc; } smcp;"
+
+        originalBuild = _FeaBuilder.build
+        calls = []
+
+        def build(self, tables=None, debug=False):
+            # only fail the first build, from the AST
+            calls.append(self.parseTree)
+            if len(calls) == 1:
+                raise FeatureLibError("oops", None)
+            return originalBuild(self, tables=tables, debug=debug)
+
+        monkeypatch.setattr(_FeaBuilder, "build", build)
+        compiler = FeatureCompiler(ufo)
+        ttFont = compiler.compile()
+        assert calls[0] is compiler.featureFile and calls[1] is None
+        assert "GSUB" in ttFont
+
+        # other errors are not retried
+        calls.clear()
+
+        def build(self, tables=None, debug=False):
+            calls.append(self.parseTree)
+            raise TypeError("oops")
+
+        monkeypatch.setattr(_FeaBuilder, "build", build)
+        with pytest.raises(TypeError, match="oops"):
+            FeatureCompiler(ufo).compile()
+        assert len(calls) == 1
+
+    def test_GSUB_reused_across_masters(self, FontClass):
+        from ufo2ft.util import CompileContext, GSUBCache
+
+        def makeMaster(kerning):
+            ufo = FontClass()
+            for name in ("a", "v", "a.sc", "v.sc"):
+                ufo.newGlyph(name)
+            ufo.kerning.update({("a", "v"): kerning})
+            ufo.features.text = "feature smcp { sub [a v] by [a.sc v.sc]; } smcp;"
+            return ufo
+
+        def compile(ufo, gsubCache):
+            compileContext = CompileContext(ufo, gsubCache=gsubCache)
+            return FeatureCompiler(ufo, compileContext=compileContext).compile()
+
+        gsubCache = GSUBCache()
+        ttFont1 = compile(makeMaster(-40), gsubCache)
+        assert len(gsubCache.tables) == 1
+        cached = next(iter(gsubCache.tables.values()))
+
+        ttFont2 = compile(makeMaster(-80), gsubCache)
+        assert len(gsubCache.tables) == 1
+        # each font gets its own copy of the shared table
+        assert ttFont2["GSUB"].table is not cached
+        assert ttFont2["GSUB"].table is not ttFont1["GSUB"].table
+        assert ttFont1["GSUB"].compile(ttFont1) == ttFont2["GSUB"].compile(ttFont2)
+        assert ttFont1["GPOS"].compile(ttFont1) != ttFont2["GPOS"].compile(ttFont2)
+
+        # positioning features don't prevent reusing the GSUB table
+        ufo = makeMaster(-60)
+        ufo.features.text += "\nfeature kern { pos a.sc v.sc -20; } kern;"
+        compile(ufo, gsubCache)
+        assert len(gsubCache.tables) == 1
+
+    def test_GSUB_not_hashed_without_cache(self, FontClass):
+        ufo = FontClass()
+        for name in ("a", "a.sc"):
+            ufo.newGlyph(name)
+        ufo.features.text = "feature smcp { sub a by a.sc; } smcp;"
+
+        # compiling a single font, the features aren't stringified to be hashed
+        compiler = FeatureCompiler(ufo)
+        compiler.compile()
+        assert compiler._gsubCacheKey is None
+
+    def test_GSUB_with_mark_filtering_sets_not_reused(self, FontClass):
+        from ufo2ft.util import CompileContext, GSUBCache
+
+        ufo = FontClass()
+        for name in ("a", "a.alt", "acutecomb"):
+            ufo.newGlyph(name)
+        ufo.features.text = dedent(
+            """\
+            @marks = [acutecomb];
+            feature calt {
+                lookupflag UseMarkFilteringSet @marks;
+                sub a' acutecomb by a.alt;
+            } calt;
+            """
+        )
+
+        gsubCache = GSUBCache()
+        compileContext = CompileContext(ufo, gsubCache=gsubCache)
+        FeatureCompiler(ufo, compileContext=compileContext).compile()
+        assert not gsubCache.tables
+
+    def test_GSUB_with_mark_attachment_type_not_reused(self, FontClass):
+        def makeMaster(kern):
+            ufo = FontClass()
+            for name in ("f", "i", "f_i", "grave", "acute", "a", "v"):
+                ufo.newGlyph(name)
+            ufo.features.text = dedent(
+                """\
+                @M1 = [acute];
+                @M2 = [grave];
+                %s
+                feature liga {
+                    lookupflag MarkAttachmentType @M2;
+                    sub f i by f_i;
+                } liga;
+                """
+            ) % kern
+            return ufo
+
+        # the mark attachment classes are numbered in the order they are used
+        # in the GSUB and GPOS features, and here the kern features differ
+        kern1 = "feature kern { lookupflag MarkAttachmentType @M1; pos a v -10; } kern;"
+        kern2 = "feature kern { pos a v -10; } kern;"
+        masters = [makeMaster(kern1), makeMaster(kern2)]
+        ttFonts = list(compileInterpolatableTTFs(masters))
+        assert ttFonts[0]["GSUB"].table.LookupList.Lookup[0].LookupFlag == 0x0200
+        assert ttFonts[1]["GSUB"].table.LookupList.Lookup[0].LookupFlag == 0x0100
+        assert ttFonts[1]["GDEF"].table.MarkAttachClassDef.classDefs == {"grave": 1}
+
+        # separate builds never share their GSUB tables
+        compileTTF(makeMaster(kern1))
+        ttFont = compileTTF(makeMaster(kern2))
+        assert ttFont["GSUB"].table.LookupList.Lookup[0].LookupFlag == 0x0100
+
+    def test_compileContext_shared_with_outline_compiler(self, FontClass):
+        from ufo2ft.outlineCompiler import OutlineTTFCompiler
+        from ufo2ft.util import CompileContext
+
+        ufo = FontClass()
+        for name, uv in [("a", 0x61), ("b", 0x62), ("c", None)]:
+            ufo.newGlyph(name).unicode = uv
+        ufo.lib["public.openTypeCategories"] = {"a": "base", "c": "mark"}
+        glyphSet = {g.name: g for g in ufo}
+        compileContext = CompileContext(ufo, glyphSet)
+
+        ttFont = OutlineTTFCompiler(
+            ufo, glyphSet=glyphSet, compileContext=compileContext
+        ).compile()
+        assert compileContext.glyphOrder == [".notdef", "a", "b", "c"]
+        assert compileContext.unicodeToGlyphNameMapping == {0x61: "a", 0x62: "b"}
+
+        class CategoriesWriter(BaseFeatureWriter):
+            features = frozenset(["test"])
+            categories = []
+
+            def _write(self):
+                assert (
+                    self.makeUnicodeToGlyphNameMapping()
+                    is compileContext.unicodeToGlyphNameMapping
+                )
+                self.categories.append(self.getOpenTypeCategories())
+                return False
+
+        compiler = FeatureCompiler(
+            ufo,
+            ttFont,
+            glyphSet=glyphSet,
+            featureWriters=[CategoriesWriter, CategoriesWriter],
+            compileContext=compileContext,
+        )
+        assert compiler.glyphSet is compileContext.orderedGlyphSet
+        compiler.compile()
+
+        first, second = CategoriesWriter.categories
+        assert first is second is compileContext.openTypeCategories
+        assert first.base == {"a"}
+        assert first.mark == {"c"}
@@ -92,3 +92,114 @@ def test_loadFeatureWriterFromString_valid(spec, FontClass):
     writer = loadFeatureWriterFromString(spec)
     assert writer.tableTag in {"GSUB", "GPOS"}
     assert callable(writer.write)
+
+
+def test_compileGSUB_shared_by_masters(FontClass):
+    from ufo2ft.featureCompiler import FeatureCompiler
+    from ufo2ft.featureWriters import KernFeatureWriter, MarkFeatureWriter
+    from ufo2ft.util import CompileContext, GSUBCache
+
+    def makeUFO():
+        ufo = FontClass()
+        for name, uv in [("a", 0x61), ("alef-ar", 0x627), ("lam-ar", 0x644)]:
+            ufo.newGlyph(name).unicode = uv
+        ufo.newGlyph("lam-ar.init")
+        ufo.kerning[("lam-ar", "alef-ar")] = -20
+        ufo.features.text = "feature init { sub lam-ar by lam-ar.init; } init;"
+        return ufo
+
+    def compile(ufo, gsubCache):
+        compiler = FeatureCompiler(
+            ufo,
+            featureWriters=[KernFeatureWriter, MarkFeatureWriter],
+            compileContext=CompileContext(ufo, gsubCache=gsubCache),
+        )
+        compiler.compile()
+        return compiler
+
+    # the masters of an interpolatable build share the same GSUB cache
+    gsubCache = GSUBCache()
+    compiler1 = compile(makeUFO(), gsubCache)
+    compiler2 = compile(makeUFO(), gsubCache)
+
+    assert compiler1._compiledGSUB.gsub is not None
+    assert compiler1._compiledGSUB is compiler2._compiledGSUB
+
+    # a different glyph order or feature file requires another GSUB
+    ufo = makeUFO()
+    ufo.newGlyph("b")
+    compiler3 = compile(ufo, gsubCache)
+    assert compiler3._compiledGSUB is not compiler1._compiledGSUB
+
+    # separate builds don't share their GSUB
+    compiler4 = compile(makeUFO(), GSUBCache())
+    assert compiler4._compiledGSUB is not compiler1._compiledGSUB
+
+
+def test_FeatureFileIndex_updated_by_writers(FontClass):
+    from ufo2ft.featureCompiler import parseLayoutFeatures
+    from ufo2ft.featureWriters import MarkFeatureWriter, ast
+
+    ufo = FontClass()
+    ufo.newGlyph("a").appendAnchor({"name": "top", "x": 100, "y": 200})
+    ufo.newGlyph("acutecomb").appendAnchor({"name": "_top", "x": 100, "y": 200})
+    ufo.features.text = """\
+        languagesystem DFLT dflt;
+        languagesystem latn dflt;
+        @Vowels = [a];
+        feature mark {
+            # Automatic Code
+        } mark;
+        feature mkmk {
+            @Accents = [acutecomb];
+            # Automatic Code
+        } mkmk;
+        """
+
+    class Writer(MarkFeatureWriter):
+        def _write(self):
+            result = super()._write()
+            self.feaFileIndex = self.context.feaFileIndex
+            return result
+
+    feaFile = parseLayoutFeatures(ufo)
+    writer = Writer()
+    assert writer.write(ufo, feaFile)
+
+    # the index made for the write pass was kept up to date by _insert
+    index = writer.feaFileIndex
+    fresh = ast.FeatureFileIndex(feaFile)
+    assert index.findFeatureTags() == fresh.findFeatureTags() == {"mark", "mkmk"}
+    assert list(index.iterFeatureBlocks("mark")) == list(
+        fresh.iterFeatureBlocks("mark")
+    )
+    assert [c.name for c in index.iterClassDefinitions()] == [
+        c.name for c in fresh.iterClassDefinitions()
+    ]
+    assert index.languageSystems == fresh.languageSystems
+    assert sorted(map(id, (m[-1] for m in index.comments))) == sorted(
+        map(id, (m[-1] for m in fresh.comments))
+    )
+    # no mark-to-mark anchors, so only the mark feature's marker was used
+    (match,) = ast.findCommentPattern(index, "# Automatic Code")
+    assert match[0].name == "mkmk"
+
+
+def test_ast_helpers_see_feature_file_edits():
+    from ufo2ft.featureWriters import ast
+
+    feaFile = ast.FeatureFile()
+    feaFile.statements.extend([ast.FeatureBlock("kern"), ast.FeatureBlock("liga")])
+    assert ast.findFeatureTags(feaFile) == {"kern", "liga"}
+
+    feaFile.statements[0] = ast.FeatureBlock("ss01")
+    assert ast.findFeatureTags(feaFile) == {"ss01", "liga"}
+    assert list(ast.iterFeatureBlocks(feaFile, "ss01")) == [feaFile.statements[0]]
+
+    feaFile.statements.append(ast.TableBlock("GDEF"))
+    assert ast.findTable(feaFile, "GDEF") is feaFile.statements[-1]
+
+    # statements nested in blocks are seen too
+    feaFile.statements[1].statements.append(ast.Comment("# Automatic Code"))
+    (match,) = ast.findCommentPattern(feaFile, "# Automatic Code")
+    assert match[0] is feaFile.statements[1]
@@ -4,8 +4,14 @@ from textwrap import dedent
 import pytest
 
 from ufo2ft.errors import InvalidFeaturesData
-from ufo2ft.featureCompiler import parseLayoutFeatures
+from ufo2ft.featureCompiler import FeatureCompiler, parseLayoutFeatures
 from ufo2ft.featureWriters import KernFeatureWriter, ast
+from ufo2ft.featureWriters.kernFeatureWriter import (
+    BIDI_TYPE_BITS,
+    DIRECTION_BITS,
+    KerningPair,
+    KerningPairsStatement,
+)
 
 from . import FeatureWriterTest
 
@@ -38,7 +44,13 @@ def getLookups(feaFile):
 
 
 def getPairPosRules(lookup):
-    return [s for s in lookup.statements if isinstance(s, ast.PairPosStatement)]
+    rules = []
+    for s in lookup.statements:
+        if isinstance(s, ast.PairPosStatement):
+            rules.append(s)
+        elif isinstance(s, KerningPairsStatement):
+            rules.extend(s.rules())
+    return rules
 
 
 class KernFeatureWriterTest(FeatureWriterTest):
@@ -612,6 +624,39 @@ class KernFeatureWriterTest(FeatureWriterTest):
         assert (pairs[4].firstIsClass, pairs[4].secondIsClass) == (True, True)
         assert pairs[4].glyphs == {"A", "B", "C", "D"}
 
+        # pairs referencing the same glyph or class share the same AST object
+        assert pairs[1].side2 is pairs[3].side2 is pairs[4].side2
+        assert pairs[1].side1 is not pairs[2].side1
+
+    def test_KerningPair_directions_bidiTypes(self):
+        pair = KerningPair("A", "V", -10, directions={"LTR"})
+        assert pair.directions == {"LTR"}
+        assert pair.bidiTypes == set()
+
+        pair.directions = {"LTR", "RTL"}
+        pair.bidiTypes = {"R"}
+        assert pair.directions == {"LTR", "RTL"}
+        assert pair.bidiTypes == {"R"}
+        assert repr(pair).endswith("{'R'}>")
+
+    def test_KerningPair_directions_bidiTypes_mutable(self):
+        pair = KerningPair("A", "V", -10, directions={"LTR"})
+        pair.directions.add("RTL")
+        pair.bidiTypes.update({"L", "R"})
+        assert pair.directions == {"LTR", "RTL"}
+        assert pair.directionMask == DIRECTION_BITS["LTR"] | DIRECTION_BITS["RTL"]
+        assert pair.bidiTypeMask == BIDI_TYPE_BITS["L"] | BIDI_TYPE_BITS["R"]
+
+        pair.directionMask = DIRECTION_BITS["RTL"]
+        assert pair.directions == {"RTL"}
+
+        # the sets are views of the masks, not copies
+        directions = pair.directions
+        directions.discard("RTL")
+        assert pair.directionMask == 0
+        pair.directions = {"LTR"}
+        assert directions == {"LTR"}
+
     def test_kern_LTR_and_RTL(self, FontClass):
         glyphs = {
             ".notdef": None,
@@ -1190,6 +1235,63 @@ class KernFeatureWriterTest(FeatureWriterTest):
             """
         )
 
+    def test_build_KerningPairsStatement(self, FontClass):
+        # building the GPOS table directly from the KerningPairsStatement
+        # must produce the same result as compiling the equivalent 'pos' rules
+        glyphs = {
+            "four": 0x34,
+            "seven": 0x37,
+            "A": 0x41,
+            "V": 0x56,
+            "Aacute": 0xC1,
+            "alef-ar": 0x627,
+            "reh-ar": 0x631,
+            "zain-ar": 0x632,
+            "four-ar": 0x664,
+            "seven-ar": 0x667,
+        }
+        groups = {
+            "public.kern1.A": ["A", "Aacute"],
+            "public.kern2.V": ["V"],
+            "public.kern1.reh": ["reh-ar", "zain-ar"],
+            "public.kern2.alef": ["alef-ar"],
+        }
+        kerning = {
+            ("public.kern1.A", "public.kern2.V"): -40,
+            ("Aacute", "public.kern2.V"): 0,
+            ("public.kern1.A", "V"): -20,
+            ("seven", "four"): -25,
+            ("public.kern1.reh", "public.kern2.alef"): -100,
+            ("reh-ar", "four-ar"): 10,
+            ("four-ar", "seven-ar"): -30,
+        }
+        features = dedent(
+            """\
+            languagesystem DFLT dflt;
+            languagesystem latn dflt;
+            languagesystem arab dflt;
+            """
+        )
+        ufo = makeUFO(FontClass, glyphs, groups, kerning, features)
+
+        compiler = FeatureCompiler(ufo, featureWriters=[KernFeatureWriter])
+        ttFont1 = compiler.compile()
+        lookups = getLookups(compiler.featureFile)
+        assert {lookup.name for lookup in lookups} == {
+            "kern_dflt",
+            "kern_ltr",
+            "kern_rtl",
+        }
+        for lookup in lookups:
+            assert isinstance(lookup.statements[-1], KerningPairsStatement)
+
+        compiler = FeatureCompiler(
+            ufo, featureWriters=[KernFeatureWriter], buildFromAST=False
+        )
+        ttFont2 = compiler.compile()
+
+        assert ttFont1["GPOS"].compile(ttFont1) == ttFont2["GPOS"].compile(ttFont2)
+
 
 if __name__ == "__main__":
     import sys
@@ -1,5 +1,7 @@
+import itertools
 import logging
 import os
+import random
 import re
 from textwrap import dedent
 
@@ -11,6 +13,7 @@ from ufo2ft.featureWriters import ast
 from ufo2ft.featureWriters.markFeatureWriter import (
     MarkFeatureWriter,
     NamedAnchor,
+    colorGraph,
     parseAnchorName,
 )
 
@@ -64,6 +67,57 @@ def test_NamedAnchor_repr():
     assert repr(NamedAnchor("top", 1.0, 2.0)) == expected
 
 
+def _assertValidColoring(adjacency, groups):
+    assert sorted(node for group in groups for node in group) == sorted(adjacency)
+    for group in groups:
+        for node, other in itertools.combinations(group, 2):
+            assert other not in adjacency[node]
+
+
+def test_colorGraph_crown():
+    # Greedy coloring in sorted order needs one color per pair of vertices
+    # for crown graphs, while two colors are enough.
+    n = 6
+    adjacency = {f"{i}{side}": set() for i in range(n) for side in "ab"}
+    for i, j in itertools.permutations(range(n), 2):
+        adjacency[f"{i}a"].add(f"{j}b")
+        adjacency[f"{j}b"].add(f"{i}a")
+
+    groups = colorGraph(adjacency, exactSearchMaxNodes=0)
+
+    _assertValidColoring(adjacency, groups)
+    assert groups == [
+        [f"{i}a" for i in range(n)],
+        [f"{i}b" for i in range(n)],
+    ]
+
+
+def _chromaticNumber(adjacency):
+    nodes = sorted(adjacency)
+    for k in range(1, len(nodes) + 1):
+        for colors in itertools.product(range(k), repeat=len(nodes)):
+            color = dict(zip(nodes, colors))
+            if all(color[a] != color[b] for a in nodes for b in adjacency[a]):
+                return k
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_colorGraph_exact(seed):
+    rng = random.Random(seed)
+    nodes = [f"MC_{i}" for i in range(7)]
+    adjacency = {node: set() for node in nodes}
+    for a, b in itertools.combinations(nodes, 2):
+        if rng.random() < 0.5:
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+
+    groups = colorGraph(adjacency)
+
+    _assertValidColoring(adjacency, groups)
+    assert len(groups) == _chromaticNumber(adjacency)
+    assert colorGraph({}) == []
+
+
 class MarkFeatureWriterTest(FeatureWriterTest):
 
     FeatureWriter = MarkFeatureWriter
@@ -85,6 +139,30 @@ class MarkFeatureWriterTest(FeatureWriterTest):
             "markClass grave <anchor 100 200> @MC_top;",
         ]
 
+    def test__pruneUnusedAnchors(self, FontClass):
+        ufo = FontClass()
+        a = ufo.newGlyph("a")
+        a.appendAnchor({"name": "top", "x": 250, "y": 500})
+        a.appendAnchor({"name": "exit", "x": 500, "y": 0})
+        ufo.newGlyph("b").appendAnchor({"name": "entry", "x": 0, "y": 0})
+        acute = ufo.newGlyph("acutecomb")
+        acute.appendAnchor({"name": "_top", "x": 100, "y": 200})
+        acute.appendAnchor({"name": "top", "x": 100, "y": 300})
+        writer = MarkFeatureWriter()
+        writer.setContext(ufo, ast.FeatureFile())
+        writer._pruneUnusedAnchors()
+
+        ctx = writer.context
+        assert ctx.anchorPairs == {"top": "_top"}
+        assert {
+            glyphName: [anchor.name for anchor in anchors]
+            for glyphName, anchors in ctx.anchorLists.items()
+        } == {"a": ["top"], "acutecomb": ["_top", "top"]}
+        assert {
+            anchorName: list(glyphAnchors)
+            for anchorName, glyphAnchors in ctx.anchorsByName.items()
+        } == {"top": ["a", "acutecomb"], "_top": ["acutecomb"]}
+
     def test__makeMarkClassDefinitions_non_empty(self, FontClass):
         ufo = FontClass()
         ufo.newGlyph("a").appendAnchor({"name": "top", "x": 250, "y": 500})
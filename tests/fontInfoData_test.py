@@ -5,6 +5,7 @@ import time
 import pytest
 
 from ufo2ft.fontInfoData import (
+    ResolvedFontInfo,
     dateStringToTimeValue,
     getAttrWithFallback,
     normalizeStringForPostscript,
@@ -186,6 +187,31 @@ class GetAttrWithFallbackTest:
         assert getAttrWithFallback(info, "descender") == -410
 
 
+class ResolvedFontInfoTest:
+    def test_fallbacks_resolved_once(self, info, monkeypatch):
+        from ufo2ft import fontInfoData
+
+        info.ascender = None
+        calls = []
+
+        def ascenderFallback(info):
+            calls.append("ascender")
+            return 800
+
+        monkeypatch.setitem(fontInfoData.specialFallbacks, "ascender", ascenderFallback)
+        resolved = ResolvedFontInfo(info)
+
+        # hhea ascender and OS/2 winAscent both fall back to the ascender
+        # plus the typo line gap, which itself depends on the ascender
+        assert getAttrWithFallback(resolved, "openTypeHheaAscender") == 950
+        assert getAttrWithFallback(resolved, "openTypeOS2WinAscent") == 950
+        assert getAttrWithFallback(resolved, "ascender") == 800
+        assert calls == ["ascender"]
+        # other attributes are read from the wrapped info object
+        assert resolved.ascender is None
+        assert resolved.familyName == "Family Name"
+
+
 class PostscriptBlueScaleFallbackTest:
     def test_without_blue_zones(self, info):
         postscriptBlueScale = getAttrWithFallback(info, "postscriptBlueScale")
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+import pytest
+
+# modules which are slow to import, and only needed to compile fonts
+HEAVY_MODULES = frozenset(
+    [
+        "fontTools.feaLib.builder",
+        "fontTools.subset",
+        "fontTools.ufoLib",
+        "fontTools.varLib",
+        "ufo2ft.featureCompiler",
+        "ufo2ft.outlineCompiler",
+        "ufo2ft.postProcessor",
+        "ufo2ft.preProcessor",
+        "cu2qu",
+        "booleanOperations",
+    ]
+)
+
+
+def importedModules(statement):
+    # run in a fresh interpreter, as the tests have already imported everything
+    code = f"import sys; {statement}; print('\\n'.join(sys.modules))"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return set(output.splitlines())
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import ufo2ft",
+        "import ufo2ft.filters",
+        "import ufo2ft.featureWriters",
+        "from ufo2ft.filters import TransformationsFilter",
+        "from ufo2ft.fontInfoData import getAttrWithFallback",
+        "import ufo2ft.__main__",
+        "import ufo2ft.buildServer",
+    ],
+)
+def test_import_is_lazy(statement):
+    assert not HEAVY_MODULES & importedModules(statement)
+
+
+def test_compile_functions_loaded_on_access():
+    modules = importedModules("from ufo2ft import compileTTF, CFFOptimization")
+    assert {"ufo2ft.outlineCompiler", "ufo2ft.featureCompiler"} <= modules
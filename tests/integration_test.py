@@ -1,6 +1,7 @@
 import difflib
 import io
 import os
+import pathlib
 import sys
 
 import pytest
@@ -15,6 +16,7 @@ from ufo2ft import (
 )
 from ufo2ft.constants import KEEP_GLYPH_NAMES
 from ufo2ft.filters import TransformationsFilter
+from ufo2ft.outlineCompiler import OutlineCFF2Compiler, OutlineTTFCompiler
 
 
 def getpath(filename):
@@ -79,6 +81,12 @@ class IntegrationTest:
         otf = compileOTF(testufo)
         expectTTX(otf, "TestFont-CFF.ttx")
 
+    def test_TestFont_from_path(self):
+        ttf = compileTTF(getpath("TestFont.ufo"))
+        expectTTX(ttf, "TestFont.ttx")
+        otf = compileOTF(pathlib.Path(getpath("TestFont.ufo")))
+        expectTTX(otf, "TestFont-CFF.ttx")
+
     def test_included_features(self, FontClass):
         """Checks how the compiler handles include statements in features.fea.
 
@@ -147,6 +155,27 @@ class IntegrationTest:
         expectTTX(ttfs[0], "TestFont.ttx")
         expectTTX(ttfs[1], "TestFont.ttx")
 
+    def test_interpolatableTTFs_preprocessor_glyphSets_untouched(self, FontClass):
+        from ufo2ft.preProcessor import TTFInterpolatablePreProcessor
+
+        glyphSets = []
+
+        class PreProcessor(TTFInterpolatablePreProcessor):
+            def process(self):
+                # e.g. a preprocessor keeping the glyph sets it returns
+                glyphSets.extend(super().process())
+                return tuple(glyphSets)
+
+        ufos = [FontClass(getpath("TestFont.ufo")) for _ in range(2)]
+        ttfs = list(compileInterpolatableTTFs(ufos, preProcessorClass=PreProcessor))
+        assert len(ttfs) == 2
+        assert None not in glyphSets
+
+    def test_interpolatableTTFs_from_paths(self):
+        ttfs = list(compileInterpolatableTTFs([getpath("TestFont.ufo")] * 2))
+        expectTTX(ttfs[0], "TestFont.ttx")
+        expectTTX(ttfs[1], "TestFont.ttx")
+
     @pytest.mark.parametrize(
         "cff_version, expected_ttx",
         [(1, "TestFont-NoOptimize-CFF.ttx"), (2, "TestFont-NoOptimize-CFF2.ttx")],
@@ -192,6 +221,52 @@ class IntegrationTest:
         )
         expectTTX(otf, expected_ttx)
 
+    @pytest.mark.parametrize("cff_version", [1, 2], ids=["cff1", "cff2"])
+    def test_optimizeCFF_subroutinize_cacheDir(
+        self, testufo, cff_version, tmp_path, monkeypatch
+    ):
+        from ufo2ft.postProcessor import PostProcessor
+
+        otf = compileOTF(testufo, cffVersion=cff_version, cacheDir=tmp_path)
+        assert len(list(tmp_path.glob("*.cff"))) == 1
+
+        # the cached table is read from disk and the subroutinizer is not run again
+        def fail(*args, **kwargs):
+            raise AssertionError("subroutinizer should not be called")
+
+        monkeypatch.setattr(PostProcessor, "_subroutinize_with_cffsubr", fail)
+        otf2 = compileOTF(testufo, cffVersion=cff_version, cacheDir=tmp_path)
+        tag = "CFF " if cff_version == 1 else "CFF2"
+        assert otf2.getTableData(tag) == otf.getTableData(tag)
+        expectTTX(
+            otf2,
+            "TestFont-CFF.ttx" if cff_version == 1 else "TestFont-CFF2-cffsubr.ttx",
+        )
+
+    @pytest.mark.parametrize("cff_version", [1, 2], ids=["cff1", "cff2"])
+    def test_optimizeCFF_subroutinize_cacheDir_fontInfo(
+        self, testufo, cff_version, tmp_path, monkeypatch
+    ):
+        from ufo2ft.postProcessor import PostProcessor
+
+        compileOTF(testufo, cffVersion=cff_version, cacheDir=tmp_path)
+
+        # editing the font info doesn't invalidate the cached table
+        testufo.info.copyright = "Copyright (c) 2026 Someone Else"
+        testufo.info.familyName = "Other Font"
+        testufo.info.versionMajor = 2
+        testufo.info.italicAngle = -10
+        expected = compileOTF(testufo, cffVersion=cff_version)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("subroutinizer should not be called")
+
+        monkeypatch.setattr(PostProcessor, "_subroutinize_with_cffsubr", fail)
+        otf = compileOTF(testufo, cffVersion=cff_version, cacheDir=tmp_path)
+        assert len(list(tmp_path.glob("*.cff"))) == 1
+        tag = "CFF " if cff_version == 1 else "CFF2"
+        assert otf.getTableData(tag) == expected.getTableData(tag)
+
     def test_compileVariableTTF(self, designspace, useProductionNames):
         varfont = compileVariableTTF(designspace, useProductionNames=useProductionNames)
         expectTTX(
@@ -201,6 +276,125 @@ class IntegrationTest:
             ),
         )
 
+    def test_compileVariableTTF_from_source_paths(self, designspace):
+        for source in designspace.sources:
+            source.path = getpath(source.filename)
+            source.font = None
+        varfont = compileVariableTTF(designspace)
+        expectTTX(varfont, "TestVariableFont-TTF.ttx")
+        # sources with the same path share the same font
+        assert designspace.sources[0].font is designspace.sources[1].font
+
+    @pytest.mark.parametrize(
+        "compileFunc, expectedTTX",
+        [
+            (compileVariableTTF, "TestVariableFont-TTF.ttx"),
+            (compileVariableCFF2, "TestVariableFont-CFF2.ttx"),
+        ],
+    )
+    def test_compileVariable_spillDir(
+        self, designspace, compileFunc, expectedTTX, tmp_path
+    ):
+        varfont = compileFunc(designspace, spillDir=str(tmp_path))
+        expectTTX(varfont, expectedTTX)
+        # the masters saved in spillDir are removed
+        assert not list(tmp_path.iterdir())
+
+    @pytest.mark.parametrize(
+        "compileFunc, outlineCompilerClass",
+        [
+            (compileVariableTTF, OutlineTTFCompiler),
+            (compileVariableCFF2, OutlineCFF2Compiler),
+        ],
+    )
+    def test_compileVariable_spillDir_master_fails(
+        self, designspace, compileFunc, outlineCompilerClass, tmp_path
+    ):
+        masters = []
+
+        class FailingOutlineCompiler(outlineCompilerClass):
+            def compile(self):
+                masters.append(self.ufo)
+                if len(masters) == len(designspace.sources):
+                    raise ValueError("oops")
+                return super().compile()
+
+        with pytest.raises(ValueError, match="oops"):
+            compileFunc(
+                designspace,
+                spillDir=str(tmp_path),
+                outlineCompilerClass=FailingOutlineCompiler,
+            )
+        # the masters spilled before the last one failed are removed
+        assert not list(tmp_path.iterdir())
+
+    @pytest.mark.parametrize("compileFunc", [compileVariableTTF, compileVariableCFF2])
+    def test_compileVariable_variableFeatures(self, designspace, compileFunc):
+        from fontTools import designspaceLib
+        from fontTools.varLib.instancer import instantiateVariableFont
+
+        regular = designspace.sources[0].font
+        bold = designspace.sources[2].font
+        regular.kerning[("e", "s")] = -20
+        bold.kerning[("e", "s")] = -40
+        # this pair gets its value from the group pair in the Regular master
+        regular.groups["public.kern1.E"] = bold.groups["public.kern1.E"] = ["e"]
+        regular.kerning[("public.kern1.E", "a")] = -10
+        bold.kerning[("e", "a")] = -30
+        # the GSUB FeatureVariations are added after the features are compiled
+        rule = designspaceLib.RuleDescriptor()
+        rule.name = "a.bold"
+        rule.conditionSets.append([dict(name="Weight", minimum=500, maximum=None)])
+        rule.subs.append(("a", "e"))
+        designspace.addRule(rule)
+
+        varfont = compileFunc(designspace, useProductionNames=False)
+        varfont2 = compileFunc(
+            designspace, useProductionNames=False, variableFeatures=True
+        )
+        assert varfont2["GDEF"].table.VarStore is not None
+        assert varfont2["GSUB"].table.FeatureVariations is not None
+
+        for font in (varfont, varfont2):
+            # the instancer doesn't support CFF2 yet, we only compare the layout
+            for tag in ("CFF2", "HVAR"):
+                if tag in font:
+                    del font[tag]
+        # the Medium layer source also has anchors, which only the variable
+        # features use, so we compare the instances at the full masters
+        for wght in (350, 625):
+            instance = instantiateVariableFont(varfont, {"wght": wght})
+            instance2 = instantiateVariableFont(varfont2, {"wght": wght})
+            for tag in ("GSUB", "GPOS"):
+                assert instance[tag].compile(instance) == instance2[tag].compile(
+                    instance2
+                )
+
+    @pytest.mark.parametrize("compileFunc", [compileVariableTTF, compileVariableCFF2])
+    def test_compileVariable_variableFeatures_filters(self, designspace, compileFunc):
+        from fontTools.varLib.instancer import instantiateVariableFont
+
+        # the anchors are read from the glyphs as transformed by the filters
+        filters = [TransformationsFilter(OffsetX=10, OffsetY=-20)]
+        varfont = compileFunc(designspace, useProductionNames=False, filters=filters)
+        varfont2 = compileFunc(
+            designspace,
+            useProductionNames=False,
+            filters=filters,
+            variableFeatures=True,
+        )
+
+        for font in (varfont, varfont2):
+            for tag in ("CFF2", "HVAR"):
+                if tag in font:
+                    del font[tag]
+        for wght in (350, 625):
+            instance = instantiateVariableFont(varfont, {"wght": wght})
+            instance2 = instantiateVariableFont(varfont2, {"wght": wght})
+            assert instance["GPOS"].compile(instance) == instance2["GPOS"].compile(
+                instance2
+            )
+
     def test_compileVariableCFF2(self, designspace, useProductionNames):
         varfont = compileVariableCFF2(
             designspace, useProductionNames=useProductionNames
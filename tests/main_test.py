@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from fontTools.ttLib import TTFont
+
+from ufo2ft.__main__ import BuildTarget, main, makeTargets, targetCacheKey
+from ufo2ft.errors import Error
+
+from .conftest import getpath
+
+
+class MakeTargetsTest:
+    def test_default_formats(self):
+        assert makeTargets(["A.ufo", "B.designspace"], None, "build") == [
+            BuildTarget("A.ufo", "ttf", os.path.join("build", "A.ttf")),
+            BuildTarget(
+                "B.designspace", "variable-ttf", os.path.join("build", "B-VF.ttf")
+            ),
+        ]
+
+    def test_formats_per_source(self):
+        targets = makeTargets(
+            ["A.ufo/", "B.designspace"], ["otf", "ttf", "variable-cff2"]
+        )
+        assert targets == [
+            BuildTarget("A.ufo/", "otf", "A.otf"),
+            BuildTarget("A.ufo/", "ttf", "A.ttf"),
+            BuildTarget("B.designspace", "variable-cff2", "B-VF.otf"),
+        ]
+
+    def test_no_compatible_format(self):
+        with pytest.raises(Error, match="Can't compile 'A.ufo' to variable-ttf"):
+            makeTargets(["A.ufo"], ["variable-ttf"])
+
+
+def test_main_cached(tmpdir, capsys):
+    ufoPath = getpath("TestFont.ufo")
+    outputDir = str(tmpdir.join("build"))
+    cacheDir = str(tmpdir.join("cache"))
+    args = [ufoPath, "-f", "ttf", "-f", "otf", "-o", outputDir]
+    args += ["--cache-dir", cacheDir, "--timings"]
+
+    main(args)
+
+    timings = capsys.readouterr().err
+    assert "compile" in timings
+    ttfPath = os.path.join(outputDir, "TestFont.ttf")
+    otfPath = os.path.join(outputDir, "TestFont.otf")
+    assert "glyf" in TTFont(ttfPath)
+    assert "CFF " in TTFont(otfPath)
+    key = targetCacheKey(BuildTarget(ufoPath, "ttf", ttfPath))
+    assert os.path.exists(os.path.join(cacheDir, key + ".font"))
+
+    os.remove(ttfPath)
+    main(args)
+
+    # the fonts are copied from the cache without compiling them again
+    timings = capsys.readouterr().err
+    assert "compile" not in timings
+    assert "glyf" in TTFont(ttfPath)
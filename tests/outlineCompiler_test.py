@@ -20,7 +20,11 @@ from ufo2ft.constants import (
     USE_PRODUCTION_NAMES,
 )
 from ufo2ft.fontInfoData import intListToNum
-from ufo2ft.outlineCompiler import OutlineOTFCompiler, OutlineTTFCompiler
+from ufo2ft.outlineCompiler import (
+    OutlineCFF2Compiler,
+    OutlineOTFCompiler,
+    OutlineTTFCompiler,
+)
 
 
 def getpath(filename):
@@ -563,6 +567,43 @@ class OutlineOTFCompilerTest:
         assert private.nominalWidthX == 0
 
 
+class OutlineCFF2CompilerTest:
+    def test_setupTable_CFF2(self, testufo):
+        testufo.info.postscriptForceBold = True
+        testufo.info.postscriptBlueValues = [-12, 0, 486, 498, 712, 724]
+
+        compiler = OutlineCFF2Compiler(testufo)
+        otf = compiler.compile()
+
+        assert "CFF " not in otf
+        assert otf["post"].formatType == 2.0
+        topDict = otf["CFF2"].cff.topDictIndex[0]
+        private = topDict.FDArray[0].Private
+        assert private.BlueValues == [-12, 0, 486, 498, 712, 724]
+        assert "ForceBold" not in private.rawDict
+        assert "defaultWidthX" not in private.rawDict
+        assert "nominalWidthX" not in private.rawDict
+
+        # the charstrings don't encode the advance width nor 'endchar'
+        cs = topDict.CharStrings["a"]
+        assert cs.program == [66, "hmoveto", 256, "hlineto", -128, 510, "rlineto"]
+
+    def test_same_as_converted_CFF(self, testufo):
+        otf = compileOTF(
+            testufo,
+            outlineCompilerClass=OutlineCFF2Compiler,
+            cffVersion=2,
+            optimizeCFF=1,
+            useProductionNames=False,
+        )
+        expected = compileOTF(
+            testufo, cffVersion=2, optimizeCFF=1, useProductionNames=False
+        )
+
+        assert otf.getGlyphOrder() == expected.getGlyphOrder()
+        assert otf.getTableData("CFF2") == expected.getTableData("CFF2")
+
+
 class GlyphOrderTest:
     def test_compile_original_glyph_order(self, testufo):
         DEFAULT_ORDER = [
@@ -812,6 +853,30 @@ class NamesTest:
         # original name is used
         assert name in result
 
+    def test_production_names_post_extraNames(self, testufo):
+        for name in ("a.alt", "a_b", "a_b.alt", "a.alt.ss01"):
+            testufo.newGlyph(name)
+        testufo.lib["public.glyphOrder"] = testufo.glyphOrder + ["space.alt"]
+        testufo.newGlyph("space.alt")
+
+        result = compileTTF(testufo, useProductionNames=True)
+
+        glyphOrder = result.getGlyphOrder()
+        for name in (
+            "uni0061.alt",
+            "uni00610062",
+            "uni00610062.alt",
+            "uni0061.alt.ss01",
+            "uni0020.alt",
+        ):
+            assert name in glyphOrder
+        # the extraNames are up to date without having to compile 'post' first
+        post = result["post"]
+        extraNames = list(post.extraNames)
+        post.extraNames = []
+        post.compile(result)
+        assert extraNames == post.extraNames
+
 
 class ColrCpalTest:
     def test_colr_cpal(self, FontClass):
@@ -954,6 +1019,33 @@ class CmapTest:
             0xFE0F: [(0x1F170, None)],
         }
 
+    def test_cmap_format13(self, testufo):
+        # map whole blocks of codepoints to the same glyph, like last resort fonts
+        for block in (0x4E00, 0x4F00, 0x20000, 0x20100):
+            glyph = testufo.newGlyph("block%04X" % block)
+            glyph.unicodes = list(range(block, block + 0x100))
+
+        compiler = OutlineOTFCompiler(testufo)
+        otf = compiler.compile()
+
+        cmap = otf["cmap"]
+        assert [(t.format, t.platformID, t.platEncID) for t in cmap.tables] == [
+            (4, 0, 3),
+            (4, 3, 1),
+            (13, 0, 6),
+            (13, 3, 10),
+        ]
+        cmap13_0_6, cmap13_3_10 = cmap.tables[2:]
+        assert cmap13_0_6.cmap is cmap13_3_10.cmap
+        assert cmap13_0_6.cmap[0x20] == "space"
+        assert cmap13_0_6.cmap[0x4E80] == "block4E00"
+        assert cmap13_0_6.cmap[0x201FF] == "block20100"
+        assert len(cmap13_0_6.cmap) == len(cmap.tables[0].cmap) + 0x200
+
+        compiled = cmap.compile(otf)
+        cmap.decompile(compiled, otf)
+        assert cmap.getcmap(3, 10).cmap[0x20080] == "block20000"
+
 
 ASCII = [chr(c) for c in range(0x20, 0x7E)]
 
@@ -1122,6 +1214,28 @@ def test_custom_layer_compilation_interpolatable_otf_from_ds(designspace, inplac
     assert SPARSE_OTF_MASTER_TABLES.issuperset(sparse_tables)
 
 
+def test_compile_interpolatable_ttfs_from_ds_spillDir(designspace, tmp_path):
+    expected = compileInterpolatableTTFsFromDS(designspace)
+    result = compileInterpolatableTTFsFromDS(designspace, spillDir=str(tmp_path))
+
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".ttf"] * 3
+    for source, expectedSource in zip(result.sources, expected.sources):
+        # the masters are read back from their files in spillDir
+        assert os.path.dirname(source.font.reader.file.name) == str(tmp_path)
+        assert source.font.getGlyphOrder() == expectedSource.font.getGlyphOrder()
+        assert source.font["glyf"] == expectedSource.font["glyf"]
+        source.font.close()
+
+
+def test_compile_interpolatable_otfs_from_ds_spillDir(designspace, tmp_path):
+    result = compileInterpolatableOTFsFromDS(designspace, spillDir=str(tmp_path))
+
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".otf"] * 3
+    for source in result.sources:
+        assert "CFF " in source.font
+        source.font.close()
+
+
 def test_compilation_from_ds_missing_source_font(designspace):
     designspace.sources[0].font = None
     with pytest.raises(AttributeError, match="missing required 'font'"):
@@ -0,0 +1,49 @@
+import pytest
+from fontTools import designspaceLib
+
+from ufo2ft.sourceLoader import loadSourceFonts
+
+from .conftest import getpath
+
+ufoLib2 = pytest.importorskip("ufoLib2")
+
+
+@pytest.fixture
+def designspace():
+    ds = designspaceLib.DesignSpaceDocument()
+    for filename, layerName in [
+        ("LayerFont-Regular.ufo", None),
+        ("LayerFont-Regular.ufo", "Medium"),
+        ("LayerFont-Bold.ufo", None),
+    ]:
+        source = designspaceLib.SourceDescriptor()
+        source.path = getpath(filename)
+        source.layerName = layerName
+        ds.addSource(source)
+    return ds
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_loadSourceFonts(designspace, jobs):
+    fonts = loadSourceFonts(designspace, jobs=jobs)
+
+    assert fonts == [source.font for source in designspace.sources]
+    # sources with the same path share the same font
+    assert fonts[0] is fonts[1]
+    assert fonts[0] is not fonts[2]
+
+    for source in designspace.sources:
+        layer = source.font.layers[source.layerName or "public.default"]
+        expected = ufoLib2.Font.open(source.path, lazy=False).layers[layer.name]
+        assert set(layer.keys()) == set(expected.keys())
+        for glyph in expected:
+            assert layer[glyph.name] == glyph
+
+
+def test_loadSourceFonts_loaded(designspace):
+    font = ufoLib2.Font()
+    designspace.sources[2].font = font
+
+    fonts = loadSourceFonts(designspace, jobs=2)
+
+    assert fonts[2] is font
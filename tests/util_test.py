@@ -0,0 +1,141 @@
+from io import StringIO
+from textwrap import dedent
+
+import pytest
+from fontTools.feaLib.parser import Parser
+from fontTools.ttLib.tables.O_S_2f_2 import intersectUnicodeRanges
+
+from ufo2ft.util import (
+    GSUBClosure,
+    calcCmapGroupCounts,
+    calcCodePageRanges,
+    calcUnicodeRanges,
+    closeGlyphsOverGSUB,
+    compileGSUB,
+)
+
+
+@pytest.fixture
+def gsub():
+    glyphs = [
+        "a",
+        "b",
+        "c",
+        "f",
+        "i",
+        "f_i",
+        "f_f_i",
+        "a.sc",
+        "b.sc",
+        "a.alt1",
+        "a.alt2",
+        "c.fina",
+        "c.init",
+        "one",
+        "one.sub",
+        "x",
+    ]
+    features = dedent(
+        """\
+        feature liga {
+            sub f i by f_i;
+            sub f f_i by f_f_i;
+        } liga;
+        feature smcp {
+            sub [a b] by [a.sc b.sc];
+        } smcp;
+        feature aalt {
+            sub a from [a.alt1 a.alt2];
+        } aalt;
+        feature ccmp {
+            sub x by c i;
+        } ccmp;
+        lookup FINA {
+            sub c by c.fina;
+        } FINA;
+        lookup INIT {
+            sub c by c.init;
+        } INIT;
+        feature calt {
+            sub c' lookup FINA b;
+            sub a c' lookup INIT;
+        } calt;
+        feature sinf {
+            sub one by one.sub;
+        } sinf;
+        """
+    )
+    feaFile = Parser(StringIO(features), glyphs).parse()
+    return compileGSUB(feaFile, glyphs)
+
+
+@pytest.mark.parametrize(
+    "glyphs",
+    [
+        {"f"},
+        {"f", "i"},
+        {"x", "f"},
+        {"a"},
+        {"c"},
+        {"c", "b"},
+        {"c", "x", "a"},
+        {"one", "b"},
+    ],
+)
+def test_GSUBClosure(gsub, glyphs):
+    expected = set(glyphs)
+    closeGlyphsOverGSUB(gsub, expected)
+
+    closure = GSUBClosure(gsub)
+    assert closure.close(glyphs) == expected
+    # results are cached
+    assert closure.close(set(glyphs)) is closure.close(glyphs)
+
+
+ASCII = set(range(0x20, 0x7F))
+
+
+@pytest.mark.parametrize(
+    "unicodes, expected",
+    [
+        (set(), {0}),
+        (ASCII | {ord("Þ")}, {0}),
+        (ASCII | {ord(c) for c in "Ľ┤"}, {1, 58}),
+        ({ord(c) for c in "БЅ╜┤"}, {2, 49, 57}),
+        (ASCII | {ord(c) for c in "┤√Åéõ"}, {50, 52, 55}),
+        (ASCII | {ord(c) for c in "‰∑"}, {29}),
+        ({ord("Þ")}, {0}),
+        (range(0x3000, 0x9000), {17, 18, 19, 20}),
+    ],
+)
+def test_calcCodePageRanges(unicodes, expected):
+    assert calcCodePageRanges(unicodes) == expected
+
+
+@pytest.mark.parametrize(
+    "unicodes",
+    [
+        [],
+        [0x41],
+        [0x0410, 0x1F000],
+        [0x7F, 0x80, 0xFFFF, 0x10FFFF],
+        range(0x4E00, 0x9FFF),
+    ],
+)
+def test_calcUnicodeRanges(unicodes):
+    assert calcUnicodeRanges(unicodes) == intersectUnicodeRanges(unicodes)
+
+
+@pytest.mark.parametrize(
+    "codepoints, glyphIDs, expected",
+    [
+        ([], [], (0, 0)),
+        ([0x41], [1], (1, 1)),
+        ([0x41, 0x42, 0x43], [1, 2, 3], (1, 3)),
+        ([0x41, 0x42, 0x43], [1, 1, 1], (3, 1)),
+        ([0x41, 0x42, 0x44], [1, 1, 1], (3, 2)),
+        ([0x41, 0x42, 0x43, 0x44], [1, 2, 2, 2], (3, 2)),
+    ],
+)
+def test_calcCmapGroupCounts(codepoints, glyphIDs, expected):
+    assert calcCmapGroupCounts(codepoints, glyphIDs) == expected